@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+from settings import ASSETS
+
+# On-disk cache of images ready to blit: decoded, scaled and converted to the
+# display's pixel format. An entry is keyed by the hash and mtime of every
+# source file, what was done to them (the recipe), the display format and
+# ASSET_VERSION, so editing a PNG or the processing never serves a stale
+# surface. It is a JSON header line (size, pixel format) followed by the zlib
+# compressed pixel buffer, restored into a surface with one copy. Misses decode
+# their PNGs in a thread pool (pygame releases the GIL while decoding and
+# scaling), converting stays on the main thread.
+#
+#   load_images([(path, size, alpha), ...])   cached frames / tiles
+#   cached_surface(paths, recipe, build)      anything built from source files
+
+# Bump when the way surfaces are processed or stored changes
+ASSET_VERSION = 1
+
+# path: ((mtime, size), hash), sources are only hashed again when they change
+_stamps = {}
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    changed = (stat.st_mtime_ns, stat.st_size)
+    if path not in _stamps or _stamps[path][0] != changed:
+        with open(path, "rb") as source:
+            _stamps[path] = (changed, hashlib.sha256(source.read()).hexdigest())
+    return [os.path.basename(path), stat.st_mtime_ns, _stamps[path][1]]
+
+
+def display_format():
+    surface = pygame.display.get_surface()
+    return [surface.get_bitsize(), list(surface.get_masks())]
+
+
+def asset_key(paths, recipe):
+    description = {
+        "Version": ASSET_VERSION,
+        "pygame": pygame.version.ver,
+        "Display": display_format(),
+        "Sources": [source_stamp(path) for path in paths],
+        "Recipe": recipe,
+    }
+    canonical = json.dumps(description, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class AssetCache:
+    def __init__(self, directory=ASSETS["Directory"], max_size=ASSETS["Max Size"]):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.surface")
+
+    def get(self, key):
+        # The stored surface or None
+        path = self.path(key)
+        try:
+            with open(path, "rb") as entry:
+                header = json.loads(entry.readline())
+                pixels = zlib.decompress(entry.read())
+        except (FileNotFoundError, ValueError, zlib.error, OSError):
+            return None
+        flags = pygame.SRCALPHA if header["Alpha"] else 0
+        surface = pygame.Surface(header["Size"], flags, header["Bits"], header["Masks"])
+        if surface.get_pitch() != header["Pitch"] or len(pixels) != surface.get_pitch() * surface.get_height():
+            return None
+        surface.get_buffer().write(pixels)
+        os.utime(path)
+        return surface
+
+    def put(self, key, surface):
+        header = {
+            "Size": surface.get_size(),
+            "Alpha": bool(surface.get_flags() & pygame.SRCALPHA),
+            "Bits": surface.get_bitsize(),
+            "Masks": list(surface.get_masks()),
+            "Pitch": surface.get_pitch(),
+        }
+        pixels = zlib.compress(surface.get_buffer().raw, ASSETS["Compression"])
+        # Write to a temporary file and rename, so readers never see half an entry
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as entry:
+            entry.write(json.dumps(header).encode() + b"\n")
+            entry.write(pixels)
+        os.replace(temporary, self.path(key))
+        self.evict()
+
+    def entries(self):
+        # [(key, size in bytes, last used)], least recently used first
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".surface"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((name[: -len(".surface")], stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_size:
+                break
+            os.remove(self.path(key))
+            total -= size
+
+
+_cache = None
+
+
+def default_cache():
+    global _cache
+    if _cache is None:
+        _cache = AssetCache()
+    return _cache
+
+
+def set_default_cache(cache):
+    # Use `cache` wherever no cache is passed and forget the source hashes, as
+    # a fresh process would. The benchmarks point this at a temporary
+    # directory so they never read or fill the real cache
+    global _cache
+    _cache = cache
+    _stamps.clear()
+
+
+def decode(path, size=None):
+    # Thread pool side of a miss, no display access
+    surface = pygame.image.load(path)
+    if size is not None:
+        surface = pygame.transform.scale(surface, size)
+    return surface
+
+
+def decode_images(specs, workers=ASSETS["Workers"]):
+    # [(path, size)] decoded (and scaled) in parallel, not converted
+    if len(specs) == 1:
+        return [decode(*specs[0])]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda spec: decode(*spec), specs))
+
+
+def load_images(specs, cache=None, workers=ASSETS["Workers"]):
+    # Surfaces for [(path, size or None, alpha)], in order. Scaled to size and
+    # converted with convert_alpha (alpha) or convert
+    cache = cache or default_cache()
+    keys = [asset_key([path], {"Size": size, "Alpha": alpha}) for path, size, alpha in specs]
+    surfaces = [cache.get(key) for key in keys]
+
+    misses = [index for index, surface in enumerate(surfaces) if surface is None]
+    if misses:
+        decoded = decode_images([specs[index][:2] for index in misses], workers)
+        for index, surface in zip(misses, decoded):
+            surface = surface.convert_alpha() if specs[index][2] else surface.convert()
+            cache.put(keys[index], surface)
+            surfaces[index] = surface
+    return surfaces
+
+
+def cached_surface(paths, recipe, build, cache=None):
+    # A surface derived from several source files (a composite, an atlas),
+    # built by build() only when the sources or recipe changed
+    cache = cache or default_cache()
+    key = asset_key(paths, recipe)
+    surface = cache.get(key)
+    if surface is None:
+        surface = build()
+        cache.put(key, surface)
+    return surface
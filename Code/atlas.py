@@ -0,0 +1,136 @@
+import time
+
+import pygame
+from settings import ATLAS
+
+# Texture atlas: many small images (animation frames, map tiles) packed into a
+# few large page surfaces instead of one Surface each. Images go onto shelves
+# (rows) tallest first, a page is at most ATLAS["Page Size"] pixels square and
+# trimmed to what is on it, anything bigger gets a page of its own. Each image
+# is then a source rect on a page (for Surface.blits / area) or a subsurface
+# sharing the page's pixels, which blits like the original surface.
+#
+#   python atlas.py                         player frames, per surface vs atlas
+#   python atlas.py --map "../Map File/RocketGame.tmx"   and the map's tiles
+
+
+class TextureAtlas:
+    def __init__(self, images, page_size=ATLAS["Page Size"]):
+        # (page index, x, y) for every image, then the pages themselves
+        self.page_size = page_size
+        placements = [None] * len(images)
+        extents = []  # [width, height] used on each page
+        shelf = None  # [page, x, y, height] of the open shelf
+        order = sorted(
+            range(len(images)),
+            key=lambda index: (-images[index].get_height(), -images[index].get_width()),
+        )
+        for index in order:
+            width, height = images[index].get_size()
+            if width > page_size or height > page_size:
+                placements[index] = (len(extents), 0, 0)
+                extents.append([width, height])
+                continue
+            if shelf is None or shelf[1] + width > page_size:
+                # New shelf under the open one, or a new page when it won't fit
+                if shelf is None or shelf[2] + shelf[3] + height > page_size:
+                    shelf = [len(extents), 0, 0, 0]
+                    extents.append([0, 0])
+                else:
+                    shelf = [shelf[0], 0, shelf[2] + shelf[3], 0]
+            page, x, y, _ = shelf
+            placements[index] = (page, x, y)
+            shelf[1] += width
+            shelf[3] = max(shelf[3], height)
+            extents[page][0] = max(extents[page][0], x + width)
+            extents[page][1] = max(extents[page][1], y + height)
+
+        # BLEND_RGBA_MAX onto the clear page is a straight copy of each image,
+        # a plain alpha blit would multiply semi transparent pixels by their
+        # alpha twice (once here, once on screen)
+        self.pages = [pygame.Surface(extent, pygame.SRCALPHA).convert_alpha() for extent in extents]
+        self.regions = []  # (page index, Rect)
+        for image, (page, x, y) in zip(images, placements):
+            self.pages[page].blit(image, (x, y), special_flags=pygame.BLEND_RGBA_MAX)
+            self.regions.append((page, pygame.Rect((x, y), image.get_size())))
+
+    def __len__(self):
+        return len(self.regions)
+
+    def source(self, index):
+        # (page surface, source rect) of image `index`
+        page, rect = self.regions[index]
+        return self.pages[page], rect
+
+    def surface(self, index):
+        page, rect = self.regions[index]
+        return self.pages[page].subsurface(rect)
+
+    def surfaces(self):
+        return [self.surface(index) for index in range(len(self.regions))]
+
+    def memory(self):
+        # Bytes of pixel data held by the pages
+        return sum(page.get_pitch() * page.get_height() for page in self.pages)
+
+
+def surface_memory(surfaces):
+    # Bytes of pixel data held by separate surfaces
+    return sum(surface.get_pitch() * surface.get_height() for surface in surfaces)
+
+
+def report(name, load):
+    # Compare load() -> [surfaces] kept as they are against the same surfaces
+    # packed into an atlas: surface count, pixel memory and load time. One
+    # untimed load first so imports / caches don't count against either
+    load()
+    start = time.perf_counter()
+    surfaces = load()
+    separate = time.perf_counter() - start
+    start = time.perf_counter()
+    atlas = TextureAtlas(load())
+    atlas.surfaces()
+    packed = time.perf_counter() - start
+    print(f"{name}: {len(surfaces)} images")
+    print(
+        f"  per surface  {len(surfaces):6} surfaces  {surface_memory(surfaces) / 1024:10.1f} KiB"
+        f"  {separate * 1000:8.1f} ms"
+    )
+    print(
+        f"  atlas        {len(atlas.pages):6} pages     {atlas.memory() / 1024:10.1f} KiB"
+        f"  {packed * 1000:8.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from settings import WINDOW_HEIGHT, WINDOW_WIDTH
+
+    parser = argparse.ArgumentParser(description="Report atlas memory and load time against separate surfaces")
+    parser.add_argument("--map", help="TMX map whose tiles to report on as well")
+    args = parser.parse_args()
+
+    pygame.display.init()
+    pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+
+    def player_frames():
+        from player import Player
+
+        player = Player.__new__(Player)
+        player.import_assets("../Player/keyframes", atlas=False)
+        return [frame for frames in player.animations.values() for frame in frames]
+
+    report("Player frames", player_frames)
+
+    if args.map:
+
+        def map_tiles():
+            from pytmx.util_pygame import load_pygame
+
+            tmx_map = load_pygame(args.map)
+            return [image for image in tmx_map.images if image is not None]
+
+        report("Map tiles", map_tiles)
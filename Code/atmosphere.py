@@ -0,0 +1,288 @@
+import math
+from bisect import bisect_right
+
+import numpy as np
+
+# Precomputed U.S. Standard Atmosphere 1976 and Mach - Cd tables with linear
+# interpolation between rows. The tables are sampled on uniform grids so a
+# lookup computes its row directly instead of searching for it. Every lookup
+# takes a scalar (plain Python lists, no NumPy call overhead, NumPy scalars are
+# converted to float first) or an array and returns the same kind. Replaces the piecewise constant if/elif ladders that
+# used to live in Rocket.calc_air_density and Rocket.calc_drag_force, which
+# made density and Cd jump at every bin edge.
+# Reference: https://www.pdas.com/atmos.html (NASA-TM-X-74335)
+
+SEA_LEVEL_TEMPERATURE = 288.15  # K
+SEA_LEVEL_PRESSURE = 101325  # Pa
+STANDARD_GRAVITY = 9.80665  # m/s**2
+GAS_CONSTANT = 8.31432  # J / (mol K), value used by the 1976 model
+AIR_MOLAR_MASS = 0.0289644  # kg / mol
+AIR_GAS_CONSTANT = GAS_CONSTANT / AIR_MOLAR_MASS  # J / (kg K)
+HEAT_CAPACITY_RATIO = 1.4
+EARTH_RADIUS_1976 = 6356766  # m, radius used for geopotential altitude
+
+# (base geopotential altitude [m], temperature lapse rate [K/m]) of each layer
+# of the lower atmosphere, valid up to 84,852 m geopotential (86 km geometric)
+LAYERS_1976 = (
+    (0, -0.0065),
+    (11000, 0.0),
+    (20000, 0.001),
+    (32000, 0.0028),
+    (47000, 0.0),
+    (51000, -0.0028),
+    (71000, -0.002),
+)
+
+# Tabulated upper atmosphere (geometric altitude [m], temperature [K], density
+# [kg/m**3]), interpolated log-linearly in density when the table is built
+UPPER_ATMOSPHERE_1976 = (
+    (86000, 186.87, 6.958e-6),
+    (90000, 186.87, 3.416e-6),
+    (100000, 195.08, 5.604e-7),
+    (110000, 240.00, 9.708e-8),
+    (120000, 360.00, 2.222e-8),
+    (150000, 634.39, 2.076e-9),
+    (200000, 854.56, 2.541e-10),
+    (250000, 941.33, 6.073e-11),
+    (300000, 976.01, 1.916e-11),
+    (400000, 995.83, 2.803e-12),
+    (500000, 999.24, 5.215e-13),
+    (600000, 999.85, 1.137e-13),
+    (700000, 999.99, 3.070e-14),
+    (800000, 1000.0, 1.136e-14),
+    (900000, 1000.0, 5.759e-15),
+    (1000000, 1000.0, 3.561e-15),
+)
+
+ATMOSPHERE_TABLE_STEP = 100  # m
+ATMOSPHERE_TABLE_TOP = 1000000  # m, lookups above return the top row
+
+# Drag coefficient against Mach number, loosely following the curve used in the
+# Artemis I trajectory simulation. Nodes sit in the middle of the bins of the
+# old Cd ladder so the interpolated curve passes through its values. Every node
+# is a multiple of MACH_TABLE_STEP, so the resampled table is exact
+# Reference: https://www.researchgate.net/publication/362270344_Preliminary_Launch_Trajectory_Simulation_for_Artemis_I_with_the_Space_Launch_System
+MACH_TABLE = (0.0, 0.8, 1.125, 1.375, 1.75, 2.125, 2.375, 2.625, 2.875, 3.25, 3.75, 4.5, 5.5, 7.0, 9.0)
+DRAG_COEFFICIENT_TABLE = (0.25, 0.25, 0.60, 0.65, 0.55, 0.50, 0.45, 0.43, 0.40, 0.33, 0.30, 0.28, 0.26, 0.25, 0.23)  # fmt: skip
+MACH_TABLE_STEP = 0.025
+
+
+def lower_atmosphere(altitude):
+    # Temperature, pressure and density of the 1976 model below 86 km
+    geopotential = EARTH_RADIUS_1976 * altitude / (EARTH_RADIUS_1976 + altitude)
+    base_temperature = SEA_LEVEL_TEMPERATURE
+    base_pressure = SEA_LEVEL_PRESSURE
+    exponent = STANDARD_GRAVITY / AIR_GAS_CONSTANT
+
+    for index, (base, lapse_rate) in enumerate(LAYERS_1976):
+        top = LAYERS_1976[index + 1][0] if index + 1 < len(LAYERS_1976) else math.inf
+        height = min(geopotential, top) - base
+        temperature = base_temperature + lapse_rate * height
+        if lapse_rate == 0:
+            pressure = base_pressure * math.exp(-exponent * height / base_temperature)
+        else:
+            pressure = base_pressure * (base_temperature / temperature) ** (
+                exponent / lapse_rate
+            )
+        if geopotential <= top:
+            break
+        base_temperature, base_pressure = temperature, pressure
+
+    return temperature, pressure, pressure / (AIR_GAS_CONSTANT * temperature)
+
+
+def upper_atmosphere(altitude):
+    altitudes = [row[0] for row in UPPER_ATMOSPHERE_1976]
+    index = min(max(bisect_right(altitudes, altitude), 1), len(altitudes) - 1)
+    (h0, t0, rho0), (h1, t1, rho1) = UPPER_ATMOSPHERE_1976[index - 1 : index + 1]
+    fraction = (altitude - h0) / (h1 - h0)
+    temperature = t0 + fraction * (t1 - t0)
+    density = math.exp(math.log(rho0) + fraction * (math.log(rho1) - math.log(rho0)))
+    return temperature, density * AIR_GAS_CONSTANT * temperature, density
+
+
+class UniformTable:
+    # Columns sampled every `step` from `start`, linear interpolation between
+    # rows and clamped to the first / last row outside the table
+    def __init__(self, start, step, columns):
+        self.start = start
+        self.step = step
+        self.columns = {key: np.asarray(values, dtype=float) for key, values in columns.items()}
+
+    def coefficients(self, key):
+        # Per row intercept and slope of one column, value = intercept + slope * x
+        # inside the row. The last row has slope 0 and holds the last value
+        array = self.columns[key]
+        slopes = np.append(np.diff(array), 0.0) / self.step
+        nodes = self.start + np.arange(len(array)) * self.step
+        return array - nodes * slopes, slopes
+
+    def function(self, key):
+        # Build the lookup for one column. Everything it touches is bound to a
+        # local of the closure, and the scalar branch only does float
+        # arithmetic on plain Python floats: NumPy scalars, and floats mixed
+        # with ints in comparisons, are several times slower
+        start = float(self.start)
+        inverse_step = 1 / self.step
+        intercept_array, slope_array = self.coefficients(key)
+        intercepts = intercept_array.tolist()
+        slopes = slope_array.tolist()
+        last = len(intercepts) - 1
+        lower = start
+        upper = start + last * self.step
+        last_position = float(last)
+        first_value = intercepts[0] + slopes[0] * lower
+        last_value = intercepts[last]
+        ndarray = np.ndarray
+
+        def lookup(x):
+            if x.__class__ is not float:
+                if isinstance(x, ndarray):
+                    position = np.clip((x - start) * inverse_step, 0, last)
+                    index = position.astype(np.intp)
+                    return intercept_array[index] + slope_array[index] * np.clip(x, lower, upper)
+                x = float(x)
+
+            position = (x - start) * inverse_step
+            if 0.0 < position < last_position:
+                index = int(position)
+                return intercepts[index] + slopes[index] * x
+            return first_value if position <= 0.0 else last_value
+
+        return lookup
+
+
+def build_atmosphere_table():
+    altitudes = range(0, ATMOSPHERE_TABLE_TOP + 1, ATMOSPHERE_TABLE_STEP)
+    rows = [
+        lower_atmosphere(h) if h < 86000 else upper_atmosphere(h) for h in altitudes
+    ]
+    temperatures, pressures, densities = zip(*rows)
+    speeds_of_sound = [
+        math.sqrt(HEAT_CAPACITY_RATIO * AIR_GAS_CONSTANT * t) for t in temperatures
+    ]
+    return UniformTable(
+        start=0,
+        step=ATMOSPHERE_TABLE_STEP,
+        columns={
+            "Temperature": temperatures,
+            "Pressure": pressures,
+            "Density": densities,
+            "Speed of Sound": speeds_of_sound,
+        },
+    )
+
+
+def build_drag_table():
+    machs = np.arange(0, MACH_TABLE[-1] + MACH_TABLE_STEP / 2, MACH_TABLE_STEP)
+    return UniformTable(
+        start=0,
+        step=MACH_TABLE_STEP,
+        columns={"Drag Coefficient": np.interp(machs, MACH_TABLE, DRAG_COEFFICIENT_TABLE)},
+    )
+
+
+ATMOSPHERE_TABLE = build_atmosphere_table()
+DRAG_TABLE = build_drag_table()
+
+
+# air_density(altitude), temperature(altitude), pressure(altitude),
+# speed_of_sound(altitude) and drag_coefficient(mach)
+air_density = ATMOSPHERE_TABLE.function("Density")
+temperature = ATMOSPHERE_TABLE.function("Temperature")
+pressure = ATMOSPHERE_TABLE.function("Pressure")
+speed_of_sound = ATMOSPHERE_TABLE.function("Speed of Sound")
+drag_coefficient = DRAG_TABLE.function("Drag Coefficient")
+
+
+# ---------------------------------------------------------------------------
+# The old ladders, conditions as they stood in Rocket.calc_air_density and
+# Rocket.calc_drag_force, kept only so the benchmark below has something to beat
+# ---------------------------------------------------------------------------
+
+
+def ladder_air_density(altitude):
+    # fmt: off
+    if altitude <= 0: return 1.225
+    elif 0 < altitude <= 1000: return 1.112
+    elif 1000 < altitude <= 2000: return 1.007
+    elif 2000 < altitude <= 3000: return 0.9093
+    elif 3000 < altitude <= 4000: return 0.8194
+    elif 4000 < altitude <= 5000: return 0.7364
+    elif 5000 < altitude <= 6000: return 0.661
+    elif 6000 < altitude <= 7000: return 0.5900
+    elif 7000 < altitude <= 8000: return 0.5258
+    elif 8000 < altitude <= 9000: return 0.4671
+    elif 9000 < altitude <= 10000: return 0.4135
+    elif 10000 < altitude <= 15000: return 0.1948
+    elif 15000 < altitude <= 20000: return 0.08891
+    elif 20000 < altitude <= 25000: return 0.04008
+    elif 25000 < altitude <= 30000: return 0.01841
+    elif 30000 < altitude <= 40000: return 0.003996
+    elif 40000 < altitude <= 50000: return 0.001027
+    elif 50000 < altitude <= 60000: return 0.0003097
+    elif 60000 < altitude <= 70000: return 0.00008283
+    elif 70000 < altitude <= 80000: return 0.00001846
+    elif 80000 < altitude: return 0
+
+
+def ladder_drag_coefficient(mach):
+    # fmt: off
+    if mach <= 0.25: return 0.25
+    elif 0.25 < mach <= 1: return 0.25
+    elif 1.00 < mach <= 1.25: return 0.60
+    elif 1.25 < mach <= 1.5: return 0.65
+    elif 1.50 < mach <= 2.00: return 0.55
+    elif 2.00 < mach <= 2.25: return 0.50
+    elif 2.25 < mach <= 2.50: return 0.45
+    elif 2.50 < mach <= 2.75: return 0.43
+    elif 2.75 < mach <= 3.00: return 0.40
+    elif 3.00 < mach <= 3.50: return 0.33
+    elif 3.50 < mach <= 4.00: return 0.30
+    elif 4.00 < mach <= 5.00: return 0.28
+    elif 5.00 < mach <= 6.00: return 0.26
+    elif 6.00 < mach <= 8.00: return 0.25
+    elif mach > 8: return 0.23
+
+
+if __name__ == "__main__":
+    import timeit
+
+    from rocket import build_rocket, simulate
+
+    rng = np.random.default_rng(0)
+    altitudes = rng.uniform(0, 120000, 100000)
+    machs = rng.uniform(0, 10, 100000)
+    # Inputs as the step loop sees them: uniform samples, and the altitude /
+    # Mach of every step of a default flight. Plain floats, like Rocket passes
+    flight = simulate(build_rocket(), dt=0.1, t_end=1000)
+    inputs = {
+        "uniform": (altitudes[:10000].tolist(), machs[:10000].tolist()),
+        "flight": (flight["Altitude"].tolist(), flight["Mach Speed"].tolist()),
+    }
+
+    def per_call(cases, repeat=15):
+        # Best of `repeat`, the cases interleaved so a noisy machine slows
+        # them all alike
+        best = {name: math.inf for name in cases}
+        for _ in range(repeat):
+            for name, (function, values) in cases.items():
+                elapsed = timeit.timeit(lambda: [function(x) for x in values], number=1)
+                best[name] = min(best[name], elapsed / len(values) * 1e9)
+        return best
+
+    for label, (scalar_altitudes, scalar_machs) in inputs.items():
+        timings = per_call(
+            {
+                "ladder density": (ladder_air_density, scalar_altitudes),
+                "table density": (air_density, scalar_altitudes),
+                "ladder Cd": (ladder_drag_coefficient, scalar_machs),
+                "table Cd": (drag_coefficient, scalar_machs),
+            }
+        )
+        print(f"scalar lookups, {label} inputs (ns per call)")
+        for name, nanoseconds in timings.items():
+            print(f"  {name:<16} {nanoseconds:8.1f}")
+    print("array lookups, 100k values (ns per value)")
+    print(f"  table density    {min(timeit.repeat(lambda: air_density(altitudes), number=1, repeat=5)) / 1e5 * 1e9:8.1f}")
+    print(f"  table Cd         {min(timeit.repeat(lambda: drag_coefficient(machs), number=1, repeat=5)) / 1e5 * 1e9:8.1f}")
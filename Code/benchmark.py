@@ -0,0 +1,380 @@
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+# Headless SDL so the asset and rendering benchmarks run without a window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from settings import *
+
+# Benchmark suite with stored history. Every benchmark is a setup function that
+# returns (run, operations): run() does `operations` units of work and the
+# result is the best time per operation over BENCHMARK["Repeat"] runs. Each run
+# of the suite is appended to the history file and compared against the best
+# earlier run on the same kind of machine (architecture and Python version), or
+# the committed reference baseline when there are none. A benchmark is flagged
+# when it is slower by more than BENCHMARK["Regression"] plus the spread of
+# both sides: how much slower the median repeat was than the best in this run,
+# and how much slower the median earlier run was than the best one. A noisy
+# machine needs a bigger change to trip it.
+#
+#   python benchmark.py                      run everything, save and compare
+#   python benchmark.py --only "Full Flight" run some benchmarks
+#   python benchmark.py --no-save            compare without adding to history
+#   python benchmark.py --baseline FILE      compare against FILE only
+#   python benchmark.py --write-baseline     store this run as the reference
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+@benchmark("Stage.update")
+def stage_update():
+    from stage import create_stage
+
+    def run():
+        stage = create_stage(CORE_STAGE)
+        for _ in range(10000):
+            stage.update(0.1)
+
+    return run, 10000
+
+
+@benchmark("Rocket.update")
+def rocket_update():
+    from rocket import build_rocket
+
+    def run():
+        rocket = build_rocket()
+        for _ in range(10000):
+            rocket.update(0.1)
+
+    return run, 10000
+
+
+@benchmark("Full Flight")
+def full_flight():
+    from rocket import build_rocket, simulate
+
+    def run():
+        simulate(build_rocket(), dt=0.1, t_end=1000)
+
+    return run, 1
+
+
+@benchmark("update_rocket_dict")
+def rocket_dict():
+    from rocket import build_rocket
+    from telemetry import create_rocket_dict, update_rocket_dict
+
+    rocket = build_rocket()
+    rocket.update(0.1)
+
+    def run():
+        rocket_parameters = {}
+        create_rocket_dict(rocket_parameters, rocket.stack.stage_names)
+        for step in range(10000):
+            update_rocket_dict(rocket_parameters, step * 0.1, rocket)
+
+    return run, 10000
+
+
+@benchmark("csv_output")
+def csv_rows():
+    from rocket import build_rocket, simulate
+    from telemetry import csv_output
+
+    telemetry = simulate(build_rocket(), dt=0.1, t_end=1000)
+    path = os.path.join(tempfile.mkdtemp(), "Rocket Values.csv")
+
+    def run():
+        csv_output(telemetry, path)
+
+    return run, len(telemetry["Time"])
+
+
+def headless_display():
+    import pygame
+
+    pygame.display.init()
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    return pygame
+
+
+# Asset caches of this run live under one temporary directory, removed on
+# exit, so benchmarks never touch the real ASSETS["Directory"]
+ASSET_CACHE_ROOT = None
+
+
+def temporary_asset_cache():
+    # A new, empty asset cache made the default one (see assets.py)
+    global ASSET_CACHE_ROOT
+    from assets import AssetCache, set_default_cache
+
+    if ASSET_CACHE_ROOT is None:
+        ASSET_CACHE_ROOT = tempfile.mkdtemp(prefix="benchmark-assets-")
+        atexit.register(shutil.rmtree, ASSET_CACHE_ROOT, ignore_errors=True)
+    cache = AssetCache(tempfile.mkdtemp(dir=ASSET_CACHE_ROOT))
+    set_default_cache(cache)
+    return cache
+
+
+@benchmark("Player.import_assets cold")
+def import_assets_cold():
+    headless_display()
+    from player import Player
+
+    player = Player.__new__(Player)
+
+    def run():
+        # Empty cache every run: decode, scale, convert and store every frame
+        temporary_asset_cache()
+        player.import_assets("../Player/keyframes")
+
+    return run, 1
+
+
+@benchmark("Player.import_assets warm")
+def import_assets_warm():
+    headless_display()
+    from player import Player
+
+    player = Player.__new__(Player)
+    temporary_asset_cache()
+    player.import_assets("../Player/keyframes")
+
+    def run():
+        player.import_assets("../Player/keyframes")
+
+    return run, 1
+
+
+def custom_draw(tiles):
+    def setup():
+        pygame = headless_display()
+        from main import AllSprites
+        from tile import Tile
+
+        temporary_asset_cache()
+        all_sprites = AllSprites()
+        surf = pygame.Surface((16, 16))
+        # Square grid of tiles centred on the camera, so only a window sized
+        # patch of them is on screen
+        side = int(tiles**0.5)
+        for index in range(tiles):
+            Tile(
+                pos=((index % side) * 16, (index // side) * 16),
+                surf=surf,
+                group=all_sprites,
+                z=LAYERS["Ground Non-Collision"],
+            )
+        camera = pygame.sprite.Sprite()
+        camera.rect = pygame.Rect(0, 0, 1, 1)
+        camera.rect.center = (side * 8, side * 8)
+
+        def run():
+            for _ in range(5):
+                all_sprites.custom_draw(camera)
+
+        return run, 5
+
+    return setup
+
+
+for tiles in (1000, 10000, 100000):
+    benchmark(f"custom_draw {tiles // 1000}k tiles")(custom_draw(tiles))
+
+
+def measure(setup, repeat):
+    # (best seconds per operation, spread of the repeats)
+    run, operations = setup()
+    times = timeit.repeat(run, number=1, repeat=repeat)
+    best = min(times)
+    return best / operations, statistics.median(times) / best - 1
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.3f} {unit:<2}"
+    return f"{seconds / 1e-9:8.1f} ns"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as history_file:
+        return [json.loads(line) for line in history_file if line.strip()]
+
+
+def machine_key():
+    # What results are compared across: not the host name, so a fresh
+    # checkout, CI or another machine of the same kind shares baselines
+    major, minor, _ = platform.python_version_tuple()
+    return f"{platform.machine()} Python {major}.{minor}"
+
+
+def baselines(history, machine):
+    # Best earlier result per benchmark on this kind of machine, and its
+    # spread: how much slower the median earlier run was than the best one, or
+    # the spread of the best run's own repeats if that is larger.
+    # ({benchmark: seconds}, {benchmark: spread})
+    runs = {}
+    for run in history:
+        if run["Machine"] != machine:
+            continue
+        for name, seconds in run["Results"].items():
+            runs.setdefault(name, []).append((seconds, run.get("Spread", {}).get(name, 0.0)))
+    results = {}
+    spreads = {}
+    for name, measured in runs.items():
+        best, repeat_spread = min(measured)
+        results[name] = best
+        spreads[name] = max(statistics.median(seconds for seconds, _ in measured) / best - 1, repeat_spread)
+    return results, spreads
+
+
+def load_baseline(path):
+    # (machine, {benchmark: seconds}, {benchmark: spread}) of a baseline file,
+    # None if missing
+    if not os.path.exists(path):
+        return None
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    return baseline["Machine"], baseline["Results"], baseline.get("Spread", {})
+
+
+def write_baseline(path, results, spreads):
+    with open(path, "w") as baseline_file:
+        json.dump(
+            {"Machine": machine_key(), "Commit": git_commit(), "Results": results, "Spread": spreads},
+            baseline_file,
+            indent=4,
+        )
+        baseline_file.write("\n")
+
+
+def run_suite(
+    names=None,
+    repeat=BENCHMARK["Repeat"],
+    history_path=BENCHMARK["History"],
+    save=True,
+    baseline_path=None,
+):
+    # Compares against baseline_path when given, otherwise the history for
+    # this machine key, falling back to BENCHMARK["Baseline"]
+    names = list(BENCHMARKS) if names is None else names
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks {unknown}, expected some of {list(BENCHMARKS)}")
+
+    machine = machine_key()
+    baseline, baseline_spreads = ({}, {}) if baseline_path else baselines(load_history(history_path), machine)
+    if not baseline:
+        path = baseline_path or BENCHMARK["Baseline"]
+        stored = load_baseline(path)
+        if stored is None and baseline_path:
+            raise FileNotFoundError(f"No baseline file {baseline_path}")
+        if stored is not None:
+            _, baseline, baseline_spreads = stored
+            print(f"baseline: {path} ({stored[0]}, this machine {machine})")
+    results = {}
+    spreads = {}
+    regressions = []
+
+    print(f"{'benchmark':<28}{'per op':>12}{'spread':>9}{'baseline':>12}{'change':>10}{'allowed':>10}")
+    for name in names:
+        seconds, spread = measure(BENCHMARKS[name], repeat)
+        results[name] = seconds
+        spreads[name] = spread
+        line = f"{name:<28}{format_time(seconds):>12}{spread:>9.1%}"
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            allowed = BENCHMARK["Regression"] + spread + baseline_spreads.get(name, 0.0)
+            line += f"{format_time(baseline[name]):>12}{change:>+9.1%}{allowed:>+9.1%}"
+            if change > allowed:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line, flush=True)
+
+    if save:
+        os.makedirs(os.path.dirname(history_path) or ".", exist_ok=True)
+        with open(history_path, "a") as history_file:
+            history_file.write(
+                json.dumps(
+                    {
+                        "Time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "Commit": git_commit(),
+                        "Machine": machine,
+                        "Results": results,
+                        "Spread": spreads,
+                    }
+                )
+                + "\n"
+            )
+    return results, spreads, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare against its history")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="benchmarks to run (default: all)")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    parser.add_argument("--repeat", type=int, default=BENCHMARK["Repeat"], help="runs per benchmark, best is kept")
+    parser.add_argument("--history", default=BENCHMARK["History"], help="history file (JSON lines)")
+    parser.add_argument("--no-save", action="store_true", help="don't append this run to the history")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on a regression")
+    parser.add_argument("--baseline", help="compare against this baseline file instead of the history")
+    parser.add_argument(
+        "--write-baseline",
+        nargs="?",
+        const=BENCHMARK["Baseline"],
+        metavar="FILE",
+        help=f"store this run as a baseline file (default: {BENCHMARK['Baseline']})",
+    )
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+    results, spreads, regressions = run_suite(
+        args.only, args.repeat, args.history, save=not args.no_save, baseline_path=args.baseline
+    )
+    if args.write_baseline:
+        write_baseline(args.write_baseline, results, spreads)
+        print(f"baseline written to {args.write_baseline}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
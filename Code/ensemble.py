@@ -0,0 +1,271 @@
+import numpy as np
+from atmosphere import air_density, drag_coefficient, speed_of_sound
+from gravity import gravity_acceleration_calc
+from settings import *
+
+# Column order of every per-stage array, matches Rocket.stage_objects
+CORE, SRB, INTERIM = 0, 1, 2
+
+# Flight phases, same meaning as the Rocket.current_stage strings
+PHASE_NAMES = ("Core SRB", "Core", "Interim")
+CORE_SRB_PHASE, CORE_PHASE, INTERIM_PHASE = 0, 1, 2
+
+
+def stage_columns(n, *stage_parameters):
+    # Stack one settings dictionary per stage into (n, stages) arrays. Any value
+    # in the dictionaries may be a scalar or an array of n dispersed values
+    def column(key):
+        return np.stack(
+            [
+                np.broadcast_to(np.asarray(params[key], dtype=float), (n,))
+                for params in stage_parameters
+            ],
+            axis=1,
+        ).copy()
+
+    return {
+        "Dry Mass": column("Dry Mass"),
+        "Propellant Mass": column("Propellant Mass"),
+        "Mass Flow": column("Mass Flow"),
+        "Exhaust Velocity": column("Exhaust Velocity"),
+        "Reference Area": column("Reference Area"),
+    }
+
+
+class RocketEnsemble:
+    # N independent Block 1 rockets stepped together. Every attribute that is a
+    # scalar on Rocket / Stage is an array here: per-rocket values have shape
+    # (n,) and per-stage values have shape (n, 3) with columns CORE, SRB, INTERIM
+    def __init__(
+        self,
+        n,
+        core=CORE_STAGE,
+        srb=SOLID_ROCKET_BOOSTERS,
+        interim=INTERIM_CRYOGENIC_STAGE,
+        flight_program=FLIGHT_PROGRAM,
+    ):
+        self.n = n
+        columns = stage_columns(n, core, srb, interim)
+
+        # Stage state
+        self.dry_mass = columns["Dry Mass"]
+        self.prop_mass = columns["Propellant Mass"]
+        self.stage_mass = self.dry_mass + self.prop_mass
+        self.mass_flow = columns["Mass Flow"]
+        self.mass_flow_copy = self.mass_flow.copy()
+        self.exhaust_velocity = columns["Exhaust Velocity"]
+        self.exhaust_velocity_copy = self.exhaust_velocity.copy()
+        self.stage_reference_area = columns["Reference Area"]
+        self.stage_thrust = np.zeros((n, 3))
+        self.firing = np.ones((n, 3), dtype=bool)
+        self.attached = np.ones((n, 3), dtype=bool)
+
+        # Rocket state
+        self.phase = np.full(n, CORE_SRB_PHASE, dtype=np.int8)
+        self.reference_area = np.zeros(n)
+        self.air_density = np.full(n, 1.225)
+        self.drag_force = np.zeros(n)
+        self.drag_coefficient = np.zeros(n)
+        self.mach_speed = np.zeros(n)
+        self.speed_of_sound = np.full(n, 340.29)
+        self.rocket_acceleration = np.zeros(n)
+        self.rocket_velocity = np.zeros(n)
+        self.pos = np.zeros((n, 2))
+        # Flight program values may be dispersed too
+        self.core_pitch = np.broadcast_to(
+            np.asarray(flight_program["Core Pitch"], dtype=float), (n,)
+        )
+        self.interim_pitch = np.broadcast_to(
+            np.asarray(flight_program["Interim Pitch"], dtype=float), (n,)
+        )
+        self.theta = np.broadcast_to(
+            np.asarray(flight_program["Launch Pitch"], dtype=float), (n,)
+        ).copy()
+
+        # Running extremes, cheaper than recording every step of every case
+        self.max_altitude = np.zeros(n)
+
+    # Masses
+    @property
+    def total_mass(self):
+        return self.stage_mass.sum(axis=1)
+
+    @property
+    def total_propellant_mass(self):
+        return self.prop_mass.sum(axis=1)
+
+    # Forces
+    @property
+    def gravity(self):
+        return -gravity_acceleration_calc(
+            big_object_mass=EARTH_MASS,
+            big_object_radius=EARTH_RADIUS,
+            small_object_distance=self.pos[:, 1],
+        )
+
+    @property
+    def thrust(self):
+        return np.where(self.firing, self.stage_thrust, 0).sum(axis=1)
+
+    def flight_controller(self):
+        # Same three rules as Rocket.flight_controller, applied as masks. Cases
+        # that match none of them keep their previous settings, as they do there
+        core_burning = self.prop_mass[:, CORE] > 0
+        srb_burning = self.prop_mass[:, SRB] > 0
+
+        core_srb = core_burning & srb_burning
+        core_only = core_burning & ~srb_burning
+        interim = ~core_burning & ~srb_burning
+
+        self.firing[core_srb | core_only, INTERIM] = False
+        self.phase[core_srb] = CORE_SRB_PHASE
+
+        self.firing[core_only, SRB] = False
+        self.attached[core_only, SRB] = False
+        self.phase[core_only] = CORE_PHASE
+        self.theta[core_only] = self.core_pitch[core_only]
+
+        self.firing[interim, CORE] = False
+        self.attached[interim, CORE] = False
+        self.firing[interim, SRB] = False
+        self.attached[interim, SRB] = False
+        self.firing[interim, INTERIM] = True
+        self.phase[interim] = INTERIM_PHASE
+        self.theta[interim] = self.interim_pitch[interim]
+
+    def update_stages(self, dt):
+        # Stage.calc_mass
+        self.prop_mass += self.mass_flow * dt
+        np.maximum(self.prop_mass, 0.0, out=self.prop_mass)
+        np.add(self.prop_mass, self.dry_mass, out=self.stage_mass)
+        np.maximum(self.stage_mass, 0.0, out=self.stage_mass)
+
+        # Stage.check_firing
+        np.copyto(self.mass_flow, np.where(self.firing, self.mass_flow_copy, 0))
+        np.copyto(
+            self.exhaust_velocity, np.where(self.firing, self.exhaust_velocity_copy, 0)
+        )
+
+        # Stage.check_attachment
+        self.dry_mass[~self.attached] = 0
+        self.stage_reference_area[~self.attached] = 0
+
+        # Stage.calc_thrust
+        np.copyto(
+            self.stage_thrust,
+            np.where(self.prop_mass > 0, self.exhaust_velocity * self.mass_flow, 0),
+        )
+
+    def calc_air_density(self):
+        self.air_density = air_density(self.pos[:, 1])
+
+    def calc_reference_area(self):
+        area = self.stage_reference_area
+        self.reference_area = np.select(
+            [
+                self.phase == CORE_SRB_PHASE,
+                self.phase == CORE_PHASE,
+                self.phase == INTERIM_PHASE,
+            ],
+            [area[:, CORE], area[:, CORE] - area[:, SRB], area[:, INTERIM]],
+            self.reference_area,
+        )
+
+    def calc_drag_force(self, dt):
+        self.speed_of_sound = speed_of_sound(self.pos[:, 1])
+        self.mach_speed = self.rocket_velocity / self.speed_of_sound
+        self.drag_coefficient = drag_coefficient(self.mach_speed)
+        drag = (
+            0.5
+            * self.air_density
+            * (self.rocket_velocity**2)
+            * self.drag_coefficient
+            * self.reference_area
+        )
+        # Drag always opposes the direction of travel
+        self.drag_force = np.where(self.rocket_velocity > 0, -drag, drag)
+
+    def calc_acc_vel(self, dt):
+        total_mass = self.total_mass
+        weight = total_mass * -self.gravity
+        resultant_force = self.thrust + weight + self.drag_force
+        self.rocket_acceleration = resultant_force / total_mass
+        self.rocket_velocity = self.rocket_velocity + self.rocket_acceleration * dt
+
+    def move(self, dt):
+        radians = np.radians(self.theta)
+        distance = self.rocket_velocity * dt + 0.5 * self.rocket_acceleration * dt**2
+        self.pos[:, 0] += distance * np.cos(radians)
+        self.pos[:, 1] += distance * np.sin(radians)
+        np.maximum(self.max_altitude, self.pos[:, 1], out=self.max_altitude)
+
+    def update(self, dt):
+        # Same order as Rocket.update
+        self.flight_controller()
+        self.update_stages(dt)
+        self.calc_air_density()
+        self.calc_reference_area()
+        self.calc_drag_force(dt)
+        self.calc_acc_vel(dt)
+        self.move(dt)
+
+
+def simulate_ensemble(ensemble, dt=0.1, t_end=1000, record_every=None):
+    # Ensemble counterpart of rocket.simulate: steps every case together and
+    # returns the final state of each one. With record_every the altitude and
+    # velocity of every case are also kept every record_every steps, as
+    # (n, samples) "Altitude History" / "Velocity History" arrays
+    steps = int(round(t_end / dt))
+    samples = steps // record_every if record_every else 0
+    altitude_history = np.zeros((ensemble.n, samples))
+    velocity_history = np.zeros((ensemble.n, samples))
+    for step in range(steps):
+        ensemble.update(dt)
+        if record_every and (step + 1) % record_every == 0:
+            sample = (step + 1) // record_every - 1
+            altitude_history[:, sample] = ensemble.pos[:, 1]
+            velocity_history[:, sample] = ensemble.rocket_velocity
+
+    results = {
+        "Time": steps * dt,
+        "Altitude": ensemble.pos[:, 1].copy(),
+        "X Position": ensemble.pos[:, 0].copy(),
+        "Velocity": ensemble.rocket_velocity.copy(),
+        "Max Altitude": ensemble.max_altitude.copy(),
+        "Current Total Mass": ensemble.total_mass,
+        "Total Fuel Remaining": ensemble.total_propellant_mass,
+        "Stage": np.array(PHASE_NAMES)[ensemble.phase],
+    }
+    if record_every:
+        results["Altitude History"] = altitude_history
+        results["Velocity History"] = velocity_history
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Fly N dispersed rockets at once")
+    parser.add_argument("-n", type=int, default=10000, help="number of cases")
+    parser.add_argument("--dt", type=float, default=0.1, help="time step (s)")
+    parser.add_argument("--t-end", type=float, default=1000, help="flight time (s)")
+    parser.add_argument("--sigma", type=float, default=0.01, help="relative 1-sigma mass flow dispersion")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    core = dict(CORE_STAGE)
+    srb = dict(SOLID_ROCKET_BOOSTERS)
+    core["Mass Flow"] = CORE_STAGE["Mass Flow"] * rng.normal(1, args.sigma, args.n)
+    srb["Mass Flow"] = SOLID_ROCKET_BOOSTERS["Mass Flow"] * rng.normal(1, args.sigma, args.n)
+
+    start = time.perf_counter()
+    results = simulate_ensemble(
+        RocketEnsemble(args.n, core=core, srb=srb), dt=args.dt, t_end=args.t_end
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"{args.n} cases in {elapsed:.2f} s, max altitude "
+        f"{results['Max Altitude'].mean():.1f} +/- {results['Max Altitude'].std():.1f} m"
+    )
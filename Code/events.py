@@ -0,0 +1,309 @@
+import math
+
+# Flight events for the integrator path of rocket.simulate. Instead of letting
+# Rocket.flight_controller notice a burnout somewhere inside a step, each event
+# is located exactly and the step is split there:
+#   - events with a known rate (propellant burnout, constant mass flow) are
+#     predicted in closed form and the step is shortened to land on them
+#   - other crossing events (altitude thresholds) are found by root finding on
+#     the step length, re-integrating from the start of the step
+#   - maximum events (max-Q) are bracketed by three samples and refined with a
+#     golden section search, they are logged but don't cut the step. If a
+#     function has several local peaks the log keeps the largest one
+# Separation is logged whenever the flight controller changes stage
+
+
+class Event:
+    # Fires when function(vehicle) crosses zero. direction -1 only catches
+    # falling crossings, +1 rising ones and 0 both. rate(vehicle), when given,
+    # is the constant d(function)/dt used to predict the crossing in closed form
+    def __init__(
+        self,
+        name,
+        function,
+        direction=0,
+        terminal=False,
+        rate=None,
+        snap_index=None,
+        parameters=None,
+    ):
+        self.name = name
+        self.function = function
+        self.direction = direction
+        self.terminal = terminal
+        self.rate = rate
+        # State vector entry set to exactly zero when the event lands, so that
+        # polled checks such as prop_mass > 0 see the crossing too
+        self.snap_index = snap_index
+        # Plain data the function and rate were built from, name is only for
+        # display (see definition)
+        self.parameters = parameters
+        self.fired = False
+
+    def definition(self):
+        # Everything that decides when this event fires and what it does then,
+        # used to key cached results (see result_cache.py)
+        return {
+            "Parameters": self.parameters if self.parameters is not None else {"Name": self.name},
+            "Direction": self.direction,
+            "Terminal": self.terminal,
+            "Snap Index": self.snap_index,
+        }
+
+    def crossed(self, before, after):
+        if self.direction <= 0 and before > 0 >= after:
+            return True
+        if self.direction >= 0 and before < 0 <= after:
+            return True
+        return False
+
+
+class MaximumEvent:
+    # Logs the peak of function(vehicle), e.g. dynamic pressure for max-Q
+    def __init__(self, name, function, parameters=None):
+        self.name = name
+        self.function = function
+        self.parameters = parameters
+        self.fired = False
+
+    def definition(self):
+        return {"Parameters": self.parameters if self.parameters is not None else {"Name": self.name}}
+
+
+def dynamic_pressure(vehicle):
+    return 0.5 * vehicle.air_density * vehicle.air_speed**2
+
+
+def stage_mass_rate(stage):
+    # Rocket.prepare_step has already zeroed the flow of stages that aren't
+    # burning this step
+    return stage.mass_flow
+
+
+def burnout_event(name, stage, snap_index):
+    return Event(
+        name=f"{name} Burnout",
+        function=lambda vehicle: stage.prop_mass,
+        direction=-1,
+        rate=lambda vehicle: stage_mass_rate(stage),
+        snap_index=snap_index,
+        parameters={"Kind": "Burnout", "Stage": name},
+    )
+
+
+def altitude_event(altitude, terminal=False):
+    return Event(
+        name=f"Altitude {altitude:g} m",
+        function=lambda vehicle: vehicle.pos[1] - altitude,
+        direction=1,
+        terminal=terminal,
+        parameters={"Kind": "Altitude", "Altitude": float(altitude)},
+    )
+
+
+def max_q_event():
+    return MaximumEvent(name="Max-Q", function=dynamic_pressure, parameters={"Kind": "Max-Q"})
+
+
+def burnout_events(rocket):
+    # Burnout of every stage, indices match Rocket.get_state
+    return [
+        burnout_event(name, stage, rocket.PROPELLANT_INDEX + index)
+        for index, (name, stage) in enumerate(zip(rocket.stack.stage_names, rocket.stage_objects))
+    ]
+
+
+def default_events(rocket):
+    # Burnout of every stage plus max-Q
+    return burnout_events(rocket) + [max_q_event()]
+
+
+class EventDetector:
+    def __init__(self, events, time_tolerance=1e-6):
+        self.events = list(events)
+        self.crossing_events = [e for e in self.events if isinstance(e, Event)]
+        self.maximum_events = [e for e in self.events if isinstance(e, MaximumEvent)]
+        self.time_tolerance = time_tolerance
+
+        # One entry per fired event: {"Event", "Time", "Altitude", "Velocity", "Value"}
+        self.log = []
+        self.terminated = False
+
+        self.current_stage = None
+        self.pending = []
+        self.step_length = 0.0
+        self.history = []
+        self.peaks = {}
+
+    def record(self, name, t, vehicle, value):
+        self.log.append(
+            {
+                "Event": name,
+                "Time": t,
+                "Altitude": vehicle.pos[1],
+                "Velocity": vehicle.rocket_velocity,
+                "Value": value,
+            }
+        )
+
+    def check_separation(self, t, state, vehicle):
+        # Called after Rocket.prepare_step, logs every stage change. The
+        # separated stages' dry mass was zeroed by prepare_step, set_state
+        # refreshes the stage totals before the mass is logged
+        if self.current_stage is not None and vehicle.current_stage != self.current_stage:
+            vehicle.set_state(state)
+            self.record(
+                f"Separation ({self.current_stage} -> {vehicle.current_stage})",
+                t,
+                vehicle,
+                vehicle.total_mass,
+            )
+        self.current_stage = vehicle.current_stage
+
+    def limit_step(self, t, state, vehicle, dt):
+        # Shorten dt so the step ends exactly on the next predictable crossing
+        vehicle.set_state(state)
+        self.pending = []
+        for event in self.crossing_events:
+            if event.rate is None or event.fired:
+                continue
+            value = event.function(vehicle)
+            rate = event.rate(vehicle)
+            if rate == 0 or value == 0:
+                continue
+            time_to_event = -value / rate
+            if time_to_event <= 0 or time_to_event > dt + self.time_tolerance:
+                continue
+            if time_to_event < dt - self.time_tolerance:
+                dt = time_to_event
+                self.pending = [event]
+            else:
+                self.pending.append(event)
+        self.step_length = dt
+        return dt
+
+    def locate(self, integrator, f, t, state, t_new, state_new, vehicle):
+        # Returns the (possibly shortened) end of the step
+        h = t_new - t
+
+        # Root find any other crossing inside the step, earliest one wins
+        earliest = None
+        vehicle.set_state(state)
+        before = {
+            event: event.function(vehicle)
+            for event in self.crossing_events
+            if event.rate is None and not event.fired
+        }
+        vehicle.set_state(state_new)
+        for event, value_before in before.items():
+            if event.crossed(value_before, event.function(vehicle)):
+                tau = self.find_root(integrator, f, t, state, h, event, vehicle)
+                if earliest is None or tau < earliest[0]:
+                    earliest = (tau, event)
+
+        if earliest is not None:
+            tau, event = earliest
+            if tau < h:
+                t_new = t + tau
+                state_new = integrator.advance(f, t, state, tau)
+            vehicle.set_state(state_new)
+            self.fire(event, t_new, vehicle)
+
+        # Predicted events only count if the step still ends where they were
+        # predicted to land
+        if self.pending and abs((t_new - t) - self.step_length) <= self.time_tolerance:
+            for event in self.pending:
+                if event.snap_index is not None:
+                    state_new[event.snap_index] = 0.0
+                vehicle.set_state(state_new)
+                self.fire(event, t_new, vehicle)
+        self.pending = []
+
+        vehicle.set_state(state_new)
+        self.track_maxima(integrator, f, t_new, state_new, vehicle)
+        return t_new, state_new
+
+    def find_root(self, integrator, f, t, state, h, event, vehicle):
+        # Illinois variant of regula falsi on the step length
+        def g(tau):
+            vehicle.set_state(integrator.advance(f, t, state, tau))
+            return event.function(vehicle)
+
+        vehicle.set_state(state)
+        a, g_a = 0.0, event.function(vehicle)
+        b, g_b = h, g(h)
+        side = 0
+        while b - a > self.time_tolerance:
+            c = b - g_b * (b - a) / (g_b - g_a)
+            g_c = g(c)
+            if (g_c > 0) == (g_b > 0):
+                b, g_b = c, g_c
+                if side == -1:
+                    g_a /= 2
+                side = -1
+            else:
+                a, g_a = c, g_c
+                if side == 1:
+                    g_b /= 2
+                side = 1
+            if g_c == 0:
+                return c
+        return b
+
+    def track_maxima(self, integrator, f, t, state, vehicle):
+        # Keep the last three accepted samples and refine a bracketed peak
+        values = {event: event.function(vehicle) for event in self.maximum_events}
+        self.history.append((t, state.copy(), values))
+        if len(self.history) > 3:
+            self.history.pop(0)
+        if len(self.history) < 3:
+            return
+
+        (t0, state0, values0), (t1, state1, values1), (_, _, values2) = self.history
+        t2 = t
+        for event in self.maximum_events:
+            if not values0[event] < values1[event] >= values2[event]:
+                continue
+            # Search each half of the bracket from its own starting sample so
+            # every trial is a single short step
+            t_peak, peak = max(
+                self.golden_section(integrator, f, t0, state0, t1 - t0, event, vehicle),
+                self.golden_section(integrator, f, t1, state1, t2 - t1, event, vehicle),
+                key=lambda candidate: candidate[1],
+            )
+            if event in self.peaks and self.peaks[event]["Value"] >= peak:
+                continue
+            vehicle.set_state(integrator.advance(f, t0, state0, t_peak - t0))
+            if event in self.peaks:
+                self.log.remove(self.peaks[event])
+            event.fired = True
+            self.record(event.name, t_peak, vehicle, peak)
+            self.peaks[event] = self.log[-1]
+        vehicle.set_state(state)
+
+    def golden_section(self, integrator, f, t, state, h, event, vehicle):
+        def value(tau):
+            vehicle.set_state(integrator.advance(f, t, state, tau))
+            return event.function(vehicle)
+
+        ratio = (math.sqrt(5) - 1) / 2
+        a, b = 0.0, h
+        c, d = b - ratio * (b - a), a + ratio * (b - a)
+        value_c, value_d = value(c), value(d)
+        while b - a > self.time_tolerance:
+            if value_c > value_d:
+                b, d, value_d = d, c, value_c
+                c = b - ratio * (b - a)
+                value_c = value(c)
+            else:
+                a, c, value_c = c, d, value_d
+                d = a + ratio * (b - a)
+                value_d = value(d)
+        tau = (a + b) / 2
+        return t + tau, value(tau)
+
+    def fire(self, event, t, vehicle):
+        event.fired = True
+        self.record(event.name, t, vehicle, event.function(vehicle))
+        if event.terminal:
+            self.terminated = True
@@ -0,0 +1,86 @@
+import json
+
+import pygame
+
+# Keyboard input for the game's fixed ticks (Game.step), live, recorded to a
+# file or replayed from one. Every source has keys(), called once per tick,
+# returning something indexed like pygame.key.get_pressed(). With a fixed tick
+# the same key stream gives the same game, so a recording replayed headless is
+# a repeatable performance / regression run.
+#
+# A recording is JSON lines: a header with the tick rate, then
+# {"Tick": n, "Keys": [...]} whenever the set of held keys changes (pygame K_
+# key codes), then {"Ticks": total} once the game quits
+
+# Every key pygame has a K_ constant for
+KEY_CODES = sorted({getattr(pygame, name) for name in dir(pygame) if name.startswith("K_")})
+
+
+class KeyState:
+    # Replayed stand-in for pygame.key.get_pressed()
+    def __init__(self, pressed=()):
+        self.pressed = frozenset(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+def pressed_keys(keys):
+    return [key for key in KEY_CODES if keys[key]]
+
+
+class LiveInput:
+    finished = False
+
+    def keys(self):
+        return pygame.key.get_pressed()
+
+    def close(self):
+        pass
+
+
+class InputRecorder(LiveInput):
+    def __init__(self, path, tick_rate):
+        self.file = open(path, "w")
+        self.file.write(json.dumps({"Tick Rate": tick_rate}) + "\n")
+        self.tick = 0
+        self.last = None
+
+    def keys(self):
+        keys = pygame.key.get_pressed()
+        pressed = pressed_keys(keys)
+        if pressed != self.last:
+            self.file.write(json.dumps({"Tick": self.tick, "Keys": pressed}) + "\n")
+            self.last = pressed
+        self.tick += 1
+        return keys
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write(json.dumps({"Ticks": self.tick}) + "\n")
+            self.file.close()
+
+
+class InputReplay:
+    def __init__(self, path):
+        with open(path) as replay_file:
+            lines = [json.loads(line) for line in replay_file if line.strip()]
+        self.tick_rate = lines[0]["Tick Rate"]
+        self.changes = {line["Tick"]: KeyState(line["Keys"]) for line in lines if "Tick" in line}
+        # A recording cut short (game crashed) replays up to its last change
+        ends = [line["Ticks"] for line in lines if "Ticks" in line]
+        self.ticks = ends[0] if ends else max(self.changes, default=-1) + 1
+        self.tick = 0
+        self.state = KeyState()
+
+    @property
+    def finished(self):
+        return self.tick >= self.ticks
+
+    def keys(self):
+        self.state = self.changes.get(self.tick, self.state)
+        self.tick += 1
+        return self.state
+
+    def close(self):
+        pass
@@ -0,0 +1,137 @@
+import numpy as np
+
+# Integrators for the rocket state vector. Each one exposes
+#     step(f, t, y, dt) -> (t_new, y_new, dt_next)
+# where f(t, y) returns dy/dt. Fixed step methods always return dt_next == dt,
+# adaptive ones pick their own dt_next. advance(f, t, y, dt) takes exactly one
+# step of length dt with no error control, which is what the event root
+# finding in events.py uses to split a step. Every integrator counts the steps it
+# accepted and rejected and the number of f evaluations so runs can be compared
+
+
+class RK4:
+    # Classic fixed step Runge Kutta Fourth Order
+    name = "rk4"
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.evaluations = 0
+
+    def advance(self, f, t, y, dt):
+        k1 = f(t, y)
+        k2 = f(t + dt / 2, y + dt / 2 * k1)
+        k3 = f(t + dt / 2, y + dt / 2 * k2)
+        k4 = f(t + dt, y + dt * k3)
+        self.evaluations += 4
+        return y + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+    def step(self, f, t, y, dt):
+        self.accepted += 1
+        return t + dt, self.advance(f, t, y, dt), dt
+
+    @property
+    def settings(self):
+        return {"Integrator": self.name}
+
+    @property
+    def stats(self):
+        return {
+            "Integrator": self.name,
+            "Accepted Steps": self.accepted,
+            "Rejected Steps": self.rejected,
+            "Evaluations": self.evaluations,
+        }
+
+
+class DormandPrince(RK4):
+    # Adaptive Dormand Prince RK5(4) with the embedded fourth order solution used
+    # as the error estimate. Steps grow through the long steady burns and shrink
+    # where the forces change quickly (max-Q, staging, burnout)
+    name = "rk45"
+
+    # Butcher tableau
+    C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1])
+    A = (
+        (),
+        (1 / 5,),
+        (3 / 40, 9 / 40),
+        (44 / 45, -56 / 15, 32 / 9),
+        (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+        (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+        (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+    )
+    # Fifth order weights are the last row of A (first same as last)
+    B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0])
+    B_STAR = np.array(
+        [5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40]
+    )
+    E = B - B_STAR
+
+    def __init__(
+        self, rtol=1e-6, atol=1e-3, min_step=1e-6, max_step=np.inf, safety=0.9
+    ):
+        super().__init__()
+        self.rtol = rtol
+        self.atol = atol
+        self.min_step = min_step
+        self.max_step = max_step
+        self.safety = safety
+
+    @property
+    def settings(self):
+        return {
+            "Integrator": self.name,
+            "rtol": self.rtol,
+            "atol": self.atol,
+            "Min Step": self.min_step,
+            "Max Step": self.max_step,
+            "Safety": self.safety,
+        }
+
+    def attempt(self, f, t, y, dt):
+        k = np.empty((7, len(y)))
+        k[0] = f(t, y)
+        for i in range(1, 7):
+            k[i] = f(t + self.C[i] * dt, y + dt * np.dot(self.A[i], k[:i]))
+        self.evaluations += 7
+
+        y_new = y + dt * np.dot(self.B, k)
+        scale = self.atol + self.rtol * np.maximum(np.abs(y), np.abs(y_new))
+        error = np.sqrt(np.mean((dt * np.dot(self.E, k) / scale) ** 2))
+        return y_new, error
+
+    def advance(self, f, t, y, dt):
+        return self.attempt(f, t, y, dt)[0]
+
+    def step(self, f, t, y, dt):
+        dt = min(dt, self.max_step)
+        while True:
+            y_new, error = self.attempt(f, t, y, dt)
+
+            if error <= 1 or dt <= self.min_step:
+                self.accepted += 1
+                # Grow by at most 5x so a quiet stretch can't overshoot the next event
+                growth = 5 if error == 0 else min(5, self.safety * error**-0.2)
+                dt_next = min(max(dt * growth, self.min_step), self.max_step)
+                return t + dt, y_new, dt_next
+
+            self.rejected += 1
+            dt = max(dt * max(0.2, self.safety * error**-0.25), self.min_step)
+
+
+INTEGRATORS = {
+    "rk4": RK4,
+    "rk45": DormandPrince,
+}
+
+
+def create_integrator(name, **options):
+    # Look an integrator up by its command line name ("euler" means the legacy
+    # Rocket.update loop and is handled by rocket.simulate itself)
+    try:
+        return INTEGRATORS[name](**options)
+    except KeyError:
+        raise ValueError(
+            f"Unknown integrator {name!r}, expected one of {sorted(INTEGRATORS)}"
+        ) from None
@@ -0,0 +1,450 @@
+import math
+
+import numpy as np
+from atmosphere import ATMOSPHERE_TABLE, DRAG_TABLE
+from ensemble import RocketEnsemble, simulate_ensemble, stage_columns
+from settings import *
+from vehicles import stage_stack
+
+# Compiled step kernel for dispersed flights of any stage stack (vehicles.py).
+# flight_kernel is the Rocket.update step (flight controller, stage masses,
+# atmosphere and drag tables, gravity, integration) written as plain loops
+# over cases and steps, so numba can compile it when it is installed. The
+# stack's separation rules and pitch program come in as arrays, see
+# stack_tables. Without numba it still runs, as slow plain Python, and the
+# "auto" backend uses the NumPy RocketEnsemble path instead for stacks shaped
+# like Block 1 (the only ones RocketEnsemble flies).
+#
+#   python kernels.py --check    compare the kernel against RocketEnsemble
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def table_lookup(intercepts, slopes, start, inverse_step, x):
+    # UniformTable lookup for one value, same arithmetic as its scalar branch
+    last = len(intercepts) - 1
+    position = (x - start) * inverse_step
+    if position <= 0.0:
+        return intercepts[0] + slopes[0] * start
+    if position >= last:
+        return intercepts[last]
+    index = int(position)
+    return intercepts[index] + slopes[index] * x
+
+
+def flight_kernel(
+    dry_mass,
+    prop_mass,
+    stage_mass,
+    mass_flow,
+    mass_flow_nominal,
+    exhaust_velocity,
+    exhaust_velocity_nominal,
+    stage_reference_area,
+    stage_thrust,
+    firing,
+    attached,
+    theta,
+    groups,
+    phase_pitch,
+    density_intercepts,
+    density_slopes,
+    sound_intercepts,
+    sound_slopes,
+    atmosphere_start,
+    atmosphere_inverse_step,
+    drag_intercepts,
+    drag_slopes,
+    drag_start,
+    drag_inverse_step,
+    gravity_parameter,
+    earth_radius,
+    dt,
+    steps,
+    record_every,
+    pos,
+    velocity,
+    max_altitude,
+    group,
+    phase,
+    altitude_history,
+    velocity_history,
+):
+    # Flies every case for `steps` steps, updating the per stage (n, stages)
+    # and per case (n,) arrays passed in, in place. groups and phase_pitch are
+    # the stack's rules from stack_tables, group / phase the current group and
+    # phase of every case. Every `record_every` steps altitude and velocity go
+    # into the (n, samples) history arrays
+    n = dry_mass.shape[0]
+    stages = dry_mass.shape[1]
+    group_count, width = groups.shape
+    phase_width = 1 << width
+    for case in prange(n):
+        dry = dry_mass[case]
+        prop = prop_mass[case]
+        mass = stage_mass[case]
+        flow = mass_flow[case]
+        exhaust = exhaust_velocity[case]
+        area = stage_reference_area[case]
+        stage_thrusts = stage_thrust[case]
+        stage_firing = firing[case]
+        stage_attached = attached[case]
+
+        x = pos[case, 0]
+        y = pos[case, 1]
+        v = velocity[case]
+        pitch = theta[case]
+        current_group = group[case]
+        current_phase = phase[case]
+        highest = max_altitude[case]
+        # Flags are set again only when the group or its burning stages change
+        applied_group = -1
+        applied_burning = -1
+
+        for step in range(steps):
+            # Flight controller, the rules of Rocket.flight_controller: the
+            # current group is the lowest one with propellant left (or the top
+            # one), burning is a bit mask of its stages still burning
+            while True:
+                burning = 0
+                for slot in range(width):
+                    stage = groups[current_group, slot]
+                    if stage >= 0 and prop[stage] > 0:
+                        burning |= 1 << slot
+                if burning or current_group == group_count - 1:
+                    break
+                current_group += 1
+            if current_group != applied_group or burning != applied_burning:
+                applied_group = current_group
+                applied_burning = burning
+                attached_mask = 0
+                for number in range(group_count):
+                    for slot in range(width):
+                        stage = groups[number, slot]
+                        if stage < 0:
+                            continue
+                        if number < current_group or (
+                            number == current_group and burning and not burning & (1 << slot)
+                        ):
+                            stage_firing[stage] = False
+                            stage_attached[stage] = False
+                        elif number > current_group:
+                            stage_firing[stage] = False
+                        elif stage_attached[stage]:
+                            stage_firing[stage] = True
+                            attached_mask |= 1 << slot
+                current_phase = current_group * phase_width + attached_mask
+                if not math.isnan(phase_pitch[case, current_phase]):
+                    pitch = phase_pitch[case, current_phase]
+
+            # Stages
+            total_mass = 0.0
+            thrust = 0.0
+            for stage in range(stages):
+                prop[stage] = max(prop[stage] + flow[stage] * dt, 0.0)
+                mass[stage] = max(prop[stage] + dry[stage], 0.0)
+                if stage_firing[stage]:
+                    flow[stage] = mass_flow_nominal[case, stage]
+                    exhaust[stage] = exhaust_velocity_nominal[case, stage]
+                else:
+                    flow[stage] = 0.0
+                    exhaust[stage] = 0.0
+                if not stage_attached[stage]:
+                    dry[stage] = 0.0
+                    area[stage] = 0.0
+                stage_thrusts[stage] = exhaust[stage] * flow[stage] if prop[stage] > 0 else 0.0
+                total_mass += mass[stage]
+                if stage_firing[stage]:
+                    thrust += stage_thrusts[stage]
+
+            # Atmosphere, and the reference area of the current group's first stage
+            density = table_lookup(density_intercepts, density_slopes, atmosphere_start, atmosphere_inverse_step, y)
+            reference_area = area[groups[current_group, 0]]
+
+            # Drag
+            sound = table_lookup(sound_intercepts, sound_slopes, atmosphere_start, atmosphere_inverse_step, y)
+            mach = v / sound
+            drag_coefficient = table_lookup(drag_intercepts, drag_slopes, drag_start, drag_inverse_step, mach)
+            drag = 0.5 * density * (v**2) * drag_coefficient * reference_area
+            drag_force = -drag if v > 0 else drag
+
+            # Acceleration, velocity and position
+            gravity = gravity_parameter / ((earth_radius + y) ** 2)
+            acceleration = (thrust + total_mass * -gravity + drag_force) / total_mass
+            v = v + acceleration * dt
+            radians = pitch * (math.pi / 180.0)
+            distance = v * dt + 0.5 * acceleration * dt**2
+            x += distance * math.cos(radians)
+            y += distance * math.sin(radians)
+            if y > highest:
+                highest = y
+
+            if record_every > 0 and (step + 1) % record_every == 0:
+                sample = (step + 1) // record_every - 1
+                altitude_history[case, sample] = y
+                velocity_history[case, sample] = v
+
+        pos[case, 0] = x
+        pos[case, 1] = y
+        velocity[case] = v
+        theta[case] = pitch
+        max_altitude[case] = highest
+        group[case] = current_group
+        phase[case] = current_phase
+
+
+if numba is not None:
+    prange = numba.prange
+    compiled_kernel = numba.njit(parallel=True, cache=True)(flight_kernel)
+    table_lookup = numba.njit(cache=True)(table_lookup)
+else:
+    prange = range
+    compiled_kernel = None
+
+
+def stack_tables(stack, flight_program, n):
+    # A StageStack's rules as kernel arrays. "Groups" is (groups, width) stage
+    # indices padded with -1. A phase is group * 2**width + the bit mask of
+    # the group's stages still attached, "Phase Names" names each one like
+    # Rocket.current_stage and "Phase Pitch" (n, phases) is the pitch it sets,
+    # NaN where the stack keeps the previous pitch. Flight program values may
+    # be dispersed arrays of n values
+    width = max(len(group) for group in stack.groups)
+    groups = np.full((len(stack.groups), width), -1, dtype=np.int64)
+    names = []
+    phase_pitch = np.full((n, len(stack.groups) << width), np.nan)
+    for number, group in enumerate(stack.groups):
+        groups[number, : len(group)] = group
+        for mask in range(1 << width):
+            name = " ".join(stack.stage_names[index] for slot, index in enumerate(group) if mask & (1 << slot))
+            names.append(name)
+            if name in stack.pitch:
+                phase_pitch[:, len(names) - 1] = flight_program[stack.pitch[name]]
+    return {"Groups": groups, "Phase Pitch": phase_pitch, "Phase Names": names}
+
+
+class KernelFlights:
+    # The arrays flight_kernel updates for n cases of one stack, named like
+    # the RocketEnsemble attributes they mirror. parameters is one settings
+    # dictionary per stage in stack order, any value may be an array of n
+    # dispersed values
+    def __init__(self, n, stack, parameters, flight_program=FLIGHT_PROGRAM):
+        self.n = n
+        self.stack = stage_stack(stack)
+        columns = stage_columns(n, *parameters)
+        stages = len(parameters)
+
+        self.dry_mass = columns["Dry Mass"]
+        self.prop_mass = columns["Propellant Mass"]
+        self.stage_mass = self.dry_mass + self.prop_mass
+        self.mass_flow = columns["Mass Flow"]
+        self.mass_flow_copy = self.mass_flow.copy()
+        self.exhaust_velocity = columns["Exhaust Velocity"]
+        self.exhaust_velocity_copy = self.exhaust_velocity.copy()
+        self.stage_reference_area = columns["Reference Area"]
+        self.stage_thrust = np.zeros((n, stages))
+        self.firing = np.ones((n, stages), dtype=bool)
+        self.attached = np.ones((n, stages), dtype=bool)
+
+        self.tables = stack_tables(self.stack, flight_program, n)
+        self.group = np.zeros(n, dtype=np.int64)
+        self.phase = np.zeros(n, dtype=np.int64)
+        self.rocket_velocity = np.zeros(n)
+        self.pos = np.zeros((n, 2))
+        self.theta = np.broadcast_to(
+            np.asarray(flight_program["Launch Pitch"], dtype=float), (n,)
+        ).copy()
+        self.max_altitude = np.zeros(n)
+
+    @property
+    def total_mass(self):
+        return self.stage_mass.sum(axis=1)
+
+    @property
+    def total_propellant_mass(self):
+        return self.prop_mass.sum(axis=1)
+
+
+
+
+def fly_kernel(flights, dt=0.1, t_end=1000, record_every=None, compiled=True):
+    # Kernel counterpart of ensemble.simulate_ensemble for KernelFlights, same
+    # result layout. The flights' arrays are updated in place
+    kernel = compiled_kernel if compiled and compiled_kernel is not None else flight_kernel
+    steps = int(round(t_end / dt))
+    samples = steps // record_every if record_every else 0
+    altitude_history = np.zeros((flights.n, samples))
+    velocity_history = np.zeros((flights.n, samples))
+    density = ATMOSPHERE_TABLE.coefficients("Density")
+    sound = ATMOSPHERE_TABLE.coefficients("Speed of Sound")
+    drag = DRAG_TABLE.coefficients("Drag Coefficient")
+
+    kernel(
+        flights.dry_mass,
+        flights.prop_mass,
+        flights.stage_mass,
+        flights.mass_flow,
+        flights.mass_flow_copy,
+        flights.exhaust_velocity,
+        flights.exhaust_velocity_copy,
+        flights.stage_reference_area,
+        flights.stage_thrust,
+        flights.firing,
+        flights.attached,
+        flights.theta,
+        flights.tables["Groups"],
+        flights.tables["Phase Pitch"],
+        density[0],
+        density[1],
+        sound[0],
+        sound[1],
+        float(ATMOSPHERE_TABLE.start),
+        1.0 / ATMOSPHERE_TABLE.step,
+        drag[0],
+        drag[1],
+        float(DRAG_TABLE.start),
+        1.0 / DRAG_TABLE.step,
+        GRAVITATIONAL_CONSTANT * EARTH_MASS,
+        float(EARTH_RADIUS),
+        dt,
+        steps,
+        record_every or 0,
+        flights.pos,
+        flights.rocket_velocity,
+        flights.max_altitude,
+        flights.group,
+        flights.phase,
+        altitude_history,
+        velocity_history,
+    )
+
+    results = {
+        "Time": steps * dt,
+        "Altitude": flights.pos[:, 1].copy(),
+        "X Position": flights.pos[:, 0].copy(),
+        "Velocity": flights.rocket_velocity.copy(),
+        "Max Altitude": flights.max_altitude.copy(),
+        "Current Total Mass": flights.total_mass,
+        "Total Fuel Remaining": flights.total_propellant_mass,
+        "Stage": np.array(flights.tables["Phase Names"])[flights.phase],
+    }
+    if record_every:
+        results["Altitude History"] = altitude_history
+        results["Velocity History"] = velocity_history
+    return results
+
+
+def ensemble_stack(stack):
+    # RocketEnsemble's masks hard code the Block 1 rules: two stages that
+    # fly together, one upper stage, "Core Pitch" / "Interim Pitch"
+    names = stack.stage_names
+    return stack.groups == ((0, 1), (2,)) and stack.pitch == {
+        names[0]: "Core Pitch",
+        names[2]: "Interim Pitch",
+    }
+
+
+BACKENDS = ("auto", "numpy", "kernel")
+
+
+def fly_dispersed(
+    n,
+    core=None,
+    srb=None,
+    interim=None,
+    flight_program=FLIGHT_PROGRAM,
+    dt=0.1,
+    t_end=1000,
+    record_every=None,
+    backend="auto",
+    vehicle="Block 1",
+    stages=None,
+):
+    # n dispersed flights of a vehicle (as rocket.build_rocket: a VEHICLES
+    # name or definition, stage dictionaries replaced by name in `stages` or
+    # through the core / srb / interim shortcuts) on the chosen backend.
+    # "auto" is the compiled kernel when numba is installed, or the stack
+    # isn't one RocketEnsemble can fly, and the NumPy RocketEnsemble
+    # otherwise. "kernel" forces the kernel (plain Python without numba, only
+    # sensible for small n)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    overrides = dict(stages or {})
+    for name, parameters in (("Core", core), ("SRB", srb), ("Interim", interim)):
+        if parameters is not None:
+            overrides[name] = parameters
+    stack = stage_stack(vehicle)
+    unknown = set(overrides) - set(stack.stage_names)
+    if unknown:
+        raise ValueError(f"Vehicle {stack.name!r} has no stages {sorted(unknown)}, it has {list(stack.stage_names)}")
+    parameters = [
+        overrides.get(name, default) for name, default in zip(stack.stage_names, stack.stage_parameters)
+    ]
+
+    if backend == "numpy" or (backend == "auto" and compiled_kernel is None and ensemble_stack(stack)):
+        if not ensemble_stack(stack):
+            raise ValueError(
+                f"Vehicle {stack.name!r}: the NumPy backend only flies Block 1 shaped stacks, use backend='kernel'"
+            )
+        ensemble = RocketEnsemble(n, *parameters, flight_program=flight_program)
+        return simulate_ensemble(ensemble, dt=dt, t_end=t_end, record_every=record_every)
+    flights = KernelFlights(n, stack, parameters, flight_program=flight_program)
+    return fly_kernel(flights, dt=dt, t_end=t_end, record_every=record_every)
+
+
+def check_backends(n=16, dt=0.1, t_end=1000, record_every=10, seed=0, rtol=1e-9):
+    # Fly the same dispersed cases on the NumPy path and the kernel (compiled
+    # if numba is installed) and compare their trajectories. Returns
+    # {column: largest relative difference}, raises AssertionError past rtol
+    rng = np.random.default_rng(seed)
+    core = dict(CORE_STAGE)
+    srb = dict(SOLID_ROCKET_BOOSTERS)
+    core["Mass Flow"] = CORE_STAGE["Mass Flow"] * rng.normal(1, 0.01, n)
+    srb["Mass Flow"] = SOLID_ROCKET_BOOSTERS["Mass Flow"] * rng.normal(1, 0.01, n)
+
+    reference = fly_dispersed(n, core, srb, dt=dt, t_end=t_end, record_every=record_every, backend="numpy")
+    candidate = fly_dispersed(n, core, srb, dt=dt, t_end=t_end, record_every=record_every, backend="kernel")
+
+    differences = {}
+    for column, values in reference.items():
+        if column in ("Time", "Stage"):
+            continue
+        scale = np.maximum(np.abs(values), 1.0)
+        differences[column] = float(np.max(np.abs(candidate[column] - values) / scale))
+    if not np.array_equal(reference["Stage"], candidate["Stage"]):
+        raise AssertionError("Backends disagree on the final stage")
+    worst = max(differences, key=differences.get)
+    if differences[worst] > rtol:
+        raise AssertionError(f"Backends differ in {worst}: relative difference {differences[worst]:.3g} > {rtol:g}")
+    return differences
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Dispersed flights on the compiled kernel backend")
+    parser.add_argument("-n", type=int, default=10000, help="number of cases")
+    parser.add_argument("--dt", type=float, default=0.1, help="time step (s)")
+    parser.add_argument("--t-end", type=float, default=1000, help="flight time (s)")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto")
+    parser.add_argument("--check", action="store_true", help="compare the kernel and NumPy backends and exit")
+    args = parser.parse_args()
+
+    print(f"numba {'available' if numba is not None else 'not installed, kernel runs as plain Python'}")
+    if args.check:
+        start = time.perf_counter()
+        differences = check_backends(dt=args.dt, t_end=args.t_end)
+        for column, difference in differences.items():
+            print(f"  {column:<22} {difference:.3g}")
+        print(f"backends agree ({time.perf_counter() - start:.1f} s)")
+    else:
+        start = time.perf_counter()
+        results = fly_dispersed(args.n, dt=args.dt, t_end=args.t_end, backend=args.backend)
+        print(
+            f"{args.n} cases in {time.perf_counter() - start:.2f} s, max altitude "
+            f"{results['Max Altitude'].mean():.1f} +/- {results['Max Altitude'].std():.1f} m"
+        )
@@ -1,62 +1,212 @@
+import argparse
+import math
+import os
 import sys
+import time
+from bisect import insort
 
 import pygame
 from pygame.math import Vector2 as vector
-from pytmx.util_pygame import load_pygame
+from assets import cached_surface, decode_images
+from input_replay import InputRecorder, InputReplay, LiveInput
+from physics_worker import PhysicsLink
+from profiling import profiler, render_overlay
 from settings import *
-from tile import Clouds, GroundCollisionTile, Tile
+from tile import Clouds, GroundCollisionTile, Tile, moved
+from tilemap import ChunkStreamer, load_map
+from tracing import dump_on_error
 
 from player import Player
 
+PROFILER = profiler("Game Frame", total="Frame")
+
+
+def composite_layers(paths, premultiplied):
+    # Images laid over each other into one surface, decoded in parallel. The
+    # sky at the bottom is opaque and the rest are plain alpha blits onto it.
+    # A group of alpha layers over a different parallax factor is composited
+    # premultiplied so it can still be laid over what is below it in one blit
+    images = decode_images([(path, None) for path in paths])
+    surface = images[0].convert_alpha().premul_alpha() if premultiplied else images[0].convert()
+    for image in images[1:]:
+        if premultiplied:
+            surface.blit(image.convert_alpha().premul_alpha(), (0, 0), special_flags=pygame.BLEND_PREMULTIPLIED)
+        else:
+            surface.blit(image.convert_alpha(), (0, 0))
+    return surface
+
 
 class AllSprites(pygame.sprite.Group):
     def __init__(self):
         # fmt: off
         super().__init__()
-        # self.display_surface = pygame.display.get_surface()
+        self.display_surface = pygame.display.get_surface()
         # create offset for the player camera in vector format
         self.offset = vector()
-        self.bg_sky = pygame.image.load("../Map File/bg_sky.png").convert()
-        self.bg_space_1 = pygame.image.load("../Map File/bg_space_1.png").convert_alpha()
-        self.bg_space_2 = pygame.image.load("../Map File/bg_space_2.png").convert_alpha()
-        self.bg_space_3 = pygame.image.load("../Map File/bg_space_3.png").convert_alpha()
+        self.load_backgrounds()
+
+        # Draw index: z layer -> grid cell -> sprites, with the z layers kept in
+        # order as they first appear so drawing never sorts. A sprite is
+        # indexed by the bounds of its image, in every cell those overlap
+        self.cell_size = RENDERING["Cell Size"]
+        self.layers = {}
+        self.layer_order = []
+        self.indexed = {}  # sprite: (z, cells, bounds)
+        self.spanning = set()  # sprites in more than one cell
+        # Sprite.__init__ adds a sprite to its groups before it has an image,
+        # rect or z, so new sprites are indexed on the next refresh (dict as an
+        # ordered set). Sprites that move call tile.moved, which re-indexes
+        # just them, a frame never walks the sprites that stayed put
+        self.pending = {}
+
+    def load_backgrounds(self):
+        # Background images (RENDERING["Parallax"], bottom to top) are full map
+        # sized. Neighbouring layers with the same parallax factor are
+        # composited into one surface, kept in the asset cache, so a frame
+        # blits one window sized area per factor
+        groups = []  # [factor, [paths]]
+        for name, factor in RENDERING["Parallax"].items():
+            path = f"../Map File/{name}.png"
+            if groups and groups[-1][0] == factor:
+                groups[-1][1].append(path)
+            else:
+                groups.append([factor, [path]])
+
+        self.backgrounds = []  # [surface, factor, blit flags]
+        for index, (factor, paths) in enumerate(groups):
+            premultiplied = index > 0
+            surface = cached_surface(
+                paths,
+                {"Composite": "Premultiplied" if premultiplied else "Over Sky"},
+                lambda: composite_layers(paths, premultiplied),
+            )
+            flags = pygame.BLEND_PREMULTIPLIED if premultiplied else 0
+            self.backgrounds.append([surface, factor, flags])
+
+    def draw_backgrounds(self):
+        # Only the part under the window is blitted (area). Anything the sky
+        # doesn't cover (camera past the map edge) is filled first
+        for index, (surface, factor, flags) in enumerate(self.backgrounds):
+            area = pygame.Rect(
+                round(self.offset.x * factor),
+                round(self.offset.y * factor),
+                WINDOW_WIDTH,
+                WINDOW_HEIGHT,
+            )
+            if index == 0 and not surface.get_rect().contains(area):
+                self.display_surface.fill((100, 100, 100))
+            self.display_surface.blit(surface, (0, 0), area, flags)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.pending[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.pending.pop(sprite, None)
+        self.unindex(sprite)
+
+    def index(self, sprite):
+        bounds = sprite.image.get_rect(center=sprite.rect.center)
+        size = self.cell_size
+        cells = tuple(
+            (x, y)
+            for x in range(bounds.left // size, (bounds.right - 1) // size + 1)
+            for y in range(bounds.top // size, (bounds.bottom - 1) // size + 1)
+        )
+        if sprite.z not in self.layers:
+            self.layers[sprite.z] = {}
+            insort(self.layer_order, sprite.z)
+        layer = self.layers[sprite.z]
+        for cell in cells:
+            layer.setdefault(cell, []).append(sprite)
+        if len(cells) > 1:
+            self.spanning.add(sprite)
+        self.indexed[sprite] = (sprite.z, cells, bounds)
+
+    def unindex(self, sprite):
+        if sprite not in self.indexed:
+            return
+        z, cells, _ = self.indexed.pop(sprite)
+        layer = self.layers[z]
+        for cell in cells:
+            layer[cell].remove(sprite)
+            if not layer[cell]:
+                del layer[cell]
+        self.spanning.discard(sprite)
+
+    def moved(self, sprite):
+        # See tile.moved. Re-index the sprite if its bounds or layer changed,
+        # new sprites are indexed by refresh anyway
+        if sprite not in self.indexed:
+            return
+        z, _, bounds = self.indexed[sprite]
+        if sprite.z != z or sprite.image.get_rect(center=sprite.rect.center) != bounds:
+            self.unindex(sprite)
+            self.index(sprite)
+
+    def refresh(self):
+        # Index the sprites added since the last frame
+        for sprite in self.pending:
+            self.index(sprite)
+        self.pending.clear()
 
     def custom_draw(self, player):
+        self.refresh()
         self.offset.x = player.rect.centerx - WINDOW_WIDTH / 2
         self.offset.y = player.rect.centery - WINDOW_HEIGHT / 2
 
         # Blit the bg / fg images in order, before blitting the sprite objects on TOP nahmean
-        game.display_surface.blit(self.bg_sky, -self.offset)
-        game.display_surface.blit(self.bg_space_1, -self.offset)
-        game.display_surface.blit(self.bg_space_2, -self.offset)
-        game.display_surface.blit(self.bg_space_3, -self.offset)
+        self.draw_backgrounds()
+
+        # Only the grid cells under the window are looked at, sprites in them
+        # that are partly or wholly off screen are clipped by the blit. Sprites
+        # of one layer that overlap each other draw in grid order rather than
+        # the order they were added
+        size = self.cell_size
+        columns = range(math.floor(self.offset.x / size), math.floor((self.offset.x + WINDOW_WIDTH) / size) + 1)
+        rows = range(math.floor(self.offset.y / size), math.floor((self.offset.y + WINDOW_HEIGHT) / size) + 1)
+        cells = [(x, y) for x in columns for y in rows]
 
         # Draw sprites according to their z value (only pertains to objects, bg's order are above, idiot)
-        for sprite in sorted(self.sprites(), key=lambda sprite: sprite.z):
-            offset_rect = sprite.image.get_rect(center=sprite.rect.center)
-            offset_rect.center -= self.offset
-            # Only draw[blit] the sprites that are on screen. If not, they can fuck off
-            blit = True
-            if (
-                offset_rect.right <= 0
-                or offset_rect.left >= WINDOW_WIDTH
-                or offset_rect.bottom <= 0
-                or offset_rect.top >= WINDOW_HEIGHT
-            ):
-                blit = False
-
-            if blit:
-                game.display_surface.blit(sprite.image, offset_rect)
+        blits = []
+        for z in self.layer_order:
+            layer = self.layers[z]
+            drawn = set()
+            for cell in cells:
+                for sprite in layer.get(cell, ()):
+                    # Sprites over several cells are only drawn once
+                    if sprite in self.spanning:
+                        if sprite in drawn:
+                            continue
+                        drawn.add(sprite)
+                    offset_rect = self.indexed[sprite][2].copy()
+                    offset_rect.center -= self.offset
+                    blits.append((sprite.image, offset_rect))
+        self.display_surface.blits(blits, doreturn=False)
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, input_source=None, tick_rate=GAME_LOOP["Tick Rate"]):
         pygame.mixer.pre_init(44100, 16, 2, 4096)
         pygame.init()
         self.display_surface = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("Rocket Simulation")
         self.clock = pygame.time.Clock()
 
+        # Fixed step loop (see run), keys come from input_source every tick
+        self.input_source = input_source or LiveInput()
+        self.replaying = isinstance(self.input_source, InputReplay)
+        self.tick_rate = tick_rate
+        self.tick_count = 0
+        self.background = False
+        self.minimised = False
+
+        # Frame profiler overlay, toggled with F3 (see profiling.py)
+        self.profile_font = pygame.font.SysFont("monospace", 14)
+        self.profile_overlay = []
+        self.frame_count = 0
+
         # Groups
         self.all_sprites = AllSprites()
         self.collision_sprites = pygame.sprite.Group()
@@ -64,52 +214,187 @@ class Game:
 
         self.setup()
 
+        # Flight simulation in a worker process, drawn as the player sprite
+        # from where it starts (see physics_worker.py)
+        self.physics = None
+        if PHYSICS_WORKER["Enabled"]:
+            self.launch_pos = vector(self.player.rect.midbottom)
+            self.physics = PhysicsLink().start()
+
     def setup(self):
-        tmx_map = load_pygame("../Map File/RocketGame.tmx")
-        for x, y, surf in tmx_map.get_layer_by_name("Ground Non-Collision").tiles():
-            Tile(
-                pos=(x * 16, y * 16),
-                surf=surf,
-                group=self.all_sprites,
-                z=LAYERS["Ground Non-Collision"],
-            )
+        # Compiled once and cached, see tilemap.py
+        tile_map = load_map("../Map File/RocketGame.tmx")
+        # Static layer built in chunks around the camera as it moves (see
+        # ChunkStreamer), never all of it at once
+        self.ground = ChunkStreamer(
+            tile_map,
+            "Ground Non-Collision",
+            self.all_sprites,
+            LAYERS["Ground Non-Collision"],
+        )
 
-        for obj in tmx_map.get_layer_by_name("Clouds"):
+        for obj in tile_map.objects("Clouds"):
             Clouds(
-                pos=(obj.x, obj.y),
-                surf=obj.image,
+                pos=(obj["X"], obj["Y"]),
+                surf=obj["Image"],
                 group=[self.all_sprites, self.cloud_sprites],
                 z=LAYERS["Ground Objects"],
             )
 
-        for obj in tmx_map.get_layer_by_name("Player"):
-            if obj.name == "Player":
+        for obj in tile_map.objects("Player"):
+            if obj["Name"] == "Player":
                 self.player = Player(
-                    (obj.x, obj.y),
+                    (obj["X"], obj["Y"]),
                     self.all_sprites,
                     "../Player/keyframes",
                 )
 
+    def quit(self):
+        # Keep the frame timings of this session if profiling was on
+        if PROFILER.samples:
+            PROFILER.export()
+        if self.physics:
+            self.physics.stop()
+        self.input_source.close()
+        pygame.quit()
+        sys.exit()
+
+    def follow_physics(self):
+        # Interpolated worker state for this frame, nothing to do until the
+        # first snapshot arrives
+        state = self.physics.state()
+        if state is None:
+            return
+        scale = PHYSICS_WORKER["Pixels Per Metre"]
+        self.player.rect.midbottom = (
+            round(self.launch_pos.x + state["X Position"] * scale),
+            round(self.launch_pos.y - state["Altitude"] * scale),
+        )
+        self.player.pos.update(self.player.rect.topleft)
+        moved(self.player)
+
+    def draw_profile_overlay(self):
+        # Report text is only re-rendered every few frames, blitting is cheap
+        if self.frame_count % PROFILING["Overlay Refresh"] == 0 and PROFILER.samples:
+            self.profile_overlay = render_overlay(PROFILER, self.profile_font)
+        y = 10
+        for line in self.profile_overlay:
+            self.display_surface.blit(line, (10, y))
+            y += line.get_height()
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.quit()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                PROFILER.enabled = not PROFILER.enabled
+            # Background mode while the window has no focus or is minimised
+            if event.type == pygame.WINDOWFOCUSLOST:
+                self.background = True
+            if event.type == pygame.WINDOWFOCUSGAINED:
+                self.background = False
+            if event.type == pygame.WINDOWMINIMIZED:
+                self.minimised = True
+            if event.type == pygame.WINDOWRESTORED:
+                self.minimised = False
+
+    def frame_cap(self):
+        # 0 is no cap for Clock.tick
+        if self.background or self.minimised:
+            return GAME_LOOP["Background FPS"]
+        return GAME_LOOP["Max FPS"] or 0
+
+    def step(self, dt):
+        # One fixed tick of the game
+        self.player.keys = self.input_source.keys()
+        self.all_sprites.update(dt)
+        self.tick_count += 1
+
     def run(self):
+        # Fixed timestep: frame time goes into an accumulator that is spent in
+        # whole ticks, so sprites always move by the same dt whatever the frame
+        # rate. A replay runs exactly one tick per frame with no frame cap
+        tick = 1 / self.tick_rate
+        accumulator = 0.0
         while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-            # Run Delta Time
-            dt = self.clock.tick() * 0.001
-            self.display_surface.fill((100, 100, 100))
+            timer = PROFILER if PROFILER.enabled else None
+            if timer:
+                timer.start()
+            self.handle_events()
+            if timer:
+                timer.mark("Events")
+            if self.replaying:
+                if self.input_source.finished:
+                    self.quit()
+                accumulator += tick
+            else:
+                accumulator += self.clock.tick(self.frame_cap()) * 0.001
+            if timer:
+                timer.mark("Clock")
 
             # Update Sprites
-            self.all_sprites.update(dt)
+            steps = 0
+            while accumulator >= tick and steps < GAME_LOOP["Max Steps Per Frame"]:
+                self.step(tick)
+                accumulator -= tick
+                steps += 1
+            if accumulator >= tick:
+                accumulator = 0.0
+            if self.physics:
+                self.follow_physics()
+            self.ground.update(self.player.rect.center)
+            if timer:
+                timer.mark("Update")
 
-            # Drawing
+            # Drawing, nothing to see while minimised
+            # (custom_draw fills whatever the background doesn't cover)
+            if not self.minimised:
+                self.all_sprites.custom_draw(self.player)
+                if PROFILER.enabled:
+                    self.draw_profile_overlay()
+            if timer:
+                timer.mark("Draw")
 
-            self.all_sprites.custom_draw(self.player)
+            if not self.minimised:
+                pygame.display.update()
+            if timer:
+                timer.mark("Display")
+                timer.finish()
+            self.frame_count += 1
 
-            pygame.display.update()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rocket Simulation")
+    parser.add_argument("--record", metavar="FILE", help="record the keyboard input to FILE")
+    parser.add_argument("--replay", metavar="FILE", help="replay recorded input headless, as fast as possible")
+    parser.add_argument("--window", action="store_true", help="show the window while replaying")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        if not args.window:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+        replay = InputReplay(args.replay)
+        game = Game(replay, tick_rate=replay.tick_rate)
+        start = time.perf_counter()
+        try:
+            game.run()
+        except SystemExit:
+            elapsed = time.perf_counter() - start
+            print(
+                f"Replayed {game.tick_count} ticks in {elapsed:.2f} s "
+                f"({game.frame_count / elapsed:.0f} frames/s), "
+                f"player at ({game.player.pos.x:.0f}, {game.player.pos.y:.0f})"
+            )
+            raise
+    elif args.record:
+        game = Game(InputRecorder(args.record, GAME_LOOP["Tick Rate"]))
+        game.run()
+    else:
+        game = Game()
+        game.run()
 
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    # Dump the trace buffer (see tracing.py) if the game crashes
+    with dump_on_error():
+        main()
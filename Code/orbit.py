@@ -0,0 +1,109 @@
+import math
+
+from settings import EARTH_MASS, GRAVITATIONAL_CONSTANT
+
+# Two body (Kepler) propagation for unpowered flight above the atmosphere,
+# using the universal variable formulation so elliptic, parabolic and
+# hyperbolic trajectories all go through the same code. Vectors are 3-tuples
+# of floats in the Earth centred inertial frame used by rocket.VectorRocket.
+# Reference: Curtis, Orbital Mechanics for Engineering Students, algorithms 3.3
+# and 3.4
+
+EARTH_MU = GRAVITATIONAL_CONSTANT * EARTH_MASS  # m**3 / s**2
+
+
+def dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def cross(a, b):
+    return (
+        a[1] * b[2] - a[2] * b[1],
+        a[2] * b[0] - a[0] * b[2],
+        a[0] * b[1] - a[1] * b[0],
+    )
+
+
+def norm(a):
+    return math.sqrt(a[0] * a[0] + a[1] * a[1] + a[2] * a[2])
+
+
+def stumpff_c(z):
+    if z > 1e-8:
+        return (1 - math.cos(math.sqrt(z))) / z
+    if z < -1e-8:
+        return (math.cosh(math.sqrt(-z)) - 1) / -z
+    return 0.5 - z / 24
+
+
+def stumpff_s(z):
+    if z > 1e-8:
+        root = math.sqrt(z)
+        return (root - math.sin(root)) / root**3
+    if z < -1e-8:
+        root = math.sqrt(-z)
+        return (math.sinh(root) - root) / root**3
+    return 1 / 6 - z / 120
+
+
+def universal_anomaly(dt, r0, radial_velocity, alpha, mu=EARTH_MU, tolerance=1e-10, iterations=100):
+    # Newton iteration on the universal Kepler equation for chi after dt
+    root_mu = math.sqrt(mu)
+    chi = root_mu * abs(alpha) * dt
+    for _ in range(iterations):
+        z = alpha * chi * chi
+        c, s = stumpff_c(z), stumpff_s(z)
+        f = (
+            r0 * radial_velocity / root_mu * chi * chi * c
+            + (1 - alpha * r0) * chi**3 * s
+            + r0 * chi
+            - root_mu * dt
+        )
+        derivative = (
+            r0 * radial_velocity / root_mu * chi * (1 - z * s)
+            + (1 - alpha * r0) * chi * chi * c
+            + r0
+        )
+        step = f / derivative
+        chi -= step
+        if abs(step) <= tolerance * max(1.0, abs(chi)):
+            break
+    return chi
+
+
+def period(r, v, mu=EARTH_MU):
+    # Orbital period in seconds, infinite for open trajectories
+    alpha = 2 / norm(r) - dot(v, v) / mu
+    return 2 * math.pi / math.sqrt(mu * alpha**3) if alpha > 0 else math.inf
+
+
+def periapsis_radius(r, v, mu=EARTH_MU):
+    h = norm(cross(r, v))
+    energy = dot(v, v) / 2 - mu / norm(r)
+    eccentricity = math.sqrt(max(0.0, 1 + 2 * energy * h * h / (mu * mu)))
+    return h * h / (mu * (1 + eccentricity))
+
+
+def propagate(r0, v0, dt, mu=EARTH_MU):
+    # (r, v) after coasting dt seconds from (r0, v0), in one call however long
+    # dt is. Whole revolutions of a closed orbit are dropped first
+    orbit_period = period(r0, v0, mu)
+    if math.isfinite(orbit_period):
+        dt = math.fmod(dt, orbit_period)
+
+    r0_norm = norm(r0)
+    radial_velocity = dot(r0, v0) / r0_norm
+    alpha = 2 / r0_norm - dot(v0, v0) / mu
+    chi = universal_anomaly(dt, r0_norm, radial_velocity, alpha, mu)
+
+    z = alpha * chi * chi
+    c, s = stumpff_c(z), stumpff_s(z)
+    f = 1 - chi * chi / r0_norm * c
+    g = dt - chi**3 / math.sqrt(mu) * s
+    r = tuple(f * a + g * b for a, b in zip(r0, v0))
+
+    r_norm = norm(r)
+    f_dot = math.sqrt(mu) / (r_norm * r0_norm) * (alpha * chi**3 * s - chi)
+    g_dot = 1 - chi * chi / r_norm * c
+    v = tuple(f_dot * a + g_dot * b for a, b in zip(r0, v0))
+    return r, v
@@ -0,0 +1,234 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from settings import *
+
+# Flight simulation in its own process, so the physics rate doesn't depend on
+# the frame rate. The worker steps a Rocket at PHYSICS_WORKER["Rate"] Hz of
+# simulated time and publishes a snapshot after every step into a ring buffer
+# in shared memory. The game (PhysicsLink.state) reads the newest snapshots
+# and interpolates between them for the frame being drawn. Neither side ever
+# waits for the other: a slow frame just skips snapshots, a slow physics step
+# just means the game interpolates up to the last one published.
+#
+# The ring has one writer and any number of readers and no lock. Each slot
+# starts with its sequence number, the writer sets it to -1 before filling the
+# slot and to the snapshot's number after, then bumps the published count. A
+# reader copies a slot and checks the sequence number before and after, a
+# mismatch means the writer lapped it and the snapshot is skipped.
+#
+#   python physics_worker.py    run a worker headless and print what a reader sees
+
+# Snapshot columns after the sequence number. "Tick" is the real time
+# (perf_counter) the step was scheduled for, what readers interpolate on
+FIELDS = ("Tick", "Time", "X Position", "Altitude", "Velocity", "Theta", "Total Mass")
+TICK = FIELDS.index("Tick")
+
+# Header: published snapshot count, worker finished flag
+HEADER_SIZE = 2
+
+
+class SnapshotRing:
+    # Views over a shared memory block, created by the game and attached to by
+    # name in the worker
+    def __init__(self, slots, name=None):
+        self.slots = slots
+        size = (HEADER_SIZE + slots * (len(FIELDS) + 1)) * 8
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.name = self.memory.name
+        self.header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=self.memory.buf)
+        self.ring = np.ndarray(
+            (slots, len(FIELDS) + 1),
+            dtype=np.float64,
+            buffer=self.memory.buf,
+            offset=HEADER_SIZE * 8,
+        )
+        if name is None:
+            self.header[:] = 0
+            self.ring[:, 0] = -1
+
+    @property
+    def count(self):
+        return int(self.header[0])
+
+    @property
+    def done(self):
+        return bool(self.header[1])
+
+    def publish(self, values):
+        # Writer only
+        count = int(self.header[0])
+        row = self.ring[count % self.slots]
+        row[0] = -1
+        row[1:] = values
+        row[0] = count
+        self.header[0] = count + 1
+
+    def finish(self):
+        self.header[1] = 1
+
+    def read(self, number):
+        # Copy of snapshot `number`, None if it has been overwritten (or is
+        # being written)
+        row = self.ring[number % self.slots]
+        if row[0] != number:
+            return None
+        snapshot = row[1:].copy()
+        if row[0] != number:
+            return None
+        return snapshot
+
+    def close(self, unlink=False):
+        # Drop the views first, SharedMemory.close refuses while they exist
+        del self.header, self.ring
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+def run_worker(name, slots, vehicle, rate, time_scale, t_end, max_catch_up, stop):
+    # Worker process entry point. Steps are scheduled on real time, each one
+    # dt / time_scale after the previous. After a stall it catches up at most
+    # max_catch_up steps at once, then drops the rest of the backlog so it
+    # doesn't spiral
+    from rocket import build_rocket
+
+    ring = SnapshotRing(slots, name)
+    rocket = build_rocket(vehicle=vehicle)
+    dt = 1 / rate
+    interval = dt / time_scale
+    steps = int(round(t_end / dt))
+    step = 0
+    tick = time.perf_counter()
+    try:
+        while step < steps and not stop.is_set():
+            now = time.perf_counter()
+            caught_up = 0
+            while tick <= now and step < steps and caught_up < max_catch_up:
+                rocket.update(dt)
+                step += 1
+                caught_up += 1
+                ring.publish(
+                    (
+                        tick,
+                        step * dt,
+                        rocket.pos[0],
+                        rocket.pos[1],
+                        rocket.rocket_velocity,
+                        rocket.theta,
+                        rocket.current_total_mass,
+                    )
+                )
+                tick += interval
+            if tick < now:
+                tick = now
+            time.sleep(max(0.0, tick - time.perf_counter()))
+    finally:
+        ring.finish()
+        ring.close()
+
+
+class PhysicsLink:
+    # Game side of the worker: owns the shared memory, starts / stops the
+    # process and turns snapshots into interpolated states
+    def __init__(
+        self,
+        vehicle=PHYSICS_WORKER["Vehicle"],
+        rate=PHYSICS_WORKER["Rate"],
+        time_scale=PHYSICS_WORKER["Time Scale"],
+        t_end=PHYSICS_WORKER["T End"],
+        slots=PHYSICS_WORKER["Slots"],
+        max_catch_up=PHYSICS_WORKER["Max Catch Up"],
+    ):
+        self.ring = SnapshotRing(slots)
+        # Draw one step behind the newest snapshot so there is (nearly)
+        # always a pair of snapshots around the drawn time
+        self.delay = 1 / rate / time_scale
+        # spawn so the worker starts the same way on every OS, without a copy
+        # of pygame's state
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = context.Event()
+        self.process = context.Process(
+            target=run_worker,
+            args=(self.ring.name, slots, vehicle, rate, time_scale, t_end, max_catch_up, self.stop_event),
+            daemon=True,
+        )
+        self.last = None
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def stop(self):
+        if self.ring is None:
+            return
+        self.stop_event.set()
+        if self.process.is_alive() or self.process.exitcode is None:
+            self.process.join(timeout=5)
+        self.ring.close(unlink=True)
+        self.ring = None
+
+    @property
+    def done(self):
+        return self.ring.done
+
+    def latest(self, count=2):
+        # Up to `count` newest snapshots, oldest first. Snapshots the worker
+        # overwrote while we read are left out
+        published = self.ring.count
+        snapshots = []
+        for number in range(published - 1, max(published - 1 - count, -1), -1):
+            snapshot = self.ring.read(number)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        snapshots.reverse()
+        return snapshots
+
+    def state(self, now=None):
+        # {field: value} interpolated at `now` (perf_counter) minus one step, or
+        # the last state if nothing new was published. None before the first
+        # snapshot
+        now = time.perf_counter() if now is None else now
+        draw_tick = now - self.delay
+        snapshots = self.latest(count=4)
+        if not snapshots:
+            return self.last
+        # Newest pair with the older snapshot at or before draw_tick, the
+        # oldest snapshot if they are all newer
+        values = snapshots[0]
+        for index in range(len(snapshots) - 1, 0, -1):
+            before, after = snapshots[index - 1], snapshots[index]
+            if before[TICK] <= draw_tick:
+                span = after[TICK] - before[TICK]
+                alpha = min(1.0, (draw_tick - before[TICK]) / span) if span > 0 else 1.0
+                values = before + (after - before) * alpha
+                break
+        self.last = dict(zip(FIELDS, values.tolist()))
+        return self.last
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the physics worker headless and print the interpolated state")
+    parser.add_argument("--seconds", type=float, default=3, help="real time to run for")
+    parser.add_argument("--fps", type=float, default=30, help="reader polls per second")
+    parser.add_argument("--time-scale", type=float, default=PHYSICS_WORKER["Time Scale"])
+    args = parser.parse_args()
+
+    link = PhysicsLink(time_scale=args.time_scale).start()
+    try:
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.seconds and not link.done:
+            state = link.state()
+            if state:
+                print(
+                    f"t={state['Time']:8.2f} s  x={state['X Position']:10.1f} m  "
+                    f"altitude={state['Altitude']:10.1f} m  v={state['Velocity']:8.1f} m/s  "
+                    f"published={link.ring.count}"
+                )
+            time.sleep(1 / args.fps)
+    finally:
+        link.stop()
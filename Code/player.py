@@ -1,8 +1,15 @@
+import os
 from os import walk
 
 import pygame
 from pygame.math import Vector2 as vector
+from assets import load_images
+from atlas import TextureAtlas
 from settings import *
+from tile import moved
+from tracing import channel
+
+TRACER = channel("player")
 
 
 class Player(pygame.sprite.Sprite):
@@ -18,30 +25,44 @@ class Player(pygame.sprite.Sprite):
         self.direction = vector()
         self.pos = vector(self.rect.topleft)
         self.speed = 1000
+        # Held keys for this tick, set by Game.step (live, recorded or
+        # replayed, see input_replay.py). None reads the keyboard directly
+        self.keys = None
 
-    def import_assets(self, path):
+    def import_assets(self, path, atlas=False):
         self.animations = {}
 
+        frames = []
         for index, folder in enumerate(walk(path)):
             if index == 0:
                 for name in folder[1]:
                     self.animations[name] = []
             else:
+                # Animation name is the folder's own name, on any OS
+                key_value = os.path.basename(os.path.normpath(folder[0].replace("\\", "/")))
+                # Normalize the size of the rocket since the
+                # idle rocket and animated rocket differ in size
+                # pixel sizes are best estimate
+                size = (50, 79) if key_value == "idle" else (46, 120)
                 for file_name in sorted(
                     folder[2],
                     key=lambda file_name_string: int(file_name_string.split(".")[0]),
                 ):
                     path = folder[0].replace("\\", "/") + "/" + file_name
-                    surf = pygame.image.load(path).convert_alpha()
-                    # Normalize the size of the rocket since the
-                    # idle rocket and animated rocket differ in size
-                    # pixel sizes are best estimate
-                    if folder[0].split("\\")[1] == "idle":
-                        surf = pygame.transform.scale(surf, (50, 79)).convert_alpha()
-                    else:
-                        surf = pygame.transform.scale(surf, (46, 120)).convert_alpha()
-                    key_value = folder[0].split("\\")[1]
-                    self.animations[key_value].append(surf)
+                    frames.append((key_value, (path, size, True)))
+
+        # Decoded, scaled and converted through the asset cache (see assets.py),
+        # each frame its own surface. atlas=True packs them into one atlas
+        # page, every frame a subsurface of it. Off by default: one animated
+        # sprite gets no batching from it and the page costs more memory and
+        # load time than the frames (python atlas.py)
+        surfaces = load_images([spec for _, spec in frames])
+        self.atlas = None
+        if atlas:
+            self.atlas = TextureAtlas(surfaces)
+            surfaces = self.atlas.surfaces()
+        for (key_value, _), surf in zip(frames, surfaces):
+            self.animations[key_value].append(surf)
 
     def animate(self, dt):
         self.frame_index += 10 * dt
@@ -50,7 +71,7 @@ class Player(pygame.sprite.Sprite):
         self.image = self.animations[self.status][int(self.frame_index)]
 
     def input(self):
-        keys = pygame.key.get_pressed()
+        keys = pygame.key.get_pressed() if self.keys is None else self.keys
         if keys[pygame.K_RIGHT]:
             self.direction.x = 1
             self.status = "idle"
@@ -107,4 +128,8 @@ class Player(pygame.sprite.Sprite):
         self.move(dt)
         self.animate(dt)
         self.map_bound()
-        print(self.pos)
+        # Position and frame (idle and animated frames differ in size) may
+        # have changed, the drawing index checks
+        moved(self)
+        if TRACER.debug_on:
+            TRACER.debug("pos", x=self.pos.x, y=self.pos.y)
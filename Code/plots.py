@@ -1,67 +1,68 @@
-import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 import matplotlib
 import mplcyberpunk
+import numpy as np
+from settings import PLOT_PROFILES
+from telemetry import create_rocket_dict, csv_output, update_rocket_dict
+
+# Use non interactive backend for matplotlib (faster, and safe in worker processes), charts are
+# only ever saved to file
+matplotlib.use("agg")
 from matplotlib import pyplot as plt
 from mpl_toolkits import mplot3d
 
-# matplotlib.use("agg")
 plt.style.use("cyberpunk")
 
 
-def create_rocket_dict(rocket_parameters):
-    # Create dictionary and associated keys for use with HUD GUI within pygame
-    rocket_parameters["Time"] = []
-    rocket_parameters["Altitude"] = []
-    rocket_parameters["X Position"] = []
-    rocket_parameters["Velocity"] = []
-    rocket_parameters["Acceleration"] = []
-    rocket_parameters["Thrust"] = []
-    rocket_parameters["Weight"] = []
-    rocket_parameters["Gravity Acceleration"] = []
-    rocket_parameters["Drag Force"] = []
-    rocket_parameters["Resultant Force"] = []
-    rocket_parameters["Mach Speed"] = []
-    rocket_parameters["Air Density"] = []
-    rocket_parameters["Reference Area"] = []
-    rocket_parameters["Current Total Mass"] = []
-    rocket_parameters["Total Fuel Remaining"] = []
-    rocket_parameters["Core Fuel Remaining"] = []
-    rocket_parameters["SRB Fuel Remaining"] = []
-    rocket_parameters["Interim Fuel Remaining"] = []
-
-
-def update_rocket_dict(
-    rocket_parameters, t, rocket, core_stage, srb_stage, interim_stage
-):
-    rocket_parameters["Time"].append(t)
-    rocket_parameters["Total Fuel Remaining"].append(rocket.total_propellant_mass)
-    rocket_parameters["Core Fuel Remaining"].append(core_stage.prop_mass)
-    rocket_parameters["SRB Fuel Remaining"].append(srb_stage.prop_mass)
-    rocket_parameters["Interim Fuel Remaining"].append(interim_stage.prop_mass)
-    rocket_parameters["Current Total Mass"].append(rocket.total_mass)
-    rocket_parameters["Altitude"].append(rocket.pos[1])
-    rocket_parameters["X Position"].append(rocket.pos[0])
-    rocket_parameters["Velocity"].append(rocket.rocket_velocity)
-    rocket_parameters["Acceleration"].append(rocket.rocket_acceleration)
-    rocket_parameters["Thrust"].append(rocket.thrust)
-    rocket_parameters["Drag Force"].append(rocket.drag_force)
-    rocket_parameters["Weight"].append(rocket.weight)
-    rocket_parameters["Gravity Acceleration"].append(rocket.gravity)
-    rocket_parameters["Resultant Force"].append(rocket.resultant_force)
-    rocket_parameters["Mach Speed"].append(rocket.mach_speed)
-    rocket_parameters["Air Density"].append(rocket.air_density)
-    rocket_parameters["Reference Area"].append(rocket.reference_area)
-
-
-def csv_output(rocket_parameters):
-    # fmt: off
-    with open("plots/Rocket Values.csv", "w") as new_file:
-        writer = csv.writer(new_file)
-        key_list = list(rocket_parameters.keys())
-
-        writer.writerow(key_list)
-        writer.writerows(zip(*rocket_parameters.values()))
+def plot_profile(profile):
+    # Accept a profile name from settings.PLOT_PROFILES, a profile dict, or None
+    # for the default profile
+    if profile is None:
+        return PLOT_PROFILES["Default"]
+    if isinstance(profile, str):
+        return PLOT_PROFILES[profile]
+    return profile
+
+
+def lttb(x, y, threshold):
+    # Largest Triangle Three Buckets downsampling: indices of `threshold` points
+    # that keep the visual shape of the (x, y) line
+    # Reference: https://skemman.is/handle/1946/15343 (Steinarsson 2013)
+    length = len(x)
+    if threshold is None or threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, length - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = length - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+    return indices
+
+
+def series(rocket_parameters, column, profile):
+    # (time, values) of one column, downsampled to the profile's point budget
+    time = np.asarray(rocket_parameters["Time"])
+    values = np.asarray(rocket_parameters[column])
+    index = lttb(time, values, profile["Max Points"])
+    return time[index], values[index]
 
 
 # ---------------------------------------------------------------------------
@@ -71,11 +72,12 @@ def csv_output(rocket_parameters):
 # ---------------------------------------------------------------------------
 
 
-def altitude_plot(rocket_parameters):
+def altitude_plot(rocket_parameters, profile=None):
     # fmt: off
+    profile = plot_profile(profile)
     fig = plt.figure()
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Current Total Mass"],label="Current Total Mass",)
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Altitude"],label="Altitude",)
+    plt.plot(*series(rocket_parameters, "Current Total Mass", profile), label="Current Total Mass",)
+    plt.plot(*series(rocket_parameters, "Altitude", profile), label="Altitude",)
     plt.xlabel("Time")
     plt.xscale("linear")
     plt.ylabel("Altitude")
@@ -83,16 +85,21 @@ def altitude_plot(rocket_parameters):
     plt.ticklabel_format(useOffset=False, style="plain")
     plt.legend()
     plt.grid(True)
-    mplcyberpunk.make_lines_glow()
+    if profile["Glow"]:
+        mplcyberpunk.make_lines_glow()
     plt.tight_layout()
-    plt.savefig("plots/Altitude.png", dpi=900)
+    plt.savefig("plots/Altitude.png", dpi=profile["DPI"])
+    plt.close(fig)
     
-def position_plot(rocket_parameters):
+def position_plot(rocket_parameters, profile=None):
+    profile = plot_profile(profile)
     fig = plt.figure()
     ax = plt.axes(projection='3d')
-    x_axis = rocket_parameters["Time"]
-    y_axis = rocket_parameters["X Position"]
-    z_axis = rocket_parameters["Altitude"]
+    # Downsample on the altitude curve and keep X Position in step with it
+    index = lttb(rocket_parameters["Time"], rocket_parameters["Altitude"], profile["Max Points"])
+    x_axis = np.asarray(rocket_parameters["Time"])[index]
+    y_axis = np.asarray(rocket_parameters["X Position"])[index]
+    z_axis = np.asarray(rocket_parameters["Altitude"])[index]
     ax.set_xlabel('Time')
     ax.set_ylabel('X Position')
     ax.set_zlabel('Altitude')
@@ -100,19 +107,21 @@ def position_plot(rocket_parameters):
     plt.yscale("linear")
     plt.ticklabel_format(useOffset=False, style="plain")
     ax.plot3D(x_axis,y_axis, z_axis)
-    mplcyberpunk.make_lines_glow()
-    plt.savefig('plots/Position.png', dpi=900)
-    plt.show()
+    if profile["Glow"]:
+        mplcyberpunk.make_lines_glow()
+    plt.savefig("plots/Position.png", dpi=profile["DPI"])
+    plt.close(fig)
     
     
     
 
 
-def velocity_plot(rocket_parameters):
+def velocity_plot(rocket_parameters, profile=None):
     # fmt: off
+    profile = plot_profile(profile)
     fig = plt.figure()
 
-    plt.plot(rocket_parameters["Time"], rocket_parameters["Velocity"],label="Velocity")
+    plt.plot(*series(rocket_parameters, "Velocity", profile), label="Velocity")
     plt.xlabel("Time")
     plt.xscale("linear")
     plt.ylabel("Velocity")
@@ -120,16 +129,19 @@ def velocity_plot(rocket_parameters):
     plt.ticklabel_format(useOffset=False, style="plain")
     plt.legend()
     plt.grid(True)
-    mplcyberpunk.make_lines_glow()
+    if profile["Glow"]:
+        mplcyberpunk.make_lines_glow()
     plt.tight_layout()
-    plt.savefig("plots/Velocity.png", dpi=900)
+    plt.savefig("plots/Velocity.png", dpi=profile["DPI"])
+    plt.close(fig)
 
 
-def acceleration_plot(rocket_parameters):
+def acceleration_plot(rocket_parameters, profile=None):
     # fmt: off
+    profile = plot_profile(profile)
     fig = plt.figure()
 
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Acceleration"],label="Acceleration",)
+    plt.plot(*series(rocket_parameters, "Acceleration", profile), label="Acceleration",)
     plt.xlabel("Time")
     plt.xscale("linear")
     plt.ylabel("Acceleration")
@@ -137,19 +149,22 @@ def acceleration_plot(rocket_parameters):
     plt.ticklabel_format(useOffset=False, style="plain")
     plt.legend()
     plt.grid(True)
-    mplcyberpunk.make_lines_glow()
+    if profile["Glow"]:
+        mplcyberpunk.make_lines_glow()
     plt.tight_layout()
-    plt.savefig("plots/Acceleration.png", dpi=900)
+    plt.savefig("plots/Acceleration.png", dpi=profile["DPI"])
+    plt.close(fig)
 
 
-def force_plot(rocket_parameters):
+def force_plot(rocket_parameters, profile=None):
     # fmt: off
+    profile = plot_profile(profile)
     fig = plt.figure()
 
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Drag Force"],label="Drag Force",)
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Weight"],label="Weight",)
-    plt.plot(rocket_parameters["Time"], rocket_parameters["Thrust"], label="Thrust")
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Resultant Force"],label="Resultant Force",)
+    plt.plot(*series(rocket_parameters, "Drag Force", profile), label="Drag Force",)
+    plt.plot(*series(rocket_parameters, "Weight", profile), label="Weight",)
+    plt.plot(*series(rocket_parameters, "Thrust", profile), label="Thrust")
+    plt.plot(*series(rocket_parameters, "Resultant Force", profile), label="Resultant Force",)
     plt.xlabel("Time")
     plt.xscale("linear")
     plt.ylabel("Forces")
@@ -157,20 +172,24 @@ def force_plot(rocket_parameters):
     plt.ticklabel_format(useOffset=False, style="plain")
     plt.legend()
     plt.grid(True)
-    mplcyberpunk.make_lines_glow()
+    if profile["Glow"]:
+        mplcyberpunk.make_lines_glow()
     plt.tight_layout()
-    plt.savefig("plots/Forces.png", dpi=900)
+    plt.savefig("plots/Forces.png", dpi=profile["DPI"])
+    plt.close(fig)
 
 
-def fuel_plot(rocket_parameters):
+def fuel_plot(rocket_parameters, profile=None):
     # fmt: off
+    profile = plot_profile(profile)
     fig = plt.figure()
 
-    # plt.plot(rocket_parameters["Time"],rocket_parameters["Current Total Mass"],label="Current Total Mass",)
-    # plt.plot(rocket_parameters["Time"],rocket_parameters["Total Fuel Remaining"],label="Total Fuel Remaining",)
-    # plt.plot(rocket_parameters["Time"],rocket_parameters["Core Fuel Remaining"] ,label="Core Fuel Remaining",)
-    # plt.plot(rocket_parameters["Time"],rocket_parameters["SRB Fuel Remaining"] ,label="SRB Fuel Remaining",)
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Interim Fuel Remaining"] ,label="Interim Fuel Remaining",)
+    # plt.plot(*series(rocket_parameters, "Current Total Mass", profile), label="Current Total Mass",)
+    # plt.plot(*series(rocket_parameters, "Total Fuel Remaining", profile), label="Total Fuel Remaining",)
+    # for column in stage_fuel_columns(rocket_parameters):
+    #     plt.plot(*series(rocket_parameters, column, profile), label=column,)
+    for column in upper_stage_fuel(rocket_parameters):
+        plt.plot(*series(rocket_parameters, column, profile), label=column,)
     plt.xlabel("Time")
     plt.xscale("linear")
     plt.ylabel("Mass")
@@ -178,16 +197,19 @@ def fuel_plot(rocket_parameters):
     plt.ticklabel_format(useOffset=False, style="plain")
     plt.legend()
     plt.grid(True)
-    mplcyberpunk.make_lines_glow()
+    if profile["Glow"]:
+        mplcyberpunk.make_lines_glow()
     plt.tight_layout()
-    plt.savefig("plots/Mass.png", dpi=900)
+    plt.savefig("plots/Mass.png", dpi=profile["DPI"])
+    plt.close(fig)
 
 
-def drag_force_plot(rocket_parameters):
+def drag_force_plot(rocket_parameters, profile=None):
     # fmt: off
+    profile = plot_profile(profile)
     fig = plt.figure()
 
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Drag Force"],label="Drag Force",)
+    plt.plot(*series(rocket_parameters, "Drag Force", profile), label="Drag Force",)
     plt.xlabel("Time")
     plt.xscale("linear")
     plt.ylabel("Drag Force (N)")
@@ -195,16 +217,19 @@ def drag_force_plot(rocket_parameters):
     plt.ticklabel_format(useOffset=False, style="plain")
     plt.legend()
     plt.grid(True)
-    mplcyberpunk.make_lines_glow()
+    if profile["Glow"]:
+        mplcyberpunk.make_lines_glow()
     plt.tight_layout()
-    plt.savefig("plots/DragForce.png", dpi=900)
+    plt.savefig("plots/DragForce.png", dpi=profile["DPI"])
+    plt.close(fig)
 
 
-def weight_plot(rocket_parameters):
+def weight_plot(rocket_parameters, profile=None):
     # fmt: off
+    profile = plot_profile(profile)
     fig = plt.figure()
 
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Weight"],label="Weight",)
+    plt.plot(*series(rocket_parameters, "Weight", profile), label="Weight",)
     plt.xlabel("Time")
     plt.xscale("linear")
     plt.ylabel("Weight")
@@ -212,16 +237,19 @@ def weight_plot(rocket_parameters):
     plt.ticklabel_format(useOffset=False, style="plain")
     plt.legend()
     plt.grid(True)
-    mplcyberpunk.make_lines_glow()
+    if profile["Glow"]:
+        mplcyberpunk.make_lines_glow()
     plt.tight_layout()
-    plt.savefig("plots/Weight.png", dpi=900)
+    plt.savefig("plots/Weight.png", dpi=profile["DPI"])
+    plt.close(fig)
 
 
-def gravity_plot(rocket_parameters):
+def gravity_plot(rocket_parameters, profile=None):
     # fmt: off
+    profile = plot_profile(profile)
     fig = plt.figure()
 
-    plt.plot(rocket_parameters["Time"],rocket_parameters["Gravity Acceleration"],label="Gravitational Acceleration",)
+    plt.plot(*series(rocket_parameters, "Gravity Acceleration", profile), label="Gravitational Acceleration",)
     plt.xlabel("Time")
     plt.xscale("linear")
     plt.ylabel("Gravitational Acceleration (m/s^2)")
@@ -229,6 +257,65 @@ def gravity_plot(rocket_parameters):
     plt.ticklabel_format(useOffset=False, style="plain")
     plt.legend()
     plt.grid(True)
-    mplcyberpunk.make_lines_glow()
+    if profile["Glow"]:
+        mplcyberpunk.make_lines_glow()
     plt.tight_layout()
-    plt.savefig("plots/Gravity.png", dpi=900)
+    plt.savefig("plots/Gravity.png", dpi=profile["DPI"])
+    plt.close(fig)
+
+
+def stage_fuel_columns(rocket_parameters):
+    # "<Stage> Fuel Remaining" of every stage, in stack order
+    return tuple(
+        column
+        for column in rocket_parameters
+        if column.endswith(" Fuel Remaining") and column != "Total Fuel Remaining"
+    )
+
+
+def upper_stage_fuel(rocket_parameters):
+    return stage_fuel_columns(rocket_parameters)[-1:]
+
+
+# Every chart and the telemetry columns it reads (or a function of the
+# telemetry giving them, for per vehicle columns), so each worker process is
+# only sent the columns it needs
+CHARTS = {
+    "Altitude": (altitude_plot, ("Current Total Mass", "Altitude")),
+    "Position": (position_plot, ("X Position", "Altitude")),
+    "Velocity": (velocity_plot, ("Velocity",)),
+    "Acceleration": (acceleration_plot, ("Acceleration",)),
+    "Forces": (force_plot, ("Drag Force", "Weight", "Thrust", "Resultant Force")),
+    "Mass": (fuel_plot, upper_stage_fuel),
+    "Drag Force": (drag_force_plot, ("Drag Force",)),
+    "Weight": (weight_plot, ("Weight",)),
+    "Gravity": (gravity_plot, ("Gravity Acceleration",)),
+}
+
+
+def render_chart(name, columns, profile):
+    CHARTS[name][0](columns, profile)
+    return name
+
+
+def render_all(rocket_parameters, profile=None, charts=None, workers=None):
+    # Render charts in parallel worker processes. Returns the rendered names in
+    # the order the charts were asked for
+    profile = plot_profile(profile)
+    charts = list(CHARTS) if charts is None else list(charts)
+    workers = min(len(charts), workers or os.cpu_count() or 1)
+
+    jobs = []
+    for name in charts:
+        wanted = CHARTS[name][1]
+        if callable(wanted):
+            wanted = wanted(rocket_parameters)
+        wanted = ("Time",) + tuple(wanted)
+        jobs.append((name, {column: np.asarray(rocket_parameters[column]) for column in wanted}))
+
+    if workers == 1:
+        return [render_chart(name, columns, profile) for name, columns in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_chart, name, columns, profile) for name, columns in jobs]
+        return [future.result() for future in futures]
@@ -0,0 +1,150 @@
+import json
+import os
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+from settings import PROFILING
+
+# Per phase timing for the physics step (Rocket.update) and the game frame
+# (Game.run). A profiler keeps the last PROFILING["Window"] durations of every
+# phase for percentiles / histograms, plus running count, total and max over
+# the whole run. Call sites look like
+#
+#     timer = PROFILER if PROFILER.enabled else None
+#     if timer: timer.start()
+#     self.flight_controller()
+#     if timer: timer.mark("Flight Controller")
+#     ...
+#     if timer: timer.finish()
+#
+# so a disabled profiler costs one attribute check per phase
+
+# Log spaced histogram bin edges in seconds, 1 microsecond to 1 second
+HISTOGRAM_EDGES = np.logspace(-6, 0, 25)
+
+PROFILERS = {}
+
+
+class PhaseProfiler:
+    def __init__(self, name, total="Total", window=None, enabled=None):
+        self.name = name
+        # Name of the whole step / frame, recorded by finish()
+        self.total = total
+        self.window = PROFILING["Window"] if window is None else window
+        self.enabled = PROFILING["Enabled"] if enabled is None else enabled
+        self.reset()
+
+    def reset(self):
+        # phase: recent durations, phase: [count, total seconds, max seconds]
+        self.samples = {}
+        self.totals = {}
+        self.started = self.last = 0.0
+
+    def start(self):
+        self.started = self.last = perf_counter()
+
+    def mark(self, phase):
+        # Time since start() or the previous mark() is charged to `phase`
+        now = perf_counter()
+        self.add(phase, now - self.last)
+        self.last = now
+
+    def finish(self):
+        self.add(self.total, perf_counter() - self.started)
+
+    def add(self, phase, seconds):
+        if phase not in self.samples:
+            self.samples[phase] = deque(maxlen=self.window)
+            self.totals[phase] = [0, 0.0, 0.0]
+        self.samples[phase].append(seconds)
+        totals = self.totals[phase]
+        totals[0] += 1
+        totals[1] += seconds
+        if seconds > totals[2]:
+            totals[2] = seconds
+
+    def stats(self):
+        # {phase: {...}} with times in milliseconds. Percentiles are over the
+        # recent window, count / mean / max over the whole run
+        stats = {}
+        for phase, samples in self.samples.items():
+            count, total, longest = self.totals[phase]
+            recent = np.fromiter(samples, dtype=float, count=len(samples)) * 1000
+            p50, p90, p99 = np.percentile(recent, [50, 90, 99])
+            stats[phase] = {
+                "Count": count,
+                "Mean": total / count * 1000,
+                "p50": p50,
+                "p90": p90,
+                "p99": p99,
+                "Max": longest * 1000,
+            }
+        return stats
+
+    def histogram(self, phase):
+        # Counts of the recent window in the HISTOGRAM_EDGES bins, anything
+        # outside them lands in the first / last bin
+        samples = np.clip(
+            np.fromiter(self.samples[phase], dtype=float),
+            HISTOGRAM_EDGES[0],
+            HISTOGRAM_EDGES[-1],
+        )
+        counts, _ = np.histogram(samples, bins=HISTOGRAM_EDGES)
+        return counts
+
+    def report(self):
+        # Text table, slowest phase (by mean) first with the total last
+        stats = self.stats()
+        phases = sorted(
+            (phase for phase in stats if phase != self.total),
+            key=lambda phase: -stats[phase]["Mean"],
+        )
+        if self.total in stats:
+            phases.append(self.total)
+        lines = [
+            f"{self.name + ' (ms)':<20}{'count':>8}{'mean':>10}{'p50':>10}"
+            f"{'p90':>10}{'p99':>10}{'max':>10}"
+        ]
+        for phase in phases:
+            row = stats[phase]
+            lines.append(
+                f"  {phase:<18}{row['Count']:>8}{row['Mean']:>10.4f}{row['p50']:>10.4f}"
+                f"{row['p90']:>10.4f}{row['p99']:>10.4f}{row['Max']:>10.4f}"
+            )
+        return lines
+
+    def export(self, path=None):
+        # Stats and histograms as JSON, by default "<Directory>/<name> Profile.json"
+        if path is None:
+            path = os.path.join(PROFILING["Directory"], f"{self.name} Profile.json")
+        stats = self.stats()
+        for phase in stats:
+            stats[phase]["Histogram"] = self.histogram(phase).tolist()
+        with open(path, "w") as profile_file:
+            json.dump(
+                {
+                    "Profiler": self.name,
+                    "Units": "ms",
+                    "Histogram Edges": (HISTOGRAM_EDGES * 1000).tolist(),
+                    "Phases": stats,
+                },
+                profile_file,
+                indent=4,
+            )
+        return path
+
+
+def profiler(name, total="Total"):
+    # One shared profiler per name, like tracing.channel
+    if name not in PROFILERS:
+        PROFILERS[name] = PhaseProfiler(name, total)
+    return PROFILERS[name]
+
+
+def render_overlay(profiler, font, color=(255, 255, 255), background=(0, 0, 0)):
+    # The profiler's report as a list of text surfaces for a live overlay.
+    # Takes an already made pygame font so this module doesn't import pygame
+    # for headless use. Rendering the report isn't free, callers keep the
+    # surfaces and only refresh them every few frames
+    return [font.render(line, True, color, background) for line in profiler.report()]
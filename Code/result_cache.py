@@ -0,0 +1,180 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from rocket import simulate
+from settings import CACHE
+
+# Content addressed cache of simulation results. The key is a hash of the full
+# vehicle definition (Rocket.definition), the step / integrator / event
+# settings and the source of every module that can change a trajectory, so a
+# code change never serves a stale result. Entries are .npz files whose mtime
+# is bumped on every hit, eviction removes the least recently used first
+
+# Modules whose source is part of the key
+PHYSICS_MODULES = (
+    "atmosphere.py",
+    "events.py",
+    "gravity.py",
+    "integrators.py",
+    "orbit.py",
+    "rocket.py",
+    "settings.py",
+    "stage.py",
+    "telemetry.py",
+    "vehicles.py",
+)
+
+CODE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+_code_version = None
+
+
+def code_version():
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for module in PHYSICS_MODULES:
+            with open(os.path.join(CODE_DIRECTORY, module), "rb") as source:
+                digest.update(module.encode())
+                digest.update(source.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def cache_key(vehicle, dt, t_end, integrator=None, events=None):
+    description = {
+        "Vehicle": vehicle.definition(),
+        "dt": dt,
+        "t_end": t_end,
+        "Integrator": integrator.settings if integrator is not None else "euler",
+        "Events": (
+            None
+            if events is None
+            else {
+                "Events": [event.definition() for event in events.events],
+                "Time Tolerance": events.time_tolerance,
+            }
+        ),
+        "Code": code_version(),
+    }
+    canonical = json.dumps(description, sort_keys=True, default=float)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory=CACHE["Directory"], max_size=CACHE["Max Size"]):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        # (telemetry, event log) or None. Telemetry columns come back as arrays
+        path = self.path(key)
+        try:
+            with np.load(path) as stored:
+                telemetry = {
+                    name: stored[name] for name in json.loads(str(stored["__columns__"]))
+                }
+                event_log = json.loads(str(stored["__events__"]))
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+        os.utime(path)
+        return telemetry, event_log
+
+    def put(self, key, telemetry, event_log=None):
+        columns = list(telemetry)
+        arrays = {name: np.asarray(values) for name, values in telemetry.items()}
+        arrays["__columns__"] = np.array(json.dumps(columns))
+        arrays["__events__"] = np.array(json.dumps(event_log or [], default=float))
+
+        # Write to a temporary file and rename, so readers never see half an entry
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as entry:
+            np.savez(entry, **arrays)
+        os.replace(temporary, self.path(key))
+        self.evict()
+
+    def entries(self):
+        # [(key, size in bytes, last used)], least recently used first
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((name[: -len(".npz")], stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_size:
+                break
+            os.remove(self.path(key))
+            total -= size
+
+    def purge(self, older_than=None):
+        # Remove every entry, or only those unused for `older_than` seconds
+        removed = 0
+        cutoff = None if older_than is None else time.time() - older_than
+        for key, _, last_used in self.entries():
+            if cutoff is None or last_used < cutoff:
+                os.remove(self.path(key))
+                removed += 1
+        return removed
+
+
+def cached_simulate(vehicle, dt=0.1, t_end=1000, integrator=None, events=None, cache=None):
+    # rocket.simulate with the default recorder, served from the cache when the
+    # same flight has been run before. On a hit the vehicle is left untouched
+    # and events.log is filled from the stored log
+    if cache is None:
+        cache = ResultCache()
+    key = cache_key(vehicle, dt, t_end, integrator, events)
+
+    hit = cache.get(key)
+    if hit is not None:
+        telemetry, event_log = hit
+        if events is not None:
+            events.log = event_log
+        return telemetry
+
+    telemetry = simulate(vehicle, dt=dt, t_end=t_end, integrator=integrator, events=events)
+    cache.put(key, telemetry, events.log if events is not None else None)
+    return telemetry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or purge the simulation result cache")
+    parser.add_argument("--directory", default=CACHE["Directory"])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list entries, least recently used first")
+    commands.add_parser("stats", help="show entry count and total size")
+    purge = commands.add_parser("purge", help="remove entries")
+    purge.add_argument("--older-than", type=float, default=None, help="only entries unused for this many days")
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.directory)
+    if args.command == "list":
+        for key, size, last_used in cache.entries():
+            print(f"{key}  {size / 1024:10.1f} KiB  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_used))}")
+    elif args.command == "stats":
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(
+            f"{len(entries)} entries, {total / 1024**2:.1f} MiB of "
+            f"{cache.max_size / 1024**2:.1f} MiB in {os.path.abspath(cache.directory)}"
+        )
+    elif args.command == "purge":
+        older_than = None if args.older_than is None else args.older_than * 86400
+        print(f"removed {cache.purge(older_than)} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,76 @@
 # import scrapy
 
+import argparse
 import math
 
-import matplotlib
-import mplcyberpunk
 import numpy as np
-import plots
+from atmosphere import air_density, drag_coefficient, speed_of_sound
+from events import EventDetector, altitude_event, burnout_events, default_events
 from gravity import gravity_acceleration_calc
-from matplotlib import pyplot as plt
-from pygame import Vector2 as vector
+from integrators import create_integrator
+from orbit import cross, dot, norm, propagate
+from profiling import profiler
 from settings import *
-from stage import Stage
+from telemetry import ColumnarRecorder
+from tracing import channel, configure, dump, dump_on_error
+from vehicles import stage_stack
 
-# Use non interactive backend for matplotlib (increase performace)
-# matplotlib.use("agg")
-plt.style.use("cyberpunk")
+TRACER = channel("rocket")
+PROFILER = profiler("Rocket Update", total="Step")
 
 
 class Rocket:
-    def __init__(self):
+    # Index of the first stage propellant mass in the state vector
+    PROPELLANT_INDEX = 3
+
+    # Fixed attribute set, see Stage.__slots__
+    __slots__ = (
+        "current_stage",
+        "reference_area",
+        "air_density",
+        "stack",
+        "stage_objects",
+        "group_index",
+        "burning",
+        "drag_force",
+        "rocket_acceleration",
+        "rocket_velocity",
+        "pos",
+        "flight_program",
+        "theta",
+        "direction_theta",
+        "cos_theta",
+        "sin_theta",
+        "current_total_mass",
+        "current_propellant_mass",
+        "current_gravity",
+        "current_weight",
+        "current_thrust",
+        "current_resultant_force",
+        "drag_coefficient",
+        "mach_speed",
+        "speed_of_sound",
+    )
+
+    def __init__(
+        self,
+        stack="Block 1",
+        stages=None,
+        flight_program=FLIGHT_PROGRAM,
+    ):
 
         self.current_stage = "Core SRB"
         self.reference_area = 0
         self.air_density = 1.225  # kg / m**3 [rho]
 
-        # List of Stage instances
-        self.stage_objects = [core_stage, srb_stage, interim_stage]
+        # Stage stack (vehicles.py) shared with every rocket of the same vehicle,
+        # and the Stage instances owned by this rocket in stack order, so
+        # several rockets can be flown in the same process
+        self.stack = stage_stack(stack)
+        self.stage_objects = self.stack.create_stages() if stages is None else list(stages)
+        # Current serial group and bit mask of its stages still burning
+        self.group_index = 0
+        self.burning = None
 
         # Forces
         self.drag_force = 0
@@ -33,25 +78,50 @@ class Rocket:
         # Update values
         self.rocket_acceleration = 0
         self.rocket_velocity = 0
-        self.pos = np.array([0, 0])
-        self.theta = 90
+        # [x, y] as a plain list updated in place, no array built per step
+        self.pos = [0.0, 0.0]
+        self.flight_program = flight_program
+        self.theta = flight_program["Launch Pitch"]
+        # cos / sin of theta, recomputed by move only when theta changes
+        self.direction_theta = None
+        self.cos_theta = 0.0
+        self.sin_theta = 0.0
+
+        # Per step totals, see calc_forces
+        self.current_total_mass = self.total_mass
+        self.current_propellant_mass = self.total_propellant_mass
+        self.current_gravity = 0
+        self.current_weight = 0
+        self.current_thrust = 0
+        self.current_resultant_force = 0
 
         # Values used to calculate drag force
         self.drag_coefficient = 0
         self.mach_speed = 0
+        self.speed_of_sound = 340.29  # m/s at sea level
 
     # Masses
+    # Plain loops rather than sum([...]) so no temporary list is built
     @property
     def total_dry_mass(self):
-        return sum([stage.dry_mass for stage in self.stage_objects])
+        total = 0
+        for stage in self.stage_objects:
+            total += stage.dry_mass
+        return total
 
     @property
     def total_propellant_mass(self):
-        return sum([stage.prop_mass for stage in self.stage_objects])
+        total = 0
+        for stage in self.stage_objects:
+            total += stage.prop_mass
+        return total
 
     @property
     def total_mass(self):
-        return sum([stage.total_mass for stage in self.stage_objects])
+        total = 0
+        for stage in self.stage_objects:
+            total += stage.total_mass
+        return total
 
     # Forces
     @property
@@ -72,131 +142,92 @@ class Rocket:
 
     @property
     def thrust(self):
-        return sum([stage.thrust for stage in self.stage_objects if stage.firing])
+        total = 0
+        for stage in self.stage_objects:
+            if stage.firing:
+                total += stage.thrust
+        return total
 
     @property
     def resultant_force(self):
         return self.thrust + self.weight + self.drag_force
 
+    @property
+    def air_speed(self):
+        # Speed relative to the air (used for dynamic pressure)
+        return self.rocket_velocity
+
     def flight_controller(self):
-        if core_stage.prop_mass > 0 and srb_stage.prop_mass > 0:
-            interim_stage.firing = False
-            self.current_stage = "Core SRB"
-        elif srb_stage.prop_mass <= 0 and core_stage.prop_mass > 0:
-            interim_stage.firing = False
-            srb_stage.firing = False
-            srb_stage.attached = False
-            self.current_stage = "Core"
-            self.theta = 150
-        elif core_stage.prop_mass <= 0 and srb_stage.prop_mass <= 0:
-            core_stage.firing = False
-            core_stage.attached = False
-            srb_stage.firing = False
-            srb_stage.attached = False
-            interim_stage.firing = True
-            self.current_stage = "Interim"
-            self.theta = 30
+        # Separation rules of the stage stack (see vehicles.py). Firing /
+        # attachment flags, phase name and pitch only change when a stage
+        # burns out, so they are only set again then
+        stages = self.stage_objects
+        groups = self.stack.groups
+        group_index = self.group_index
+        last = len(groups) - 1
+        while True:
+            burning = 0
+            bit = 1
+            for index in groups[group_index]:
+                if stages[index].prop_mass > 0:
+                    burning |= bit
+                bit <<= 1
+            if burning or group_index == last:
+                break
+            group_index += 1
+        if group_index == self.group_index and burning == self.burning:
+            return
+        self.group_index = group_index
+        self.burning = burning
+
+        names = []
+        for number, group in enumerate(groups):
+            bit = 1
+            for index in group:
+                stage = stages[index]
+                if number < group_index or (number == group_index and burning and not burning & bit):
+                    # Group below the current one, or burnt out beside stages
+                    # that still burn: separated
+                    stage.firing = False
+                    stage.attached = False
+                elif number > group_index:
+                    stage.firing = False
+                elif stage.attached:
+                    stage.firing = True
+                    names.append(self.stack.stage_names[index])
+                bit <<= 1
+        self.current_stage = " ".join(names)
+        pitch = self.stack.pitch.get(self.current_stage)
+        if pitch is not None:
+            self.theta = self.flight_program[pitch]
 
     def update_mass(self, dt):
-        stage_dry_masses = [stage.dry_mass for stage in self.stage_objects]
-        stage_prop_masses = [stage.prop_mass for stage in self.stage_objects]
-        stage_total_masses = [stage.total_mass for stage in self.stage_objects]
-
-        print(
-            f"Core Stage Dry Mass: {stage_dry_masses[0]}\nCore Stage Prop Mass: {stage_prop_masses[0]}\nCore Stage Total Mass: {stage_total_masses[0]}\nSRB Stage Dry Mass: {stage_dry_masses[1]}\nSRB Stage Prop Mass: {stage_prop_masses[1]}\nSRB Stage Total Mass: {stage_total_masses[1]}\nInterim Stage Dry Mass: {stage_dry_masses[2]}\nInterim Stage Prop Mass: {stage_prop_masses[2]}\nInterim Stage Total Mass: {stage_total_masses[2]}\n"
-        )
+        if not TRACER.debug_on:
+            return
+        fields = {}
+        for name, stage in zip(self.stack.stage_names, self.stage_objects):
+            key = name.lower()
+            fields[f"{key}_dry"] = stage.dry_mass
+            fields[f"{key}_prop"] = stage.prop_mass
+            fields[f"{key}_total"] = stage.total_mass
+        TRACER.debug("mass", **fields)
 
     def calc_air_density(self):
-        # Approximate air density based on the "U.S. Standard Atmosphere 1976" model
-        # Reference: https://www.engineeringtoolbox.com/standard-atmosphere-d_604.html
-        print(f"self.pos is {self.pos}")
-        print(f"self.pos[1] is {self.pos[1]}")
-        if self.pos[1] <= 0:
-            self.air_density = 1.225
-        elif 0 < self.pos[1] <= 1000:
-            self.air_density = 1.112
-        elif 1000 < self.pos[1] <= 2000:
-            self.air_density = 1.007
-        elif 2000 < self.pos[1] <= 3000:
-            self.air_density = 0.9093
-        elif 3000 < self.pos[1] <= 4000:
-            self.air_density = 0.8194
-        elif 4000 < self.pos[1] <= 5000:
-            self.air_density = 0.7364
-        elif 5000 < self.pos[1] <= 6000:
-            self.air_density = 0.661
-        elif 6000 < self.pos[1] <= 7000:
-            self.air_density = 0.5900
-        elif 7000 < self.pos[1] <= 8000:
-            self.air_density = 0.5258
-        elif 8000 < self.pos[1] <= 9000:
-            self.air_density = 0.4671
-        elif 9000 < self.pos[1] <= 10000:
-            self.air_density = 0.4135
-        elif 10000 < self.pos[1] <= 15000:
-            self.air_density = 0.1948
-        elif 15000 < self.pos[1] <= 20000:
-            self.air_density = 0.08891
-        elif 20000 < self.pos[1] <= 25000:
-            self.air_density = 0.04008
-        elif 25000 < self.pos[1] <= 30000:
-            self.air_density = 0.01841
-        elif 30000 < self.pos[1] <= 40000:
-            self.air_density = 0.003996
-        elif 40000 < self.pos[1] <= 50000:
-            self.air_density = 0.001027
-        elif 50000 < self.pos[1] <= 60000:
-            self.air_density = 0.0003097
-        elif 60000 < self.pos[1] <= 70000:
-            self.air_density = 0.00008283
-        elif 70000 < self.pos[1] <= 80000:
-            self.air_density = 0.00001846
-        elif 80000 < self.pos[1]:
-            self.air_density = 0
+        # U.S. Standard Atmosphere 1976, interpolated from the tables in atmosphere.py
+        self.air_density = air_density(self.pos[1])
+        if TRACER.debug_on:
+            TRACER.debug("air_density", altitude=self.pos[1], density=self.air_density)
 
     def calc_reference_area(self):
-        if self.current_stage == "Core SRB":
-            self.reference_area = core_stage.reference_area
-        elif self.current_stage == "Core":
-            self.reference_area = core_stage.reference_area - srb_stage.reference_area
-        elif self.current_stage == "Interim":
-            self.reference_area = interim_stage.reference_area
-
-    def calc_drag_force(self, dt):
-        # update mach speed based from current rocket velocity
-        self.mach_speed = self.rocket_velocity / 343
-        # calculate drag force based loosely on the curve used in artemis simulation
-        # Reference: https://www.researchgate.net/publication/362270344_Preliminary_Launch_Trajectory_Simulation_for_Artemis_I_with_the_Space_Launch_System
-        if self.mach_speed <= 0.25:
-            self.drag_coefficient = 0.25
-        elif 0.25 < self.mach_speed <= 1:
-            self.drag_coefficient = 0.25
-        elif 1.00 < self.mach_speed <= 1.25:
-            self.drag_coefficient = 0.60
-        elif 1.25 < self.mach_speed <= 1.5:
-            self.drag_coefficient = 0.65
-        elif 1.50 < self.mach_speed <= 2.00:
-            self.drag_coefficient = 0.55
-        elif 2.00 < self.mach_speed <= 2.25:
-            self.drag_coefficient = 0.50
-        elif 2.25 < self.mach_speed <= 2.50:
-            self.drag_coefficient = 0.45
-        elif 2.50 < self.mach_speed <= 2.75:
-            self.drag_coefficient = 0.43
-        elif 2.75 < self.mach_speed <= 3.00:
-            self.drag_coefficient = 0.40
-        elif 3.00 < self.mach_speed <= 3.50:
-            self.drag_coefficient = 0.33
-        elif 3.50 < self.mach_speed <= 4.00:
-            self.drag_coefficient = 0.30
-        elif 4.00 < self.mach_speed <= 5.00:
-            self.drag_coefficient = 0.28
-        elif 5.00 < self.mach_speed <= 6.00:
-            self.drag_coefficient = 0.26
-        elif 6.00 < self.mach_speed <= 8.00:
-            self.drag_coefficient = 0.25
-        elif self.mach_speed > 8:
-            self.drag_coefficient = 0.23
+        # The first stage of the current group carries the group's area
+        self.reference_area = self.stage_objects[self.stack.groups[self.group_index][0]].reference_area
+
+    def calc_drag_force(self, dt=None):
+        # update mach speed from current rocket velocity and the local speed of sound
+        self.speed_of_sound = speed_of_sound(self.pos[1])
+        self.mach_speed = self.rocket_velocity / self.speed_of_sound
+        # drag coefficient interpolated from the curve used in the artemis simulation (see atmosphere.py)
+        self.drag_coefficient = drag_coefficient(self.mach_speed)
         if self.rocket_velocity > 0:
             self.drag_force = -(
                 0.5
@@ -205,7 +236,6 @@ class Rocket:
                 * self.drag_coefficient
                 * self.reference_area
             )
-            print(f"DRAG DRAG DSARG {self.drag_force}")
         else:
             self.drag_force = (
                 0.5
@@ -214,13 +244,41 @@ class Rocket:
                 * self.drag_coefficient
                 * self.reference_area
             )
+        if TRACER.debug_on:
+            TRACER.debug(
+                "drag",
+                mach=self.mach_speed,
+                drag_coefficient=self.drag_coefficient,
+                force=self.drag_force,
+            )
 
-    def calc_acc_vel(self):
-        # Calculate acceleration for variable mass system => a = [resultant force] / m
-        self.rocket_acceleration = self.resultant_force / self.total_mass
-        print(
-            f"ACCELERATION {self.rocket_acceleration}\nresultant force {self.resultant_force}\ntotal mass {self.total_mass}\n"
+    def calc_forces(self):
+        # Mass and force totals for this step, summed over the stages in one
+        # pass and reused by calc_acc_vel and the telemetry recorders
+        total_mass = 0
+        propellant_mass = 0
+        thrust = 0
+        for stage in self.stage_objects:
+            total_mass += stage.total_mass
+            propellant_mass += stage.prop_mass
+            if stage.firing:
+                thrust += stage.thrust
+        gravity = -gravity_acceleration_calc(
+            big_object_mass=EARTH_MASS,
+            big_object_radius=EARTH_RADIUS,
+            small_object_distance=self.pos[1],
         )
+        weight = total_mass * -gravity
+        self.current_total_mass = total_mass
+        self.current_propellant_mass = propellant_mass
+        self.current_gravity = gravity
+        self.current_weight = weight
+        self.current_thrust = thrust
+        self.current_resultant_force = thrust + weight + self.drag_force
+
+    def calc_acc_vel(self, dt):
+        # Calculate acceleration for variable mass system => a = [resultant force] / m
+        self.rocket_acceleration = self.current_resultant_force / self.current_total_mass
 
         # Use kinematics equation to update velocity
         # Second Law assumes constant "a" but with sufficiently small "dt" we can still use it
@@ -230,129 +288,604 @@ class Rocket:
         # if self.pos == 0:
         #     # Prevent negative velocities while on the launch pad
         #     self.rocket_velocity = 0
-        print(f"VEL BEFORE UPDATE {self.rocket_velocity}")
+        velocity_before = self.rocket_velocity
         self.rocket_velocity = self.rocket_velocity + self.rocket_acceleration * dt
-        print(f"VEL VEL VEL {self.rocket_velocity}")
+        if TRACER.debug_on:
+            TRACER.debug(
+                "acc_vel",
+                acceleration=self.rocket_acceleration,
+                resultant_force=self.current_resultant_force,
+                total_mass=self.current_total_mass,
+                velocity_before=velocity_before,
+                velocity=self.rocket_velocity,
+            )
 
     def move(self, dt):
         # Calculate delta position[displacement s] of the rocket per dt
         # delta_pos = self.rocket_velocity * dt + (0.5 * self.rocket_acceleration) * (
         #     dt**2
         # )
+        # theta only changes when the flight controller switches phase, so its
+        # cos / sin are cached rather than recomputed every step
+        if self.theta != self.direction_theta:
+            self.direction_theta = self.theta
+            self.cos_theta = math.cos(self.theta * math.pi / 180)
+            self.sin_theta = math.sin(self.theta * math.pi / 180)
+        cos_theta = self.cos_theta
+        sin_theta = self.sin_theta
+        velocity = self.rocket_velocity
+        acceleration = self.rocket_acceleration
+
+        delta_pos_x = velocity * cos_theta * dt + (0.5 * acceleration * cos_theta) * (dt**2)
+        delta_pos_y = velocity * sin_theta * dt + (0.5 * acceleration * sin_theta) * (dt**2)
+
         # Current position = old position + delta position change [dx]
-        delta_pos_x = self.rocket_velocity * math.cos(
-            self.theta * math.pi / 180
-        ) * dt + (
-            0.5 * self.rocket_acceleration * math.cos(self.theta * math.pi / 180)
-        ) * (
-            dt**2
-        )
+        pos = self.pos
+        pos[0] = pos[0] + delta_pos_x
+        pos[1] = pos[1] + delta_pos_y
+        if TRACER.debug_on:
+            TRACER.debug(
+                "move",
+                delta_x=delta_pos_x,
+                delta_y=delta_pos_y,
+                x=pos[0],
+                y=pos[1],
+            )
 
-        print(f"delta pos x is {delta_pos_x}")
+    def update(self, dt):
+        # update method that will eventually be integrated into pygame, calling methods in their logical order to calc pos
+        # and eventually move the rocket on-screen. dt is passed through as a parameter in the self.all_sprites.update(dt) call
+        # in the main game loop in main.py [rocket class will be a member of the all_sprites Group]
+        # Each phase is timed when PROFILER is enabled (see profiling.py)
+        timer = PROFILER if PROFILER.enabled else None
+        if timer:
+            timer.start()
+        self.flight_controller()
+        if timer:
+            timer.mark("Flight Controller")
+        for stage in self.stage_objects:
+            stage.update(dt)
+        if TRACER.debug_on:
+            self.update_mass(dt)
+        if timer:
+            timer.mark("Stages")
+        self.calc_air_density()
+        if timer:
+            timer.mark("Atmosphere")
+        self.calc_reference_area()
+        if timer:
+            timer.mark("Reference Area")
+        self.calc_drag_force(dt)
+        if timer:
+            timer.mark("Drag")
+        self.calc_forces()
+        self.calc_acc_vel(dt)
+        if timer:
+            timer.mark("Acceleration")
+        self.move(dt)
+        if timer:
+            timer.mark("Move")
+            timer.finish()
+
+    def definition(self):
+        # Everything that determines the rest of a flight from this point, as
+        # plain data (used to key cached results, see result_cache.py)
+        return {
+            "Vehicle": self.stack.definition(),
+            "Stages": [stage.definition() for stage in self.stage_objects],
+            "Flight Program": dict(self.flight_program),
+            "Current Stage": self.current_stage,
+            "Group": self.group_index,
+            "Position": [float(value) for value in self.pos],
+            "Velocity": float(self.rocket_velocity),
+            "Theta": float(self.theta),
+        }
+
+    # State vector interface used by the integrators in integrators.py
+    # state = [x, y, velocity, core prop mass, srb prop mass, interim prop mass]
+    def get_state(self):
+        return np.array(
+            [self.pos[0], self.pos[1], self.rocket_velocity]
+            + [stage.prop_mass for stage in self.stage_objects],
+            dtype=float,
+        )
 
-        delta_pos_y = self.rocket_velocity * math.sin(
-            self.theta * math.pi / 180
-        ) * dt + (
-            0.5 * self.rocket_acceleration * math.sin(self.theta * math.pi / 180)
-        ) * (
-            dt**2
+    def set_state(self, state):
+        # Load a state vector and refresh every quantity derived from it
+        # (stage masses and thrust, air density, drag and acceleration)
+        pos = self.pos
+        pos[0] = float(state[0])
+        pos[1] = float(state[1])
+        self.rocket_velocity = float(state[2])
+        for stage, prop_mass in zip(self.stage_objects, state[3:]):
+            stage.prop_mass = max(prop_mass, 0.0)
+            stage.total_mass = stage.prop_mass + stage.dry_mass
+            stage.calc_step_thrust()
+        self.calc_air_density()
+        self.calc_reference_area()
+        self.calc_drag_force()
+        self.calc_forces()
+        self.rocket_acceleration = self.current_resultant_force / self.current_total_mass
+
+    def derivatives(self, t, state):
+        self.set_state(state)
+        theta = self.theta * math.pi / 180
+        return np.array(
+            [
+                self.rocket_velocity * math.cos(theta),
+                self.rocket_velocity * math.sin(theta),
+                self.rocket_acceleration,
+            ]
+            + [stage.mass_flow for stage in self.stage_objects]
         )
 
-        print(f"delta pos y is {delta_pos_y}")
+    def prepare_step(self):
+        # Discrete part of an integrator step: staging decisions and the
+        # firing / attachment flags they set are applied before integrating.
+        # A stage burns for the whole step or not at all, the step itself ends
+        # on burnout (see events.EventDetector.limit_step)
+        self.flight_controller()
+        for stage in self.stage_objects:
+            stage.check_firing()
+            stage.check_attachment()
+            if stage.prop_mass <= 0:
+                stage.mass_flow = 0
+                stage.exhaust_velocity = 0
+
+
+class VectorRocket(Rocket):
+    # Same stages, staging and flight program as Rocket, flown as a point mass
+    # in an Earth centred inertial frame (metres, Earth spinning about z)
+    # instead of a speed along theta over a flat Earth:
+    #   - gravity is a vector towards the centre, from gravity_acceleration_calc
+    #   - thrust points theta degrees above the local horizontal (east)
+    #   - drag opposes the velocity relative to the rotating atmosphere
+    # pos stays [downrange, altitude] (surface arc from the launch site) and
+    # rocket_velocity the inertial speed, so telemetry, events and recorders
+    # work unchanged. With an integrator, unpowered flight above
+    # ORBIT["Coast Altitude"] is propagated analytically (see coast_step).
+    # state = [x, y, z, vx, vy, vz, stage prop masses...]
+    PROPELLANT_INDEX = 6
+
+    __slots__ = (
+        "r",
+        "v",
+        "launch_site",
+        "relative_velocity",
+        "relative_speed",
+        "acceleration_vector",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        latitude = math.radians(ORBIT["Launch Latitude"])
+        self.launch_site = (EARTH_RADIUS * math.cos(latitude), 0.0, EARTH_RADIUS * math.sin(latitude))
+        self.r = self.launch_site
+        # On the pad, turning with the Earth
+        self.v = cross(EARTH_SPIN, self.r)
+        self.acceleration_vector = (0.0, 0.0, 0.0)
+        self.update_position()
 
-        delta_pos = np.array([delta_pos_x, delta_pos_y])
-        print(f"delta_pos is {delta_pos}")
+    @property
+    def air_speed(self):
+        return self.relative_speed
+
+    def update_position(self):
+        # Derived scalars: altitude, downrange arc, inertial and air speed
+        r = self.r
+        site = self.launch_site
+        self.pos[0] = EARTH_RADIUS * math.atan2(norm(cross(site, r)), dot(site, r))
+        self.pos[1] = norm(r) - EARTH_RADIUS
+        self.rocket_velocity = norm(self.v)
+        wind = cross(EARTH_SPIN, r)
+        self.relative_velocity = (self.v[0] - wind[0], self.v[1] - wind[1], self.v[2] - wind[2])
+        self.relative_speed = norm(self.relative_velocity)
+
+    def calc_drag_force(self, dt=None):
+        # Same drag law as Rocket on the speed relative to the air. drag_force
+        # is the (negative) magnitude along the relative velocity
+        self.speed_of_sound = speed_of_sound(self.pos[1])
+        self.mach_speed = self.relative_speed / self.speed_of_sound
+        self.drag_coefficient = drag_coefficient(self.mach_speed)
+        self.drag_force = -(
+            0.5
+            * self.air_density
+            * (self.relative_speed**2)
+            * self.drag_coefficient
+            * self.reference_area
+        )
 
-        self.pos = self.pos + delta_pos
-        print(f"Acceleration: {self.rocket_acceleration}")
-        print(f"Velocity: {self.rocket_velocity}\n")
-        print(f"pos: {self.pos}\n")
-        delta_pos = 0
+    def calc_acceleration(self):
+        r = self.r
+        radius = norm(r)
+        up = (r[0] / radius, r[1] / radius, r[2] / radius)
+        east = cross((0.0, 0.0, 1.0), up)
+        east_norm = norm(east)
+        east = (east[0] / east_norm, east[1] / east_norm, east[2] / east_norm) if east_norm > 0 else (0.0, 1.0, 0.0)
+        if self.theta != self.direction_theta:
+            self.direction_theta = self.theta
+            self.cos_theta = math.cos(self.theta * math.pi / 180)
+            self.sin_theta = math.sin(self.theta * math.pi / 180)
+
+        mass = self.current_total_mass
+        thrust = self.current_thrust / mass
+        # current_gravity is the magnitude, pointing down
+        gravity = self.current_gravity
+        drag = self.drag_force / mass / self.relative_speed if self.relative_speed > 0 else 0.0
+        acceleration = [
+            thrust * (self.cos_theta * east[i] + self.sin_theta * up[i])
+            - gravity * up[i]
+            + drag * self.relative_velocity[i]
+            for i in range(3)
+        ]
+        # Held down by the pad until thrust beats weight
+        radial = dot(acceleration, up)
+        if self.pos[1] <= 0 and radial < 0:
+            acceleration = [acceleration[i] - radial * up[i] for i in range(3)]
+
+        self.acceleration_vector = tuple(acceleration)
+        self.rocket_acceleration = norm(acceleration)
+        self.current_resultant_force = mass * self.rocket_acceleration
 
     def update(self, dt):
-        # update method that will eventually be integrated into pygame, calling methods in their logical order to calc pos
-        # and eventually move the rocket on-screen. dt is passed through as a parameter in the self.all_sprites.update(dt) call
-        # in the main game loop in main.py [rocket class will be a member of the all_sprites Group]
+        # Fixed step (Euler) flight, same order and profiler phases as
+        # Rocket.update
+        timer = PROFILER if PROFILER.enabled else None
+        if timer:
+            timer.start()
         self.flight_controller()
+        if timer:
+            timer.mark("Flight Controller")
         for stage in self.stage_objects:
             stage.update(dt)
-        self.update_mass(dt)
+        if timer:
+            timer.mark("Stages")
         self.calc_air_density()
+        if timer:
+            timer.mark("Atmosphere")
         self.calc_reference_area()
+        if timer:
+            timer.mark("Reference Area")
         self.calc_drag_force(dt)
-        self.calc_acc_vel()
-        self.move(dt)
+        if timer:
+            timer.mark("Drag")
+        self.calc_forces()
+        self.calc_acceleration()
+        if timer:
+            timer.mark("Acceleration")
+        a = self.acceleration_vector
+        self.v = tuple(self.v[i] + a[i] * dt for i in range(3))
+        self.r = tuple(self.r[i] + self.v[i] * dt + 0.5 * a[i] * dt**2 for i in range(3))
+        self.update_position()
+        if timer:
+            timer.mark("Move")
+            timer.finish()
+
+    def definition(self):
+        definition = super().definition()
+        definition["Dynamics"] = "vector"
+        definition["Position Vector"] = [float(value) for value in self.r]
+        definition["Velocity Vector"] = [float(value) for value in self.v]
+        return definition
+
+    def get_state(self):
+        return np.array(
+            list(self.r) + list(self.v) + [stage.prop_mass for stage in self.stage_objects],
+            dtype=float,
+        )
+
+    def set_state(self, state):
+        self.r = (float(state[0]), float(state[1]), float(state[2]))
+        self.v = (float(state[3]), float(state[4]), float(state[5]))
+        for stage, prop_mass in zip(self.stage_objects, state[6:]):
+            stage.prop_mass = max(prop_mass, 0.0)
+            stage.total_mass = stage.prop_mass + stage.dry_mass
+            stage.calc_step_thrust()
+        self.update_position()
+        self.calc_air_density()
+        self.calc_reference_area()
+        self.calc_drag_force()
+        self.calc_forces()
+        self.calc_acceleration()
+
+    def derivatives(self, t, state):
+        self.set_state(state)
+        return np.array(
+            list(self.v)
+            + list(self.acceleration_vector)
+            + [stage.mass_flow for stage in self.stage_objects]
+        )
 
+    def coast_step(self, t, state, t_end):
+        # Analytic two body step while unpowered above ORBIT["Coast Altitude"],
+        # or None to fly the step with the integrator. A step is one propagate
+        # call of up to ORBIT["Coast Sample"] seconds, cut where the trajectory
+        # falls back to the coast altitude
+        self.set_state(state)
+        coast_radius = EARTH_RADIUS + ORBIT["Coast Altitude"]
+        if self.current_thrust != 0 or norm(self.r) < coast_radius:
+            return None
+        r0, v0 = self.r, self.v
+        step = min(t_end - t, ORBIT["Coast Sample"])
+        r, v = propagate(r0, v0, step)
+        if norm(r) < coast_radius:
+            # End just below the coast altitude so the integrator takes over
+            low, high = 0.0, step
+            while high - low > 1e-6:
+                middle = 0.5 * (low + high)
+                if norm(propagate(r0, v0, middle)[0]) < coast_radius:
+                    high = middle
+                else:
+                    low = middle
+            step = high
+            r, v = propagate(r0, v0, step)
+        coasted = np.array(state, dtype=float)
+        coasted[0:3] = r
+        coasted[3:6] = v
+        return t + step, coasted
+
+
+EARTH_SPIN = (0.0, 0.0, ORBIT["Earth Rotation Rate"])
+DYNAMICS = {"flat": Rocket, "vector": VectorRocket}
+
+
+def build_rocket(
+    core=None,
+    srb=None,
+    interim=None,
+    flight_program=FLIGHT_PROGRAM,
+    vehicle="Block 1",
+    stages=None,
+    dynamics="flat",
+):
+    # Create a fresh set of stages and a rocket that owns them. vehicle is a
+    # VEHICLES name or definition (see vehicles.py). The stage dictionaries it
+    # names are used unless replaced, by stage name in `stages` or through the
+    # core / srb / interim shortcuts. dynamics picks the flat Earth Rocket or
+    # the Earth centred VectorRocket
+    overrides = dict(stages or {})
+    for name, parameters in (("Core", core), ("SRB", srb), ("Interim", interim)):
+        if parameters is not None:
+            overrides[name] = parameters
+    stack = stage_stack(vehicle)
+    unknown = set(overrides) - set(stack.stage_names)
+    if unknown:
+        raise ValueError(f"Vehicle {stack.name!r} has no stages {sorted(unknown)}, it has {list(stack.stage_names)}")
+    return DYNAMICS[dynamics](
+        stack=stack,
+        stages=stack.create_stages(overrides),
+        flight_program=flight_program,
+    )
+
+
+def simulate(
+    vehicle, dt=0.1, t_end=1000, recorder=None, integrator=None, events=None
+):
+    # Fly a single rocket headless: no plotting, no globals, and no printing
+    # (per step detail goes to the "rocket" trace channel, see tracing.py).
+    # Without an integrator this is the original Euler Rocket.update loop and
+    # dt is the fixed step size. With an integrator (see integrators.py) dt is
+    # the fixed step for rk4 and the first step for the adaptive rk45, steps
+    # end exactly on burnout, an events.EventDetector also logs separation,
+    # max-Q and altitude crossings, and a VectorRocket coasts analytically while
+    # unpowered above the coast altitude.
+    # Telemetry comes from telemetry.ColumnarRecorder unless another is given
+    if recorder is None:
+        # Fixed steps know their row count up front, adaptive ones grow as needed
+        recorder = ColumnarRecorder(capacity=int(round(t_end / dt)) if integrator is None else 0)
+    if events is not None and integrator is None:
+        raise ValueError("Flight events need an integrator, e.g. create_integrator('rk45')")
+
+    if integrator is None:
+        # Step count is derived up front so float drift in t can't add an extra step
+        steps = int(round(t_end / dt))
+        for step in range(1, steps + 1):
+            t = step * dt
+            if TRACER.info_on:
+                TRACER.info("step", t=t)
+            vehicle.update(dt)
+            recorder.record(t, vehicle)
+        return recorder.telemetry
+
+    if events is None:
+        # Stages burn for a whole integrator step or not at all (see
+        # Rocket.prepare_step), so steps end on burnout even when no events
+        # are asked for
+        events = EventDetector(burnout_events(vehicle))
+
+    t = 0.0
+    state = vehicle.get_state()
+    # Vehicles that can coast analytically (VectorRocket) skip the integrator
+    # for those steps, no events can happen while coasting
+    coast_step = getattr(vehicle, "coast_step", None)
+    # Stop within a nanosecond of t_end rather than taking a sliver of a step
+    while t_end - t > 1e-9:
+        vehicle.prepare_step()
+        requested = min(dt, t_end - t)
+        coasted = None if coast_step is None else coast_step(t, state, t_end)
+        events.check_separation(t, state, vehicle)
+        if coasted is not None:
+            t, state = coasted
+        else:
+            step = events.limit_step(t, state, vehicle, requested)
+            t_step, state_step, dt_next = integrator.step(
+                vehicle.derivatives, t, state, step
+            )
+            t_new, state = events.locate(
+                integrator, vehicle.derivatives, t, state, t_step, state_step, vehicle
+            )
+            # A step cut short by an event says nothing about the step size the
+            # integrator can handle, so don't let it shrink the next one
+            if step < requested or t_new < t_step:
+                dt_next = max(dt_next, dt)
+            t, dt = t_new, dt_next
+        if TRACER.info_on:
+            TRACER.info("step", t=t, dt=dt)
+        vehicle.set_state(state)
+        recorder.record(t, vehicle)
+        if events.terminated:
+            break
+
+    return recorder.telemetry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run one headless rocket flight")
+    parser.add_argument("--vehicle", choices=list(VEHICLES), default="Block 1", help="stage stack from settings.VEHICLES")
+    parser.add_argument(
+        "--dynamics",
+        choices=list(DYNAMICS),
+        default="flat",
+        help="flat: speed along theta over a flat Earth, vector: Earth centred position / velocity with Kepler coast",
+    )
+    parser.add_argument("--dt", type=float, default=0.1, help="time step (s)")
+    parser.add_argument("--t-end", type=float, default=1000, help="flight time (s)")
+    parser.add_argument("--csv", action="store_true", help="write plots/Rocket Values.csv")
+    parser.add_argument("--plots", action="store_true", help="render the matplotlib charts")
+    parser.add_argument(
+        "--plot-profile",
+        default="Default",
+        choices=list(PLOT_PROFILES),
+        help="chart profile from settings.PLOT_PROFILES (DPI, glow, point budget)",
+    )
+    parser.add_argument("--verbose", action="store_true", help="print every trace record as it is written")
+    parser.add_argument(
+        "--trace",
+        choices=["debug", "info", "warning", "error"],
+        default=None,
+        help="record the rocket trace channel at this level (see tracing.py)",
+    )
+    parser.add_argument("--trace-sample", type=int, default=1, help="keep one in N debug / info records per event")
+    parser.add_argument(
+        "--trace-dump",
+        metavar="PATH",
+        help="write the trace buffer here when the flight ends (.jsonl for JSON lines)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="time each phase of Rocket.update (euler only), print percentiles and export histograms",
+    )
+    parser.add_argument(
+        "--integrator",
+        choices=["euler", "rk4", "rk45"],
+        default="euler",
+        help="euler is the original fixed step Rocket.update loop",
+    )
+    parser.add_argument("--rtol", type=float, default=1e-6, help="rk45 relative tolerance")
+    parser.add_argument("--atol", type=float, default=1e-3, help="rk45 absolute tolerance")
+    parser.add_argument(
+        "--events",
+        action="store_true",
+        help="split steps exactly on burnout / separation and log max-Q (rk4 / rk45 only)",
+    )
+    parser.add_argument(
+        "--altitude",
+        type=float,
+        action="append",
+        default=[],
+        help="log when this altitude (m) is crossed, may be repeated",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="reuse a stored result for the same vehicle and settings (see result_cache.py)",
+    )
+    parser.add_argument(
+        "--stream",
+        metavar="PATH",
+        help="stream telemetry to a chunked binary file while flying (see telemetry_file.py)",
+    )
+    args = parser.parse_args(argv)
+    if args.stream and args.cache:
+        parser.error("--stream and --cache can't be combined")
+
+    integrator = None
+    if args.integrator == "rk45":
+        integrator = create_integrator("rk45", rtol=args.rtol, atol=args.atol)
+    elif args.integrator == "rk4":
+        integrator = create_integrator("rk4")
+
+    if args.trace or args.verbose:
+        configure(["rocket"], level=args.trace or "debug", sample_every=args.trace_sample, echo=args.verbose)
+    if args.profile:
+        if integrator is not None:
+            parser.error("--profile times Rocket.update, which only the euler integrator uses")
+        PROFILER.enabled = True
+    rocket = build_rocket(vehicle=args.vehicle, dynamics=args.dynamics)
+    events = None
+    if args.events or args.altitude:
+        if integrator is None:
+            parser.error("--events and --altitude need --integrator rk4 or rk45")
+        events = EventDetector(
+            default_events(rocket) + [altitude_event(h) for h in args.altitude]
+        )
+    # Whatever the trace channels caught is dumped to stderr if the flight fails
+    with dump_on_error():
+        if args.cache:
+            from result_cache import cached_simulate
 
-# Create stages and rocket object instances using settings file
-
-
-core_stage = Stage(
-    dry_mass=CORE_STAGE["Dry Mass"],
-    prop_mass=CORE_STAGE["Propellant Mass"],
-    mass_flow=CORE_STAGE["Mass Flow"],
-    exhaust_v=CORE_STAGE["Exhaust Velocity"],
-    ref_area=CORE_STAGE["Reference Area"],
-)
-srb_stage = Stage(
-    dry_mass=SOLID_ROCKET_BOOSTERS["Dry Mass"],
-    prop_mass=SOLID_ROCKET_BOOSTERS["Propellant Mass"],
-    mass_flow=SOLID_ROCKET_BOOSTERS["Mass Flow"],
-    exhaust_v=SOLID_ROCKET_BOOSTERS["Exhaust Velocity"],
-    ref_area=SOLID_ROCKET_BOOSTERS["Reference Area"],
-)
-interim_stage = Stage(
-    dry_mass=INTERIM_CRYOGENIC_STAGE["Dry Mass"],
-    prop_mass=INTERIM_CRYOGENIC_STAGE["Propellant Mass"],
-    mass_flow=INTERIM_CRYOGENIC_STAGE["Mass Flow"],
-    exhaust_v=INTERIM_CRYOGENIC_STAGE["Exhaust Velocity"],
-    ref_area=INTERIM_CRYOGENIC_STAGE["Reference Area"],
-)
-exploration_stage = Stage(
-    dry_mass=EXPLORATION_UPPER_STAGE["Dry Mass"],
-    prop_mass=EXPLORATION_UPPER_STAGE["Propellant Mass"],
-    mass_flow=EXPLORATION_UPPER_STAGE["Mass Flow"],
-    exhaust_v=EXPLORATION_UPPER_STAGE["Exhaust Velocity"],
-    ref_area=EXPLORATION_UPPER_STAGE["Reference Area"],
-)
-
-rocket = Rocket()
-
-# Create dictionary and associated keys for use with HUD GUI within pygame
-rocket_parameters = {}
-plots.create_rocket_dict(rocket_parameters)
-
-# set initial time, dt, gravity, and eventually air resistance and more complex gravity
-t = 0
-dt = 0.1  # seconds
-simple_gravity = -9.80665  # m/s**2
-EARTH_MASS = 5.9722e24  # kg
-EARTH_RADIUS = 6.371e6  # m
-
-
-# Loop over rocket.update and its related methods while the rocket still has fuel
-while t < 1000:
-    t += 0.1
-    # fmt: off
-    print(f"Time is {t} seconds")
-    rocket.update(dt)
-    plots.update_rocket_dict(
-        rocket_parameters=rocket_parameters, 
-        t=t, 
-        rocket=rocket, 
-        core_stage=core_stage, 
-        srb_stage=srb_stage, 
-        interim_stage=interim_stage
+            rocket_parameters = cached_simulate(
+                rocket, dt=args.dt, t_end=args.t_end, integrator=integrator, events=events
+            )
+        else:
+            recorder = None
+            if args.stream:
+                from telemetry_file import StreamingRecorder
+
+                recorder = StreamingRecorder(args.stream)
+            rocket_parameters = simulate(
+                rocket,
+                dt=args.dt,
+                t_end=args.t_end,
+                recorder=recorder,
+                integrator=integrator,
+                events=events,
+            )
+    if args.trace_dump:
+        dump(args.trace_dump)
+
+    # With --stream rocket_parameters is the TelemetryFile, read a column at a
+    # time
+    if args.csv:
+        if args.stream:
+            from telemetry_file import export_csv
+
+            export_csv(args.stream, "plots/Rocket Values.csv")
+        else:
+            from telemetry import csv_output
+
+            csv_output(rocket_parameters)
+
+    if args.plots:
+        # matplotlib is only imported when charts are actually wanted
+        import plots
+
+        plots.render_all(rocket_parameters, profile=args.plot_profile)
+
+    print(
+        f"t = {rocket_parameters['Time'][-1]:.1f} s, "
+        f"altitude = {np.max(rocket_parameters['Altitude']):.1f} m (max), "
+        f"velocity = {rocket_parameters['Velocity'][-1]:.1f} m/s (final)"
+    )
+    if args.stream:
+        rocket_parameters.close()
+    if args.profile:
+        print("\n".join(PROFILER.report()))
+        print(f"histograms written to {PROFILER.export()}")
+    if integrator is not None:
+        stats = integrator.stats
+        print(
+            f"{stats['Integrator']}: {stats['Accepted Steps']} accepted, "
+            f"{stats['Rejected Steps']} rejected, {stats['Evaluations']} evaluations"
         )
+    if events is not None:
+        for event in events.log:
+            print(
+                f"{event['Time']:10.4f} s  {event['Event']:<32} "
+                f"altitude = {event['Altitude']:.1f} m, value = {event['Value']:.6g}"
+            )
 
 
-plots.csv_output(rocket_parameters)
-plots.altitude_plot(rocket_parameters)
-plots.position_plot(rocket_parameters)
-plots.velocity_plot(rocket_parameters)
-plots.acceleration_plot(rocket_parameters)
-plots.force_plot(rocket_parameters)
-plots.fuel_plot(rocket_parameters)
-plots.drag_force_plot(rocket_parameters)
-plots.weight_plot(rocket_parameters)
-plots.gravity_plot(rocket_parameters)
+if __name__ == "__main__":
+    main()
@@ -13,10 +13,138 @@ LAYERS = {
     "Map Bound": 9,
 }
 
+# On-disk cache of simulation results (see result_cache.py), least recently
+# used entries are evicted once the directory grows past "Max Size" bytes
+CACHE = {
+    "Directory": "../cache",
+    "Max Size": 512 * 1024**2,
+}
+
+# On-disk cache of decoded, scaled and converted images (see assets.py),
+# least recently used entries are evicted past "Max Size" bytes. Pixels are
+# stored zlib compressed at level "Compression" (0 stores them raw), cold
+# images are decoded on "Workers" threads (None lets Python pick)
+ASSETS = {
+    "Directory": "../cache/assets",
+    "Max Size": 256 * 1024**2,
+    "Compression": 1,
+    "Workers": None,
+}
+
+# Chart rendering profiles for plots.py. "Max Points" caps each line after LTTB
+# downsampling (None keeps every sample)
+PLOT_PROFILES = {
+    "Default": {"DPI": 150, "Glow": False, "Max Points": 2000},
+    "Publication": {"DPI": 900, "Glow": True, "Max Points": 10000},
+}
+
+# Trace channels (see tracing.py). "Level" None keeps every channel off, or one
+# of "debug", "info", "warning", "error". "Capacity" is the ring buffer size in
+# records
+TRACE = {
+    "Level": None,
+    "Sample Every": 1,
+    "Capacity": 10000,
+}
+
+# Per phase timing of Rocket.update and Game.run (see profiling.py). Percentiles
+# cover the last "Window" samples of each phase, exports go to "Directory".
+# F3 in the game toggles profiling and the overlay, which is redrawn every
+# "Overlay Refresh" frames
+PROFILING = {
+    "Enabled": False,
+    "Window": 10000,
+    "Directory": "plots",
+    "Overlay Refresh": 30,
+}
+
+# Benchmark suite (see benchmark.py). Each benchmark keeps its best of "Repeat"
+# runs, results more than "Regression" slower than the history median are flagged
+BENCHMARK = {
+    # Per machine run history, outside the tracked tree like the other caches
+    "History": "../cache/Benchmark History.jsonl",
+    # Reference results, committed, compared against when the history has no
+    # runs for this machine (python benchmark.py --write-baseline)
+    "Baseline": "plots/Benchmark Baseline.json",
+    "Repeat": 5,
+    "Regression": 0.10,
+}
+
+# AllSprites drawing (see main.py). Sprites are indexed on a grid of "Cell
+# Size" pixel cells so a frame only looks at the cells under the window. Static
+# tile layers are baked into "Chunk Size" pixel square surfaces at load time.
+# "Parallax" lists the background images ("Map File" PNGs) bottom to top with
+# how far each scrolls per pixel of camera movement, 1 moves with the map
+RENDERING = {
+    "Cell Size": 256,
+    "Chunk Size": 512,
+    "Parallax": {
+        "bg_sky": 1.0,
+        "bg_space_1": 1.0,
+        "bg_space_2": 1.0,
+        "bg_space_3": 1.0,
+    },
+}
+
+# Texture atlases (see atlas.py) for animation frames and map tiles, packed
+# onto pages of at most "Page Size" pixels square
+ATLAS = {
+    "Page Size": 2048,
+}
+
+# Compiled TMX maps (see tilemap.py) are cached in "Directory". Static tile
+# layer chunks are built once they are within "Load Margin" pixels of the
+# window and dropped again past "Drop Margin"
+MAP = {
+    "Directory": "../cache/maps",
+    "Load Margin": 512,
+    "Drop Margin": 1536,
+}
+
+# Game.run loop. Sprites update in fixed steps of 1 / "Tick Rate" seconds, at
+# most "Max Steps Per Frame" per frame (the rest of a long stall is dropped).
+# Frames are capped at "Max FPS" (None for no cap) and at "Background FPS"
+# while the window is unfocused or minimised
+GAME_LOOP = {
+    "Tick Rate": 60,
+    "Max Steps Per Frame": 5,
+    "Max FPS": 144,
+    "Background FPS": 10,
+}
+
+# Flight simulation in a worker process (see physics_worker.py), drawn by the
+# game as the player sprite when "Enabled". The worker steps "Vehicle" at
+# "Rate" Hz of simulated time, "Time Scale" simulated seconds per real second,
+# until "T End", catching up at most "Max Catch Up" steps after a stall. "Slots"
+# is the shared memory ring size in snapshots, "Pixels Per Metre" the scale the
+# flight is drawn at from the player's start position
+PHYSICS_WORKER = {
+    "Enabled": False,
+    "Vehicle": "Block 1",
+    "Rate": 100,
+    "Time Scale": 1.0,
+    "T End": 1000,
+    "Max Catch Up": 10,
+    "Slots": 256,
+    "Pixels Per Metre": 0.05,
+}
+
 GRAVITATIONAL_CONSTANT = 6.6738e-11
 EARTH_MASS = 5.9722e24  # kg
 EARTH_RADIUS = 6.371e6  # m
 
+EARTH_ROTATION_RATE = 7.2921159e-5  # rad/s
+
+# Earth centred flight (rocket.VectorRocket). Unpowered flight above "Coast
+# Altitude" (m) is propagated with the Kepler solution in orbit.py, one call
+# per "Coast Sample" seconds of telemetry
+ORBIT = {
+    "Launch Latitude": 28.5,  # degrees, Kennedy Space Center
+    "Earth Rotation Rate": EARTH_ROTATION_RATE,
+    "Coast Altitude": 150000,
+    "Coast Sample": 60,
+}
+
 
 # ----------------------------------------------------------------
 # --------------- STAGE PARAMETERS BELOW -------------------------
@@ -104,6 +232,39 @@ EXPLORATION_UPPER_STAGE = {
     "Payload Mass": 0,
 }
 
+# Pitch angle (degrees from horizontal) the flight controller holds in each phase
+FLIGHT_PROGRAM = {
+    "Launch Pitch": 90,
+    "Core Pitch": 150,
+    "Interim Pitch": 30,
+}
+
+# Stage stacks (see vehicles.py). "Stages" names the settings dictionary of
+# every stage, "Stack" lists the serial groups bottom to top with the stages
+# of a group firing in parallel (the first one carries the reference area of
+# the group), "Pitch" maps phase names to FLIGHT_PROGRAM keys
+VEHICLES = {
+    "Block 1": {
+        "Stages": {
+            "Core": CORE_STAGE,
+            "SRB": SOLID_ROCKET_BOOSTERS,
+            "Interim": INTERIM_CRYOGENIC_STAGE,
+        },
+        "Stack": [["Core", "SRB"], ["Interim"]],
+        "Pitch": {"Core": "Core Pitch", "Interim": "Interim Pitch"},
+    },
+    "Block 1B": {
+        "Stages": {
+            "Core": CORE_STAGE,
+            "SRB": SOLID_ROCKET_BOOSTERS,
+            "Exploration": EXPLORATION_UPPER_STAGE,
+        },
+        "Stack": [["Core", "SRB"], ["Exploration"]],
+        # The upper stage flies the same pitch program whichever it is
+        "Pitch": {"Core": "Core Pitch", "Exploration": "Interim Pitch"},
+    },
+}
+
 PLACE_HOLDER_STAGE = {
     "Dry Mass": 0,
     "Propellant Mass": 0,
@@ -1,9 +1,23 @@
-from pygame import Vector2 as vector
 from settings import *
-from gravity import gravity_acceleration_calc
 
 
 class Stage:
+    # Fixed attribute set: no per instance __dict__, and faster attribute access
+    # in the step loop
+    __slots__ = (
+        "dry_mass",
+        "prop_mass",
+        "total_mass",
+        "mass_flow",
+        "mass_flow_copy",
+        "exhaust_velocity",
+        "exhaust_velocity_copy",
+        "reference_area",
+        "thrust",
+        "firing",
+        "attached",
+    )
+
     def __init__(self, dry_mass, prop_mass, mass_flow, exhaust_v, ref_area):
 
         self.dry_mass = dry_mass
@@ -51,8 +65,59 @@ class Stage:
             self.exhaust_velocity * self.mass_flow if self.prop_mass > 0 else 0
         )
 
+    def calc_step_thrust(self):
+        # Integrator steps: mass flow and exhaust velocity were fixed for the
+        # whole step by Rocket.prepare_step, so thrust doesn't drop out at an
+        # RK stage that lands on burnout (prop_mass == 0)
+        self.thrust = self.exhaust_velocity * self.mass_flow
+
+    def definition(self):
+        # Plain data describing this stage's current state, used to key cached results
+        return {
+            "Dry Mass": self.dry_mass,
+            "Propellant Mass": self.prop_mass,
+            "Mass Flow": self.mass_flow,
+            "Nominal Mass Flow": self.mass_flow_copy,
+            "Exhaust Velocity": self.exhaust_velocity,
+            "Nominal Exhaust Velocity": self.exhaust_velocity_copy,
+            "Reference Area": self.reference_area,
+            "Firing": self.firing,
+            "Attached": self.attached,
+        }
+
     def update(self, dt):
-        self.calc_mass(dt)
-        self.check_firing()
-        self.check_attachment()
-        self.calc_thrust()
+        # calc_mass, check_firing, check_attachment and calc_thrust fused into
+        # one pass (same order, same arithmetic), this runs for every stage on
+        # every step
+        prop_mass = self.prop_mass + self.mass_flow * dt
+        if prop_mass < 0.0:
+            prop_mass = 0.0
+        total_mass = prop_mass + self.dry_mass
+        if total_mass < 0.0:
+            total_mass = 0.0
+        self.prop_mass = prop_mass
+        self.total_mass = total_mass
+
+        if self.firing:
+            mass_flow = self.mass_flow = self.mass_flow_copy
+            exhaust_velocity = self.exhaust_velocity = self.exhaust_velocity_copy
+        else:
+            mass_flow = self.mass_flow = 0
+            exhaust_velocity = self.exhaust_velocity = 0
+
+        if not self.attached:
+            self.dry_mass = 0
+            self.reference_area = 0
+
+        self.thrust = exhaust_velocity * mass_flow if prop_mass > 0 else 0
+
+
+def create_stage(stage_parameters):
+    # Build a Stage from one of the stage dictionaries in settings.py
+    return Stage(
+        dry_mass=stage_parameters["Dry Mass"],
+        prop_mass=stage_parameters["Propellant Mass"],
+        mass_flow=stage_parameters["Mass Flow"],
+        exhaust_v=stage_parameters["Exhaust Velocity"],
+        ref_area=stage_parameters["Reference Area"],
+    )
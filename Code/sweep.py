@@ -0,0 +1,217 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from events import EventDetector, default_events
+from integrators import create_integrator
+from rocket import build_rocket, simulate
+from settings import *
+
+# Parameter sweeps over the settings dictionaries. A sweep spec is a JSON file:
+# {
+#     "mode": "grid",                 # or "lhs" (Latin hypercube)
+#     "samples": 100,                 # lhs only
+#     "seed": 0,                      # lhs only
+#     "dt": 0.1, "t_end": 1000, "integrator": "rk45",
+#     "parameters": {
+#         "CORE_STAGE.Mass Flow": [-2000, -2060, -2120],   # grid: list of values
+#         "FLIGHT_PROGRAM.Core Pitch": [140, 160]          # lhs: [low, high]
+#     }
+# }
+# Parameter names are "<settings dictionary>.<key>". Cases are fanned out over a
+# process pool and every finished case is appended to the summary CSV straight
+# away, so an interrupted sweep picks up where it stopped when run again
+
+SWEEPABLE = {
+    "CORE_STAGE": CORE_STAGE,
+    "SOLID_ROCKET_BOOSTERS": SOLID_ROCKET_BOOSTERS,
+    "INTERIM_CRYOGENIC_STAGE": INTERIM_CRYOGENIC_STAGE,
+    "FLIGHT_PROGRAM": FLIGHT_PROGRAM,
+}
+
+SUMMARY_COLUMNS = [
+    "Max Altitude",
+    "Max-Q",
+    "Max-Q Time",
+    "SRB Burnout Time",
+    "Core Burnout Time",
+    "Interim Burnout Time",
+    "Final Velocity",
+]
+
+
+def split_parameter(name):
+    group, _, key = name.partition(".")
+    if group not in SWEEPABLE or key not in SWEEPABLE[group]:
+        raise ValueError(
+            f"Unknown sweep parameter {name!r}, expected <dictionary>.<key> with "
+            f"dictionary one of {sorted(SWEEPABLE)}"
+        )
+    return group, key
+
+
+def generate_cases(spec):
+    # Deterministic for a given spec, so case numbers are stable across resumes
+    parameters = spec["parameters"]
+    names = list(parameters)
+    for name in names:
+        split_parameter(name)
+
+    if spec.get("mode", "grid") == "grid":
+        rows = itertools.product(*(parameters[name] for name in names))
+    elif spec["mode"] == "lhs":
+        samples = spec["samples"]
+        rng = np.random.default_rng(spec.get("seed", 0))
+        columns = []
+        for name in names:
+            low, high = parameters[name]
+            # One sample in each of `samples` equal strata, strata shuffled
+            strata = (rng.permutation(samples) + rng.random(samples)) / samples
+            columns.append(low + strata * (high - low))
+        rows = zip(*(column.tolist() for column in columns))
+    else:
+        raise ValueError(f"Unknown sweep mode {spec['mode']!r}, expected grid or lhs")
+
+    for number, values in enumerate(rows):
+        yield {"Case": number, **dict(zip(names, values))}
+
+
+class SummaryRecorder:
+    # Keeps only what a sweep summary needs instead of the full telemetry
+    def __init__(self):
+        self.max_altitude = 0.0
+        self.final_velocity = 0.0
+
+    def record(self, t, rocket):
+        self.max_altitude = max(self.max_altitude, rocket.pos[1])
+        self.final_velocity = rocket.rocket_velocity
+
+    @property
+    def telemetry(self):
+        return {"Max Altitude": self.max_altitude, "Final Velocity": self.final_velocity}
+
+
+def run_case(case, dt=0.1, t_end=1000, integrator="rk45"):
+    # Runs in a worker process, so it only takes and returns plain data
+    dictionaries = {group: dict(values) for group, values in SWEEPABLE.items()}
+    for name, value in case.items():
+        if name != "Case":
+            group, key = split_parameter(name)
+            dictionaries[group][key] = value
+
+    rocket = build_rocket(
+        core=dictionaries["CORE_STAGE"],
+        srb=dictionaries["SOLID_ROCKET_BOOSTERS"],
+        interim=dictionaries["INTERIM_CRYOGENIC_STAGE"],
+        flight_program=dictionaries["FLIGHT_PROGRAM"],
+    )
+    events = EventDetector(default_events(rocket))
+    summary = simulate(
+        rocket,
+        dt=dt,
+        t_end=t_end,
+        recorder=SummaryRecorder(),
+        integrator=create_integrator(integrator),
+        events=events,
+    )
+
+    times = {event["Event"]: event for event in events.log}
+    result = dict(case)
+    result["Max Altitude"] = summary["Max Altitude"]
+    result["Max-Q"] = times["Max-Q"]["Value"] if "Max-Q" in times else ""
+    result["Max-Q Time"] = times["Max-Q"]["Time"] if "Max-Q" in times else ""
+    for stage in ("SRB", "Core", "Interim"):
+        event = times.get(f"{stage} Burnout")
+        result[f"{stage} Burnout Time"] = event["Time"] if event else ""
+    result["Final Velocity"] = summary["Final Velocity"]
+    return result
+
+
+def completed_cases(output, cases):
+    # Case numbers already in the summary file. Refuses to resume a file that
+    # was written for a different spec
+    if not os.path.exists(output):
+        return set()
+    by_number = {case["Case"]: case for case in cases}
+    done = set()
+    with open(output, newline="") as summary_file:
+        for row in csv.DictReader(summary_file):
+            number = int(row["Case"])
+            case = by_number.get(number)
+            if case is None or any(
+                not np.isclose(float(row[name]), value)
+                for name, value in case.items()
+                if name != "Case"
+            ):
+                raise ValueError(
+                    f"{output} does not match this sweep spec (case {number}), "
+                    "use --restart to overwrite it"
+                )
+            done.add(number)
+    return done
+
+
+def run_sweep(spec, output, workers=None, restart=False, progress=sys.stderr):
+    cases = list(generate_cases(spec))
+    if restart and os.path.exists(output):
+        os.remove(output)
+    done = completed_cases(output, cases)
+    remaining = [case for case in cases if case["Case"] not in done]
+
+    columns = ["Case"] + list(spec["parameters"]) + SUMMARY_COLUMNS
+    new_file = not os.path.exists(output)
+    options = {
+        "dt": spec.get("dt", 0.1),
+        "t_end": spec.get("t_end", 1000),
+        "integrator": spec.get("integrator", "rk45"),
+    }
+
+    start = time.perf_counter()
+    with open(output, "a", newline="") as summary_file:
+        writer = csv.DictWriter(summary_file, fieldnames=columns)
+        if new_file:
+            writer.writeheader()
+            summary_file.flush()
+
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(run_case, case, **options) for case in remaining]
+            for finished, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                writer.writerow(result)
+                # Flushed per case so an interrupted sweep loses nothing it finished
+                summary_file.flush()
+                if progress is not None:
+                    elapsed = time.perf_counter() - start
+                    eta = elapsed / finished * (len(remaining) - finished)
+                    print(
+                        f"[{len(done) + finished}/{len(cases)}] case {result['Case']} "
+                        f"max altitude {result['Max Altitude']:.0f} m "
+                        f"({elapsed:.1f} s elapsed, ~{eta:.1f} s left)",
+                        file=progress,
+                        flush=True,
+                    )
+
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a parameter sweep over the stage settings")
+    parser.add_argument("spec", help="sweep spec JSON file")
+    parser.add_argument("--output", default="plots/Sweep Summary.csv", help="summary CSV (resumed if it exists)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--restart", action="store_true", help="discard an existing summary instead of resuming")
+    args = parser.parse_args(argv)
+
+    with open(args.spec) as spec_file:
+        spec = json.load(spec_file)
+    run_sweep(spec, args.output, workers=args.workers, restart=args.restart)
+
+
+if __name__ == "__main__":
+    main()
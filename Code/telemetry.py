@@ -0,0 +1,179 @@
+import csv
+import struct
+
+import numpy as np
+
+
+def create_rocket_dict(rocket_parameters, stage_names):
+    # Create dictionary and associated keys for use with HUD GUI within pygame,
+    # one fuel column per stage of the vehicle (rocket.stack.stage_names)
+    rocket_parameters["Time"] = []
+    rocket_parameters["Altitude"] = []
+    rocket_parameters["X Position"] = []
+    rocket_parameters["Velocity"] = []
+    rocket_parameters["Acceleration"] = []
+    rocket_parameters["Thrust"] = []
+    rocket_parameters["Weight"] = []
+    rocket_parameters["Gravity Acceleration"] = []
+    rocket_parameters["Drag Force"] = []
+    rocket_parameters["Resultant Force"] = []
+    rocket_parameters["Mach Speed"] = []
+    rocket_parameters["Air Density"] = []
+    rocket_parameters["Reference Area"] = []
+    rocket_parameters["Current Total Mass"] = []
+    rocket_parameters["Total Fuel Remaining"] = []
+    for column in stage_columns(stage_names):
+        rocket_parameters[column] = []
+
+
+def update_rocket_dict(rocket_parameters, t, rocket):
+    rocket_parameters["Time"].append(t)
+    rocket_parameters["Total Fuel Remaining"].append(rocket.current_propellant_mass)
+    for column, stage in zip(stage_columns(rocket.stack.stage_names), rocket.stage_objects):
+        rocket_parameters[column].append(stage.prop_mass)
+    rocket_parameters["Current Total Mass"].append(rocket.current_total_mass)
+    rocket_parameters["Altitude"].append(rocket.pos[1])
+    rocket_parameters["X Position"].append(rocket.pos[0])
+    rocket_parameters["Velocity"].append(rocket.rocket_velocity)
+    rocket_parameters["Acceleration"].append(rocket.rocket_acceleration)
+    rocket_parameters["Thrust"].append(rocket.current_thrust)
+    rocket_parameters["Drag Force"].append(rocket.drag_force)
+    rocket_parameters["Weight"].append(rocket.current_weight)
+    rocket_parameters["Gravity Acceleration"].append(rocket.current_gravity)
+    rocket_parameters["Resultant Force"].append(rocket.current_resultant_force)
+    rocket_parameters["Mach Speed"].append(rocket.mach_speed)
+    rocket_parameters["Air Density"].append(rocket.air_density)
+    rocket_parameters["Reference Area"].append(rocket.reference_area)
+
+
+def csv_output(rocket_parameters, path="plots/Rocket Values.csv"):
+    # fmt: off
+    with open(path, "w") as new_file:
+        writer = csv.writer(new_file)
+        key_list = list(rocket_parameters.keys())
+
+        writer.writerow(key_list)
+        writer.writerows(zip(*rocket_parameters.values()))
+
+
+class DictRecorder:
+    # Collects a flight into the original dict of lists layout, kept for code
+    # that appends to rocket_parameters itself. rocket.simulate defaults to
+    # ColumnarRecorder below
+    def __init__(self):
+        self.rocket_parameters = None
+
+    def record(self, t, rocket):
+        if self.rocket_parameters is None:
+            self.rocket_parameters = {}
+            create_rocket_dict(self.rocket_parameters, rocket.stack.stage_names)
+        update_rocket_dict(self.rocket_parameters, t, rocket)
+
+    @property
+    def telemetry(self):
+        if self.rocket_parameters is None:
+            return {name: [] for name in TELEMETRY_COLUMNS}
+        return self.rocket_parameters
+
+
+# Columns every vehicle has, in the same order as create_rocket_dict. After
+# them comes one "<Stage> Fuel Remaining" column per stage, see
+# telemetry_columns
+TELEMETRY_COLUMNS = (
+    "Time",
+    "Altitude",
+    "X Position",
+    "Velocity",
+    "Acceleration",
+    "Thrust",
+    "Weight",
+    "Gravity Acceleration",
+    "Drag Force",
+    "Resultant Force",
+    "Mach Speed",
+    "Air Density",
+    "Reference Area",
+    "Current Total Mass",
+    "Total Fuel Remaining",
+)
+
+
+def stage_columns(stage_names):
+    return tuple(f"{name} Fuel Remaining" for name in stage_names)
+
+
+def telemetry_columns(stage_names):
+    # Every column of a vehicle with these stages (rocket.stack.stage_names)
+    return TELEMETRY_COLUMNS + stage_columns(stage_names)
+
+
+def telemetry_dtype(columns):
+    return np.dtype([(name, np.float64) for name in columns])
+
+
+class ColumnarRecorder:
+    # Default recorder for rocket.simulate. Rows go into a preallocated NumPy
+    # structured array that grows a chunk at a time, every value is one the
+    # rocket already computed this step (Rocket.calc_forces) so recording
+    # doesn't re-sum the stages. Each row is packed straight into the array's
+    # memory with struct, which is far cheaper than assigning a structured row.
+    # telemetry returns zero-copy views of each column, which stay valid until
+    # the buffer next has to grow. The stage columns are only known once the
+    # first row arrives, so the buffer is allocated then
+    def __init__(self, capacity=0, chunk_size=4096):
+        self.capacity = max(capacity, chunk_size)
+        self.chunk_size = chunk_size
+        self.length = 0
+        self.columns = None
+        self.buffer = None
+
+    def setup(self, stage_names):
+        self.columns = telemetry_columns(stage_names)
+        self.dtype = telemetry_dtype(self.columns)
+        self.row = struct.Struct(f"={len(self.columns)}d")
+        self.allocate(self.capacity)
+
+    def allocate(self, rows):
+        buffer = np.empty(rows, dtype=self.dtype)
+        if self.length:
+            buffer[: self.length] = self.buffer[: self.length]
+        self.buffer = buffer
+        self.memory = memoryview(buffer).cast("B")
+
+    def record(self, t, rocket):
+        if self.buffer is None:
+            self.setup(rocket.stack.stage_names)
+        if self.length == len(self.buffer):
+            self.allocate(len(self.buffer) + self.chunk_size)
+        self.row.pack_into(
+            self.memory,
+            self.length * self.row.size,
+            t,
+            rocket.pos[1],
+            rocket.pos[0],
+            rocket.rocket_velocity,
+            rocket.rocket_acceleration,
+            rocket.current_thrust,
+            rocket.current_weight,
+            rocket.current_gravity,
+            rocket.drag_force,
+            rocket.current_resultant_force,
+            rocket.mach_speed,
+            rocket.air_density,
+            rocket.reference_area,
+            rocket.current_total_mass,
+            rocket.current_propellant_mass,
+            *[stage.prop_mass for stage in rocket.stage_objects],
+        )
+        self.length += 1
+
+    @property
+    def rows(self):
+        if self.buffer is None:
+            return np.empty(0, dtype=telemetry_dtype(TELEMETRY_COLUMNS))
+        return self.buffer[: self.length]
+
+    @property
+    def telemetry(self):
+        rows = self.rows
+        return {name: rows[name] for name in rows.dtype.names}
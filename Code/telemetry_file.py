@@ -0,0 +1,258 @@
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+from telemetry import TELEMETRY_COLUMNS, ColumnarRecorder, telemetry_columns
+
+# Chunked binary telemetry files (.rkt), written while the simulation runs.
+#
+#   header   MAGIC, uint32 length, JSON {"Columns": [...], "Chunk Rows": n}
+#   chunks   uint32 rows, float64 first time, float64 last time, then every
+#            column as `rows` float64 values one after another (column major,
+#            so one column of one chunk is a single contiguous slice)
+#   index    JSON [[offset, rows, first time, last time], ...]
+#   footer   uint64 index offset, INDEX_MAGIC
+#
+# All numbers are little endian. A reader memory maps the file and uses the
+# index to touch only the chunks and columns it needs. A file whose writer
+# never closed it (no footer) is still readable, the chunk headers are walked
+# instead of the index
+
+MAGIC = b"RKTTLM01"
+INDEX_MAGIC = b"RKTIDX01"
+CHUNK_HEADER = struct.Struct("<Idd")
+FOOTER = struct.Struct("<Q8s")
+
+
+class StreamingRecorder:
+    # Recorder for rocket.simulate that flushes every `chunk_rows` rows to disk,
+    # so memory use stays flat however long the flight is. The header goes out
+    # with the first row, once the vehicle's stage columns are known
+    def __init__(self, path, chunk_rows=4096):
+        self.path = path
+        self.columns = None
+        self.chunk = ColumnarRecorder(capacity=chunk_rows, chunk_size=chunk_rows)
+        self.chunk_rows = chunk_rows
+        self.index = []
+        self.file = open(path, "wb")
+
+    def write_header(self, columns):
+        self.columns = list(columns)
+        header = json.dumps({"Columns": self.columns, "Chunk Rows": self.chunk_rows}).encode()
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def record(self, t, rocket):
+        if self.columns is None:
+            self.write_header(telemetry_columns(rocket.stack.stage_names))
+        self.chunk.record(t, rocket)
+        if self.chunk.length == self.chunk_rows:
+            self.write_chunk()
+
+    def write_chunk(self):
+        rows = self.chunk.rows
+        if not len(rows):
+            return
+        matrix = rows.view(np.float64).reshape(len(rows), len(self.columns))
+        first, last = float(rows["Time"][0]), float(rows["Time"][-1])
+        offset = self.file.tell()
+        self.file.write(CHUNK_HEADER.pack(len(rows), first, last))
+        self.file.write(np.ascontiguousarray(matrix.T, dtype="<f8").tobytes())
+        self.file.flush()
+        self.index.append([offset, len(rows), first, last])
+        self.chunk.length = 0
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.columns is None:
+            self.write_header(TELEMETRY_COLUMNS)
+        self.write_chunk()
+        index_offset = self.file.tell()
+        self.file.write(json.dumps(self.index).encode())
+        self.file.write(FOOTER.pack(index_offset, INDEX_MAGIC))
+        self.file.close()
+
+    @property
+    def telemetry(self):
+        # Called by rocket.simulate at the end of a flight: finish the file and
+        # hand it back as a TelemetryFile, nothing is read until a column is
+        # asked for
+        self.close()
+        return TelemetryFile(self.path)
+
+
+class TelemetryFile:
+    # Memory mapped reader. Indexing with a column name reads that column, so
+    # a TelemetryFile stands in for the {column: values} telemetry dict. Close
+    # it (or use it as a context manager) to unmap the file, arrays already
+    # read from it keep the mapping alive until they are dropped
+    def __init__(self, path):
+        self.path = path
+        self.map = None
+        self.data = None
+        self.file = open(path, "rb")
+        try:
+            self.read_header()
+        except BaseException:
+            # Empty or cut short (writer killed before its first flush), or not
+            # a telemetry file at all: don't leave the file open
+            self.close()
+            raise
+
+        self.index = self.read_index()
+        self.first_times = [chunk[2] for chunk in self.index]
+        self.last_times = [chunk[3] for chunk in self.index]
+
+    def read_header(self):
+        header_start = len(MAGIC) + 4
+        # mmap refuses empty files, check the size first
+        if os.fstat(self.file.fileno()).st_size < header_start:
+            raise ValueError(f"{self.path} is not a telemetry file")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = np.frombuffer(self.map, dtype=np.uint8)
+
+        if bytes(self.data[: len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{self.path} is not a telemetry file")
+        (header_length,) = struct.unpack_from("<I", self.data, len(MAGIC))
+        try:
+            header = json.loads(bytes(self.data[header_start : header_start + header_length]))
+            self.columns = header["Columns"]
+        except (ValueError, KeyError, TypeError):
+            raise ValueError(f"{self.path} is not a telemetry file") from None
+        self.chunks_start = header_start + header_length
+
+    def read_index(self):
+        end = len(self.data)
+        if end >= self.chunks_start + FOOTER.size:
+            index_offset, magic = FOOTER.unpack_from(self.data, end - FOOTER.size)
+            if magic == INDEX_MAGIC:
+                return json.loads(bytes(self.data[index_offset : end - FOOTER.size]))
+
+        # No footer, the writer was interrupted: walk the chunk headers
+        index = []
+        offset = self.chunks_start
+        while offset + CHUNK_HEADER.size <= end:
+            rows, first, last = CHUNK_HEADER.unpack_from(self.data, offset)
+            size = CHUNK_HEADER.size + rows * len(self.columns) * 8
+            if offset + size > end:
+                break
+            index.append([offset, rows, first, last])
+            offset += size
+        return index
+
+    def __len__(self):
+        return sum(chunk[1] for chunk in self.index)
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    def __getitem__(self, column):
+        if column not in self.columns:
+            raise KeyError(column)
+        return self.read([column])[column]
+
+    def keys(self):
+        return list(self.columns)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.data = None
+        try:
+            if self.map is not None:
+                self.map.close()
+        except BufferError:
+            # Columns handed out still point into the mapping, it goes once
+            # they do
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def chunk_column(self, chunk, column):
+        offset, rows, _, _ = chunk
+        start = offset + CHUNK_HEADER.size + self.columns.index(column) * rows * 8
+        return np.frombuffer(self.data, dtype="<f8", count=rows, offset=start)
+
+    def read(self, columns=None, t_start=None, t_end=None):
+        # {column: array} for rows with t_start <= Time <= t_end. Only the chunks
+        # overlapping the window are touched
+        columns = self.columns if columns is None else list(columns)
+        first = 0 if t_start is None else bisect_left(self.last_times, t_start)
+        last = len(self.index) if t_end is None else bisect_right(self.first_times, t_end)
+        chunks = self.index[first:last]
+
+        if not chunks:
+            return {column: np.empty(0) for column in columns}
+        times = np.concatenate([self.chunk_column(chunk, "Time") for chunk in chunks])
+        mask = np.ones(len(times), dtype=bool)
+        if t_start is not None:
+            mask &= times >= t_start
+        if t_end is not None:
+            mask &= times <= t_end
+
+        result = {}
+        for column in columns:
+            if len(chunks) == 1 and mask.all():
+                # Single chunk and nothing to cut, hand back the mapped slice itself
+                result[column] = self.chunk_column(chunks[0], column)
+            else:
+                values = np.concatenate([self.chunk_column(chunk, column) for chunk in chunks])
+                result[column] = values[mask]
+        return result
+
+
+def export_csv(path, csv_path, columns=None, t_start=None, t_end=None):
+    # CSV converter on top of a telemetry file, written one chunk at a time
+    with TelemetryFile(path) as telemetry_file, open(csv_path, "w", newline="") as new_file:
+        columns = telemetry_file.columns if columns is None else list(columns)
+        writer = csv.writer(new_file)
+        writer.writerow(columns)
+        for chunk in telemetry_file.index:
+            if (t_start is not None and chunk[3] < t_start) or (t_end is not None and chunk[2] > t_end):
+                continue
+            times = telemetry_file.chunk_column(chunk, "Time")
+            mask = np.ones(len(times), dtype=bool)
+            if t_start is not None:
+                mask &= times >= t_start
+            if t_end is not None:
+                mask &= times <= t_end
+            values = [telemetry_file.chunk_column(chunk, column)[mask] for column in columns]
+            writer.writerows(zip(*(column.tolist() for column in values)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or convert a telemetry file")
+    parser.add_argument("path", help=".rkt telemetry file")
+    parser.add_argument("--csv", help="write the selected rows / columns to this CSV file")
+    parser.add_argument("--columns", nargs="+", help="columns to export (default: all)")
+    parser.add_argument("--start", type=float, default=None, help="first time to include (s)")
+    parser.add_argument("--end", type=float, default=None, help="last time to include (s)")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        export_csv(args.path, args.csv, args.columns, args.start, args.end)
+    else:
+        with TelemetryFile(args.path) as telemetry_file:
+            print(
+                f"{len(telemetry_file)} rows in {len(telemetry_file.index)} chunks, "
+                f"t = {telemetry_file.first_times[0] if telemetry_file.index else 0:g} .. "
+                f"{telemetry_file.last_times[-1] if telemetry_file.index else 0:g} s"
+            )
+            print("columns: " + ", ".join(telemetry_file.columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import numpy as np
+from atmosphere import air_density, drag_coefficient, speed_of_sound
+
+
+def test_scalar_and_array_lookups_agree():
+    rng = np.random.default_rng(0)
+    for lookup, values in (
+        (air_density, np.append(rng.uniform(-100, 1.1e6, 1000), [0.0, 1e6])),
+        (speed_of_sound, rng.uniform(-100, 1.1e6, 1000)),
+        (drag_coefficient, np.append(rng.uniform(-1, 30, 1000), [0.0, 9.0])),
+    ):
+        array = lookup(values)
+        for value, expected in zip(values, array):
+            # NumPy scalars come back as plain floats, same as Python floats
+            result = lookup(value)
+            assert type(result) is float
+            assert result == lookup(float(value)) == expected
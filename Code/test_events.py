@@ -0,0 +1,40 @@
+import pytest
+from events import EventDetector, default_events
+from integrators import create_integrator
+from rocket import build_rocket, simulate
+from settings import *
+
+
+def fly_rk4(dt, dynamics, t_end=500):
+    # No drag, so the only kinks left in the forces are the burnouts and
+    # separations the events land on, through both SRB and core burnout
+    stages = {name: dict(stage, **{"Reference Area": 0}) for name, stage in VEHICLES["Block 1"]["Stages"].items()}
+    rocket = build_rocket(dynamics=dynamics, stages=stages)
+    events = EventDetector(default_events(rocket))
+    telemetry = simulate(rocket, dt=dt, t_end=t_end, integrator=create_integrator("rk4"), events=events)
+    return telemetry["Velocity"][-1]
+
+
+@pytest.mark.parametrize("dynamics", ["flat", "vector"])
+def test_rk4_events_converge_faster_than_first_order(dynamics):
+    reference = fly_rk4(0.25, dynamics)
+    errors = [abs(fly_rk4(dt, dynamics) - reference) for dt in (2, 1, 0.5)]
+    # Halving dt halves the error at first order, RK4 with burnout landing on
+    # a step boundary cuts it by ~16
+    for coarse, fine in zip(errors, errors[1:]):
+        assert fine * 4 < coarse
+
+
+@pytest.mark.parametrize("dynamics", ["flat", "vector"])
+def test_separation_logs_mass_after_separation(dynamics):
+    rocket = build_rocket(dynamics=dynamics)
+    events = EventDetector(default_events(rocket))
+    simulate(rocket, dt=1, t_end=130, integrator=create_integrator("rk4"), events=events)
+
+    (separation,) = [event for event in events.log if event["Event"].startswith("Separation")]
+    core = rocket.stage_objects[rocket.stack.stage_names.index("Core")]
+    interim = rocket.stage_objects[rocket.stack.stage_names.index("Interim")]
+    # SRBs gone, core and interim stage left at the separation time
+    burnt = CORE_STAGE["Mass Flow"] * (separation["Time"] - 130)
+    expected = core.total_mass + burnt + interim.total_mass
+    assert separation["Value"] == pytest.approx(expected, rel=1e-9)
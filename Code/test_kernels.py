@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from kernels import check_backends, fly_dispersed
+from rocket import build_rocket, simulate
+from test_telemetry import FOUR_STAGE, TWO_STAGE
+
+# Runs on the compiled kernel when numba is installed and as plain Python
+# otherwise, short flights that still pass both staging events
+
+
+def test_kernel_matches_ensemble():
+    differences = check_backends(n=8, dt=0.5, t_end=600, record_every=20)
+    assert set(differences) >= {"Altitude", "Velocity", "Altitude History", "Velocity History"}
+    assert max(differences.values()) <= 1e-9
+
+
+@pytest.mark.parametrize("vehicle", [TWO_STAGE, FOUR_STAGE, "Block 1B"])
+def test_kernel_matches_rocket(vehicle):
+    rocket = build_rocket(vehicle=vehicle)
+    telemetry = simulate(rocket, dt=0.5, t_end=700)
+    results = fly_dispersed(2, vehicle=vehicle, dt=0.5, t_end=700, backend="kernel")
+
+    for column in ("Altitude", "X Position", "Velocity"):
+        np.testing.assert_allclose(results[column], telemetry[column][-1], rtol=1e-9)
+    np.testing.assert_allclose(results["Max Altitude"], max(telemetry["Altitude"]), rtol=1e-9)
+    assert list(results["Stage"]) == [rocket.current_stage] * 2
+
+
+def test_numpy_backend_rejects_other_stacks():
+    with pytest.raises(ValueError, match="Block 1 shaped"):
+        fly_dispersed(2, vehicle=TWO_STAGE, t_end=1, backend="numpy")
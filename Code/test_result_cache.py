@@ -0,0 +1,17 @@
+from events import EventDetector, altitude_event, default_events
+from integrators import create_integrator
+from result_cache import cache_key
+from rocket import build_rocket
+
+
+def key(*extra_events):
+    rocket = build_rocket()
+    events = EventDetector(default_events(rocket) + list(extra_events))
+    return cache_key(rocket, dt=0.5, t_end=600, integrator=create_integrator("rk4"), events=events)
+
+
+def test_events_keyed_by_parameters():
+    assert key(altitude_event(1e5)) == key(altitude_event(1e5))
+    # Same display name, different flights
+    assert key(altitude_event(1e5)) != key(altitude_event(1e5, terminal=True))
+    assert key(altitude_event(1000000)) != key(altitude_event(1000001))
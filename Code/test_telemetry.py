@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+import telemetry_file
+from rocket import build_rocket, simulate
+from settings import *
+from telemetry import TELEMETRY_COLUMNS, DictRecorder
+from telemetry_file import StreamingRecorder, TelemetryFile
+
+# Vehicles with other than the three Block 1 stages, built from the stage
+# dictionaries in settings
+TWO_STAGE = {
+    "Name": "Two Stage",
+    "Stages": {"Core": CORE_STAGE, "Upper": INTERIM_CRYOGENIC_STAGE},
+    "Stack": [["Core"], ["Upper"]],
+    "Pitch": {"Core": "Core Pitch", "Upper": "Interim Pitch"},
+}
+FOUR_STAGE = {
+    "Name": "Four Stage",
+    "Stages": {
+        "Core": CORE_STAGE,
+        "SRB": SOLID_ROCKET_BOOSTERS,
+        "Interim": INTERIM_CRYOGENIC_STAGE,
+        "Exploration": EXPLORATION_UPPER_STAGE,
+    },
+    "Stack": [["Core", "SRB"], ["Interim"], ["Exploration"]],
+    "Pitch": {"Core": "Core Pitch", "Interim": "Interim Pitch", "Exploration": "Interim Pitch"},
+}
+
+
+@pytest.mark.parametrize("vehicle", [TWO_STAGE, FOUR_STAGE, "Block 1B"])
+def test_simulate_stage_columns(vehicle):
+    rocket = build_rocket(vehicle=vehicle)
+    telemetry = simulate(rocket, dt=0.5, t_end=100)
+
+    names = rocket.stack.stage_names
+    assert list(telemetry) == list(TELEMETRY_COLUMNS) + [f"{name} Fuel Remaining" for name in names]
+    assert len(telemetry["Time"]) == 200
+    # Every stage column tracks its own stage, and they add up to the total
+    for name, stage in zip(names, rocket.stage_objects):
+        assert telemetry[f"{name} Fuel Remaining"][-1] == stage.prop_mass
+    stage_total = sum(telemetry[f"{name} Fuel Remaining"] for name in names)
+    np.testing.assert_allclose(stage_total, telemetry["Total Fuel Remaining"])
+
+
+def test_block_1b_has_no_interim_column():
+    telemetry = simulate(build_rocket(vehicle="Block 1B"), dt=0.5, t_end=10)
+    assert "Interim Fuel Remaining" not in telemetry
+    assert "Exploration Fuel Remaining" in telemetry
+
+
+@pytest.mark.parametrize("vehicle", [TWO_STAGE, FOUR_STAGE])
+def test_recorders_agree(vehicle, tmp_path):
+    columnar = simulate(build_rocket(vehicle=vehicle), dt=0.5, t_end=50)
+    dicts = simulate(build_rocket(vehicle=vehicle), dt=0.5, t_end=50, recorder=DictRecorder())
+    streaming = StreamingRecorder(tmp_path / "flight.rkt", chunk_rows=16)
+    streamed = simulate(build_rocket(vehicle=vehicle), dt=0.5, t_end=50, recorder=streaming)
+
+    # Streaming hands back the file itself, columns are read on demand
+    assert isinstance(streamed, TelemetryFile)
+    with streamed:
+        assert list(streamed) == list(columnar)
+        for column, values in columnar.items():
+            np.testing.assert_array_equal(dicts[column], values)
+            np.testing.assert_array_equal(streamed[column], values)
+    assert streamed.file.closed
+
+
+@pytest.mark.parametrize("keep", [0, 5, 14, 40])
+def test_truncated_file_is_not_a_telemetry_file(keep, tmp_path, monkeypatch):
+    streaming = StreamingRecorder(tmp_path / "flight.rkt", chunk_rows=16)
+    simulate(build_rocket(), dt=0.5, t_end=20, recorder=streaming).close()
+    # Writer killed before its first flush: empty, or cut inside the header
+    path = tmp_path / "flight.rkt"
+    path.write_bytes(path.read_bytes()[:keep])
+
+    opened = []
+
+    def tracked_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(telemetry_file, "open", tracked_open, raising=False)
+    with pytest.raises(ValueError, match="not a telemetry file"):
+        TelemetryFile(path)
+    assert opened and all(file.closed for file in opened)
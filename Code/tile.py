@@ -3,6 +3,14 @@ from pygame.math import Vector2 as vector
 from settings import *
 
 
+def moved(sprite):
+    # Let the groups that index sprites by position (main.AllSprites) know the
+    # sprite's rect or image changed, they don't look at sprites otherwise
+    for group in sprite.groups():
+        if hasattr(group, "moved"):
+            group.moved(sprite)
+
+
 class Tile(pygame.sprite.Sprite):
     def __init__(self, pos, surf, group, z):
         super().__init__(group)
@@ -28,3 +36,5 @@ class Clouds(Tile):
         self.old_rect = self.rect.copy()
         self.pos.x += self.direction.x * self.speed * dt
         self.rect.topleft = (round(self.pos.x), round(self.pos.y))
+        if self.rect != self.old_rect:
+            moved(self)
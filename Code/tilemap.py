@@ -0,0 +1,263 @@
+import json
+import math
+import os
+import re
+import tempfile
+
+import numpy as np
+import pygame
+from assets import asset_key
+from atlas import TextureAtlas
+from settings import MAP, RENDERING, WINDOW_HEIGHT, WINDOW_WIDTH
+from tile import Tile
+
+# Tiled maps compiled once into a compact cache: every tile layer as an array
+# of atlas indices (-1 for empty cells), the tiles it uses packed into a
+# texture atlas (see atlas.py) and the objects of every object layer. The cache
+# is keyed (see assets.asset_key) by the TMX and every tileset / image file it
+# references, so a later launch skips pytmx entirely. Static layers are then
+# drawn through a ChunkStreamer, which builds chunk Tiles around the camera on
+# demand and drops distant ones, so only a bounded set of tiles is resident at
+# any altitude.
+
+# Bump when the compiled layout changes
+MAP_VERSION = 2
+
+SOURCE_PATTERN = re.compile(r'source="([^"]+)"')
+
+
+def map_sources(path):
+    # The TMX and every file it pulls in (external tilesets, their images),
+    # found without parsing the map
+    sources = [path]
+    pending = [path]
+    while pending:
+        with open(pending.pop(), encoding="utf-8") as source_file:
+            text = source_file.read()
+        directory = os.path.dirname(source_file.name)
+        for source in SOURCE_PATTERN.findall(text):
+            source = os.path.normpath(os.path.join(directory, source))
+            if source not in sources and os.path.exists(source):
+                sources.append(source)
+                if source.lower().endswith(".tsx"):
+                    pending.append(source)
+    return sources
+
+
+def surface_array(surface):
+    width, height = surface.get_size()
+    return np.frombuffer(pygame.image.tobytes(surface, "RGBA"), dtype=np.uint8).reshape(height, width, 4)
+
+
+def array_surface(array):
+    height, width = array.shape[:2]
+    return pygame.image.frombuffer(array.tobytes(), (width, height), "RGBA").convert_alpha()
+
+
+def compile_map(path):
+    # Parse the TMX with pytmx (tile images need a display) into the arrays
+    # stored by save_map
+    import pytmx
+    from pytmx.util_pygame import load_pygame
+
+    tmx_map = load_pygame(path)
+    gids = {}  # gid: atlas index
+    images = []
+    layers = {}
+    objects = []
+    object_images = []
+    for layer in tmx_map.layers:
+        if isinstance(layer, pytmx.TiledTileLayer):
+            data = np.asarray(layer.data, dtype=np.int64)
+            for gid in np.unique(data[data > 0]).tolist():
+                if gid not in gids:
+                    gids[gid] = len(images)
+                    images.append(tmx_map.get_tile_image_by_gid(gid))
+            lookup = np.full(int(data.max()) + 1, -1, dtype=np.int32)
+            for gid, index in gids.items():
+                if gid < len(lookup):
+                    lookup[gid] = index
+            layers[layer.name] = lookup[data]
+        elif isinstance(layer, pytmx.TiledObjectGroup):
+            for obj in layer:
+                image = None
+                if obj.image is not None:
+                    image = len(object_images)
+                    object_images.append(surface_array(obj.image))
+                objects.append(
+                    {"Layer": layer.name, "Name": obj.name, "X": obj.x, "Y": obj.y, "Image": image}
+                )
+
+    # Tiles as (page, x, y, width, height) on the atlas pages
+    atlas = TextureAtlas(images)
+    rects = np.array(
+        [(page, *rect) for page, rect in atlas.regions],
+        dtype=np.int32,
+    ).reshape(-1, 5)
+    return {
+        "Tile Size": (tmx_map.tilewidth, tmx_map.tileheight),
+        "Layers": layers,
+        "Atlas Pages": [surface_array(page) for page in atlas.pages],
+        "Tile Rects": rects,
+        "Objects": objects,
+        "Object Images": object_images,
+    }
+
+
+def save_map(compiled, path):
+    arrays = {
+        "__meta__": np.array(
+            json.dumps(
+                {
+                    "Tile Size": compiled["Tile Size"],
+                    "Layers": list(compiled["Layers"]),
+                    "Objects": compiled["Objects"],
+                    "Atlas Pages": len(compiled["Atlas Pages"]),
+                    "Object Images": len(compiled["Object Images"]),
+                }
+            )
+        ),
+        "Tile Rects": compiled["Tile Rects"],
+    }
+    for index, page in enumerate(compiled["Atlas Pages"]):
+        arrays[f"Atlas Page {index}"] = page
+    for index, name in enumerate(compiled["Layers"]):
+        arrays[f"Layer {index}"] = compiled["Layers"][name]
+    for index, image in enumerate(compiled["Object Images"]):
+        arrays[f"Object Image {index}"] = image
+
+    # Write to a temporary file and rename, so readers never see half an entry
+    directory = os.path.dirname(path)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(handle, "wb") as entry:
+        np.savez_compressed(entry, **arrays)
+    os.replace(temporary, path)
+
+
+def read_map(path):
+    with np.load(path) as stored:
+        meta = json.loads(str(stored["__meta__"]))
+        return {
+            "Tile Size": tuple(meta["Tile Size"]),
+            "Layers": {name: stored[f"Layer {index}"] for index, name in enumerate(meta["Layers"])},
+            "Atlas Pages": [stored[f"Atlas Page {index}"] for index in range(meta["Atlas Pages"])],
+            "Tile Rects": stored["Tile Rects"],
+            "Objects": meta["Objects"],
+            "Object Images": [stored[f"Object Image {index}"] for index in range(meta["Object Images"])],
+        }
+
+
+class TileMap:
+    def __init__(self, compiled):
+        self.tile_width, self.tile_height = compiled["Tile Size"]
+        self.layers = compiled["Layers"]
+        # (atlas page, source rect) of every tile
+        pages = [array_surface(page) for page in compiled["Atlas Pages"]]
+        self.tiles = [(pages[page], pygame.Rect(rect)) for page, *rect in compiled["Tile Rects"].tolist()]
+        self.object_images = [array_surface(image) for image in compiled["Object Images"]]
+        self.object_list = compiled["Objects"]
+
+    def objects(self, layer):
+        # Objects of an object layer as dicts, "Image" is a surface or None
+        return [
+            dict(obj, Image=None if obj["Image"] is None else self.object_images[obj["Image"]])
+            for obj in self.object_list
+            if obj["Layer"] == layer
+        ]
+
+
+def load_map(path, directory=MAP["Directory"]):
+    # The compiled map, compiling (and caching) it when the TMX or anything it
+    # uses changed
+    os.makedirs(directory, exist_ok=True)
+    key = asset_key(map_sources(path), {"Map": MAP_VERSION})
+    cached = os.path.join(directory, f"{key}.npz")
+    try:
+        compiled = read_map(cached)
+    except (FileNotFoundError, KeyError, ValueError, OSError):
+        compiled = compile_map(path)
+        save_map(compiled, cached)
+    return TileMap(compiled)
+
+
+class ChunkStreamer:
+    # One static tile layer drawn as RENDERING["Chunk Size"] pixel chunk Tiles,
+    # built when they come within MAP["Load Margin"] pixels of the window and
+    # killed again past MAP["Drop Margin"]. Call update with the camera centre
+    # every frame, it only does work when the set of chunks changes
+    def __init__(self, tile_map, layer, group, z):
+        self.tile_map = tile_map
+        self.indices = tile_map.layers[layer]
+        self.group = group
+        self.z = z
+        self.chunk_columns = max(1, RENDERING["Chunk Size"] // tile_map.tile_width)
+        self.chunk_rows = max(1, RENDERING["Chunk Size"] // tile_map.tile_height)
+        self.chunk_width = self.chunk_columns * tile_map.tile_width
+        self.chunk_height = self.chunk_rows * tile_map.tile_height
+        rows, columns = self.indices.shape
+        self.columns = math.ceil(columns / self.chunk_columns)
+        self.rows = math.ceil(rows / self.chunk_rows)
+        self.chunks = {}  # (column, row): Tile
+        self.empty = set()
+
+    def chunk_range(self, center, margin):
+        # Chunk columns / rows overlapping the window grown by margin
+        left = center[0] - WINDOW_WIDTH / 2 - margin
+        top = center[1] - WINDOW_HEIGHT / 2 - margin
+        right = center[0] + WINDOW_WIDTH / 2 + margin
+        bottom = center[1] + WINDOW_HEIGHT / 2 + margin
+        columns = range(
+            max(0, math.floor(left / self.chunk_width)),
+            min(self.columns, math.floor(right / self.chunk_width) + 1),
+        )
+        rows = range(
+            max(0, math.floor(top / self.chunk_height)),
+            min(self.rows, math.floor(bottom / self.chunk_height) + 1),
+        )
+        return columns, rows
+
+    def update(self, center):
+        columns, rows = self.chunk_range(center, MAP["Load Margin"])
+        for column in columns:
+            for row in rows:
+                if (column, row) not in self.chunks and (column, row) not in self.empty:
+                    self.build(column, row)
+
+        columns, rows = self.chunk_range(center, MAP["Drop Margin"])
+        for column, row in list(self.chunks):
+            if column not in columns or row not in rows:
+                self.chunks.pop((column, row)).kill()
+
+    def build(self, column, row):
+        # Tiles are copied in with BLEND_RGBA_MAX onto the clear chunk, a plain
+        # alpha blit would multiply semi transparent pixels by their alpha
+        # twice (once here, once on screen). Grid tiles don't overlap so max is
+        # a straight copy. Chunks are trimmed to the tiles in them
+        block = self.indices[
+            row * self.chunk_rows : (row + 1) * self.chunk_rows,
+            column * self.chunk_columns : (column + 1) * self.chunk_columns,
+        ]
+        ys, xs = np.nonzero(block >= 0)
+        if not len(ys):
+            self.empty.add((column, row))
+            return
+
+        tile_width, tile_height = self.tile_map.tile_width, self.tile_map.tile_height
+        sources = self.tile_map.tiles
+        tiles = [
+            (x * tile_width, y * tile_height) + sources[index]
+            for x, y, index in zip(xs.tolist(), ys.tolist(), block[ys, xs].tolist())
+        ]
+        width = max(left + rect.width for left, _, _, rect in tiles)
+        height = max(top + rect.height for _, top, _, rect in tiles)
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface.blits(
+            [(page, (left, top), rect, pygame.BLEND_RGBA_MAX) for left, top, page, rect in tiles],
+            doreturn=False,
+        )
+        self.chunks[(column, row)] = Tile(
+            pos=(column * self.chunk_width, row * self.chunk_height),
+            surf=surface,
+            group=self.group,
+            z=self.z,
+        )
@@ -0,0 +1,154 @@
+import json
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from settings import TRACE
+
+# Leveled, sampled trace channels that replace the per step print() calls in
+# the simulation and the game loop. Every channel writes into one shared ring
+# buffer of (wall time, channel, level, event, fields) tuples. Nothing is
+# formatted until the buffer is dumped.
+#
+# A disabled level costs one attribute check at the call site:
+#
+#     if TRACER.debug_on:
+#         TRACER.debug("drag", force=self.drag_force)
+#
+# so the fields are never built unless the level is switched on
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {value: name.upper() for name, value in LEVELS.items()}
+
+BUFFER = deque(maxlen=TRACE["Capacity"])
+CHANNELS = {}
+
+
+class Tracer:
+    def __init__(self, name, level=None, sample_every=1, echo=False):
+        self.name = name
+        self.configure(level, sample_every, echo)
+
+    def configure(self, level=None, sample_every=1, echo=False):
+        # level None switches the channel off. DEBUG / INFO records are kept one
+        # in `sample_every` per event, WARNING and above are never sampled out.
+        # echo also prints each kept record as it is written
+        if isinstance(level, str):
+            level = LEVELS[level.lower()]
+        self.level = level
+        self.sample_every = max(1, int(sample_every))
+        self.echo = echo
+        self.counts = {}
+
+        # Checked by the call sites before they build a record
+        self.debug_on = level is not None and level <= DEBUG
+        self.info_on = level is not None and level <= INFO
+        self.warning_on = level is not None and level <= WARNING
+        self.error_on = level is not None and level <= ERROR
+
+    def emit(self, level, event, fields):
+        if level < WARNING and self.sample_every > 1:
+            count = self.counts.get(event, 0)
+            self.counts[event] = count + 1
+            if count % self.sample_every:
+                return
+        record = (time.time(), self.name, level, event, fields)
+        BUFFER.append(record)
+        if self.echo:
+            print(format_record(record))
+
+    def debug(self, event, **fields):
+        if self.debug_on:
+            self.emit(DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        if self.info_on:
+            self.emit(INFO, event, fields)
+
+    def warning(self, event, **fields):
+        if self.warning_on:
+            self.emit(WARNING, event, fields)
+
+    def error(self, event, **fields):
+        if self.error_on:
+            self.emit(ERROR, event, fields)
+
+
+def channel(name):
+    # One shared Tracer per name, like logging.getLogger. New channels start
+    # with the level / sampling from settings.TRACE
+    if name not in CHANNELS:
+        CHANNELS[name] = Tracer(name, TRACE["Level"], TRACE["Sample Every"])
+    return CHANNELS[name]
+
+
+def configure(names=None, level=None, sample_every=1, echo=False):
+    # Reconfigure some (or all existing) channels at once
+    for name in CHANNELS if names is None else names:
+        channel(name).configure(level, sample_every, echo)
+
+
+def plain(value):
+    # JSON fallback: NumPy scalars as Python numbers, anything else as its repr
+    return value.item() if hasattr(value, "item") else repr(value)
+
+
+def format_record(record):
+    wall_time, name, level, event, fields = record
+    values = " ".join(f"{key}={value}" for key, value in fields.items())
+    stamp = time.strftime("%H:%M:%S", time.localtime(wall_time))
+    return f"{stamp}.{int(wall_time % 1 * 1000):03d} {LEVEL_NAMES[level]:<7} {name}.{event} {values}"
+
+
+def records(last=None):
+    kept = list(BUFFER)
+    return kept if last is None else kept[-last:]
+
+
+def dump(file=None, last=None):
+    # Write the buffered records as text (default stderr) or, for a path ending
+    # in .jsonl, one JSON object per line
+    kept = records(last)
+    if isinstance(file, str):
+        with open(file, "w") as trace_file:
+            if file.endswith(".jsonl"):
+                for wall_time, name, level, event, fields in kept:
+                    trace_file.write(
+                        json.dumps(
+                            {
+                                "Time": wall_time,
+                                "Channel": name,
+                                "Level": LEVEL_NAMES[level],
+                                "Event": event,
+                                **fields,
+                            },
+                            default=plain,
+                        )
+                        + "\n"
+                    )
+            else:
+                trace_file.writelines(format_record(record) + "\n" for record in kept)
+        return len(kept)
+
+    file = sys.stderr if file is None else file
+    for record in kept:
+        print(format_record(record), file=file)
+    return len(kept)
+
+
+def clear():
+    BUFFER.clear()
+
+
+@contextmanager
+def dump_on_error(file=None, last=None):
+    # Dump the ring buffer if the block raises, then let the error through
+    try:
+        yield
+    except BaseException as error:
+        if BUFFER and not isinstance(error, (SystemExit, KeyboardInterrupt)):
+            print(f"--- last {len(records(last))} trace records ---", file=sys.stderr)
+            dump(file, last)
+        raise
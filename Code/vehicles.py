@@ -0,0 +1,69 @@
+from settings import VEHICLES
+from stage import create_stage
+
+# Vehicle definitions (settings.VEHICLES) turned into StageStacks: stage names
+# and parameters in a fixed order, the serial groups as tuples of stage
+# indices and the phase pitch map. A stack is read only and shared by every
+# Rocket built from it, each Rocket creates its own Stage objects.
+#
+# Separation rules (applied by Rocket.flight_controller):
+#   - the current group is the lowest one with propellant left in any of its
+#     stages (or the top group once everything has burnt out)
+#   - every group below it has separated, every group above it is idle
+#   - a stage of the current group that burns out while others of the group
+#     still burn separates (SRBs off the core)
+#   - the phase is named after the attached stages of the current group,
+#     "Core SRB", "Core", "Interim", ...
+#   - the first stage of the current group gives the reference area
+
+STACKS = {}
+
+
+class StageStack:
+    def __init__(self, name, definition):
+        self.name = name
+        stages = definition["Stages"]
+        self.stage_names = tuple(stages)
+        self.stage_parameters = tuple(dict(stages[stage]) for stage in self.stage_names)
+
+        index = {stage: number for number, stage in enumerate(self.stage_names)}
+        grouped = [stage for group in definition["Stack"] for stage in group]
+        if sorted(grouped) != sorted(self.stage_names):
+            raise ValueError(
+                f"Vehicle {name!r}: every stage must appear in exactly one stack group, "
+                f"stages {list(self.stage_names)}, stack {definition['Stack']}"
+            )
+        self.groups = tuple(tuple(index[stage] for stage in group) for group in definition["Stack"])
+        self.pitch = dict(definition.get("Pitch", {}))
+
+    def create_stages(self, overrides=None):
+        # Fresh Stage objects in stack order. overrides maps stage names to
+        # replacement settings dictionaries
+        overrides = overrides or {}
+        return [
+            create_stage(overrides.get(name, parameters))
+            for name, parameters in zip(self.stage_names, self.stage_parameters)
+        ]
+
+    def definition(self):
+        # Plain data, part of Rocket.definition (and so of cached result keys)
+        return {
+            "Name": self.name,
+            "Stages": list(self.stage_names),
+            "Stack": [[self.stage_names[index] for index in group] for group in self.groups],
+            "Pitch": dict(self.pitch),
+        }
+
+
+def stage_stack(vehicle):
+    # A StageStack from a VEHICLES name (built once and reused), a definition
+    # dictionary or an existing StageStack
+    if isinstance(vehicle, StageStack):
+        return vehicle
+    if isinstance(vehicle, str):
+        if vehicle not in STACKS:
+            if vehicle not in VEHICLES:
+                raise ValueError(f"Unknown vehicle {vehicle!r}, expected one of {sorted(VEHICLES)}")
+            STACKS[vehicle] = StageStack(vehicle, VEHICLES[vehicle])
+        return STACKS[vehicle]
+    return StageStack(vehicle.get("Name", "Custom"), vehicle)